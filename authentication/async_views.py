@@ -0,0 +1,216 @@
+# authentication/async_views.py
+# Async variants of the hot endpoints, for serving under ASGI (config.asgi).
+# They behave like their views.py counterparts but await the ORM and cache
+# instead of holding a worker thread, and run logins (authenticate() and
+# its password hashing) on a dedicated thread pool so slow hashes don't
+# stall the event loop or the thread the async ORM calls share.
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import alogin, authenticate
+from django.db import close_old_connections
+from django.http import JsonResponse, QueryDict, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication, aissue_token, request_token_key
+from .conditional import InvalidSince
+from .compact import APPOINTMENT_FIELDS, APPOINTMENT_RELATED, astream_compact, compact_values, side_load
+from .models import CustomUser, Patient, Doctor, Appointment
+from .response_cache import acached_list_response
+from .pagination import InvalidCursor, apaginate_appointments, astream_appointments, parse_page_size
+from .roles import DOCTORS, PATIENTS, aget_user_roles
+from .serializers import AppointmentSerializer
+from .views import book_appointment, filter_appointments, patch_appointments
+
+# hashlib releases the GIL while hashing, so these threads hash in parallel.
+password_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PASSWORD_HASH_WORKERS', None), thread_name_prefix='password-hash')
+
+
+class InvalidBody(ValueError):
+    pass
+
+
+def read_body(request, allow_list=False):
+    # DRF's request.data isn't available outside api_view; accept the same
+    # JSON or form-encoded bodies.
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise InvalidBody('Malformed JSON.')
+        if not isinstance(data, dict) and not (allow_list and isinstance(data, list)):
+            raise InvalidBody('Expected a JSON object or list.' if allow_list else 'Expected a JSON object.')
+        return data
+    return request.POST if request.method == 'POST' else QueryDict(request.body)
+
+
+def role_required(role):
+    """Token authentication plus a role check, like IsAuthenticated + IsPatient/IsDoctor."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key = request_token_key(request)
+            if not key:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            try:
+                request.user, key = await CachedTokenAuthentication().aauthenticate_credentials(key)
+            except AuthenticationFailed as e:
+                return JsonResponse({'detail': str(e.detail)}, status=401)
+            if role not in await aget_user_roles(request.user):
+                return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+            try:
+                return await view(request, *args, **kwargs)
+            except InvalidBody as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        return wrapper
+    return decorator
+
+
+def authenticate_and_close(request, username, password):
+    try:
+        return authenticate(request, username=username, password=password)
+    finally:
+        # Executor threads outlive the request; release their connection as
+        # request_finished would.
+        close_old_connections()
+
+
+async def check_credentials(request, username, password):
+    """authenticate() on the password pool: the same backends, hasher
+    upgrades and user_login_failed signal as the sync login."""
+    return await asyncio.get_running_loop().run_in_executor(password_executor, authenticate_and_close, request, username, password)
+
+
+async def appointment_list_response(appointments, params):
+    compact = bool(params.get('compact'))
+    if compact:
+        appointments = compact_values(appointments, APPOINTMENT_FIELDS, APPOINTMENT_RELATED)
+    else:
+        appointments = appointments.for_listing()
+    try:
+        if params.get('stream'):
+            chunk_size = parse_page_size(params.get('page_size'))
+            if compact:
+                return StreamingHttpResponse(astream_compact(appointments, APPOINTMENT_RELATED, chunk_size), content_type='application/json')
+            return StreamingHttpResponse(astream_appointments(appointments, AppointmentSerializer, chunk_size), content_type='application/json')
+
+        if 'cursor' in params or 'page_size' in params:
+            rows, next_cursor = await apaginate_appointments(appointments, params.get('cursor'), parse_page_size(params.get('page_size')))
+            if compact:
+                rows, included = side_load(rows, APPOINTMENT_RELATED)
+                return JsonResponse({'results': rows, 'included': included, 'next_cursor': next_cursor})
+            return JsonResponse({'results': AppointmentSerializer(rows, many=True).data, 'next_cursor': next_cursor})
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = [row async for row in appointments]
+    if compact:
+        rows, included = side_load(rows, APPOINTMENT_RELATED)
+        return JsonResponse({'results': rows, 'included': included})
+    # Everything the serializer reads was loaded by for_listing()
+    return JsonResponse(AppointmentSerializer(rows, many=True).data, safe=False)
+
+
+def book_and_render(serializer, patient, doctor):
+    # Booking needs a transaction, which the async ORM can't open, and the
+    # response serializes the nested patient/doctor; both stay sync.
+    conflict = book_appointment(serializer, patient=patient, doctor=doctor)
+    return conflict, None if conflict else serializer.data
+
+
+async def login_as(request, role, error):
+    data = read_body(request)
+    user = await check_credentials(request, data.get('username'), data.get('password'))
+    if user is not None and role in await aget_user_roles(user):
+        await alogin(request, user)
+        token = await aissue_token(user)
+        return JsonResponse({'token': token.key}, status=200)
+    return JsonResponse({'error': error}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def patient_login(request):
+    try:
+        return await login_as(request, PATIENTS, 'Invalid credentials or not a patient')
+    except InvalidBody as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def doctor_login(request):
+    try:
+        return await login_as(request, DOCTORS, 'Invalid credentials or not a doctor')
+    except InvalidBody as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@role_required(PATIENTS)
+async def list_appointments(request):
+    if request.method == 'GET':
+        patient_id = await Patient.objects.filter(user=request.user).values_list('id', flat=True).aget()
+        try:
+            appointments = filter_appointments(Appointment.objects.filter(patient_id=patient_id), request.GET)
+        except InvalidSince as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return await acached_list_response(request, 'patient', patient_id, request.GET, appointments, lambda: appointment_list_response(appointments, request.GET))
+
+    data = read_body(request)
+    try:
+        doctor = await Doctor.objects.aget(id=data.get('doctor'))
+    except (Doctor.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({'error': 'Doctor not found'}, status=404)
+    patient = await Patient.objects.aget(user=request.user)
+
+    serializer = AppointmentSerializer(data=data)
+    if serializer.is_valid():
+        conflict, body = await sync_to_async(book_and_render)(serializer, patient, doctor)
+        if conflict == 'doctor':
+            return JsonResponse({'error': 'Doctor already has an appointment at this time.'}, status=400)
+        if conflict == 'patient':
+            return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
+        return JsonResponse(body, status=201)
+    return JsonResponse(serializer.errors, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST', 'PATCH'])
+@role_required(DOCTORS)
+async def manage_appointments(request):
+    doctor = await Doctor.objects.aget(user=request.user)
+    if request.method == 'GET':
+        try:
+            appointments = filter_appointments(Appointment.objects.filter(doctor=doctor), request.GET)
+        except InvalidSince as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return await acached_list_response(request, 'doctor', doctor.id, request.GET, appointments, lambda: appointment_list_response(appointments, request.GET))
+
+    # PATCH also takes a list of changes
+    data = read_body(request, allow_list=request.method == 'PATCH')
+    if request.method == 'POST':
+        try:
+            patient = await Patient.objects.aget(id=data.get('patient'))
+        except (Patient.DoesNotExist, ValueError, TypeError):
+            return JsonResponse({'error': 'Patient not found'}, status=404)
+
+        serializer = AppointmentSerializer(data=data)
+        if serializer.is_valid():
+            conflict, body = await sync_to_async(book_and_render)(serializer, patient, doctor)
+            if conflict == 'doctor':
+                return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
+            if conflict == 'patient':
+                return JsonResponse({'error': 'Patient already has an appointment at this time.'}, status=400)
+            return JsonResponse(body, status=201)
+        return JsonResponse(serializer.errors, status=400)
+
+    # One transaction for the whole batch, which the async ORM can't open
+    return await sync_to_async(patch_appointments)(doctor, data)
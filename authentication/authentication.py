@@ -0,0 +1,166 @@
+# authentication/authentication.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def token_setting(name, default):
+    return getattr(settings, 'AUTH_TOKEN', {}).get(name, default)
+
+
+def token_expiry():
+    return token_setting('EXPIRY', timedelta(days=7))
+
+
+def token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+class TokenLRU:
+    """A small thread-safe LRU of token key -> (user, expires_at, cached_until)."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, user, expires_at):
+        # Local entries live only briefly because other processes can't evict
+        # them on logout; the shared cache is the source of truth in between.
+        cached_until = time.monotonic() + token_setting('LOCAL_CACHE_TIMEOUT', 10)
+        with self.lock:
+            self.entries[key] = (user, expires_at, cached_until)
+            self.entries.move_to_end(key)
+            while len(self.entries) > token_setting('LOCAL_CACHE_SIZE', 10000):
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = TokenLRU()
+
+
+def invalidate_token(key):
+    local_tokens.discard(key)
+    cache.delete(token_cache_key(key))
+
+
+def issue_token(user):
+    """Return the user's token, replacing it if it has expired."""
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and token.created + token_expiry() <= timezone.now():
+        token = rotate_token(user)
+    return token
+
+
+def rotate_token(user):
+    # Deleting fires post_delete, which evicts the old key from both caches.
+    Token.objects.filter(user=user).delete()
+    return Token.objects.create(user=user)
+
+
+async def aissue_token(user):
+    token, created = await Token.objects.aget_or_create(user=user)
+    if not created and token.created + token_expiry() <= timezone.now():
+        token = await sync_to_async(rotate_token)(user)
+    return token
+
+
+def request_token_key(request, allow_query=False):
+    # "Authorization: Token <key>"; EventSource can't send headers, so
+    # streams may pass ?token= instead.
+    header = request.headers.get('Authorization', '').split()
+    if len(header) == 2 and header[0] == 'Token':
+        return header[1]
+    return request.GET.get('token') if allow_query else None
+
+
+def token_entry(token):
+    """Return the (user, expires_at) cache entry for a token and how long to cache it."""
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    expires_at = token.created + token_expiry()
+    timeout = min(token_setting('CACHE_TIMEOUT', 300), (expires_at - timezone.now()).total_seconds())
+    return (token.user, expires_at), timeout
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that resolves keys without touching the database.
+
+    Lookups go through an in-process LRU, then the shared cache, and only
+    then the Token table. Cached entries are evicted when the token is
+    deleted (logout, rotation) or its user changes, and tokens older than
+    AUTH_TOKEN['EXPIRY'] are rejected.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = local_tokens.get(key)
+        if entry is None:
+            entry = cache.get(token_cache_key(key))
+            if entry is None:
+                entry = self.load_token(key)
+            local_tokens.set(key, *entry)
+        return self.check_entry(key, entry)
+
+    async def aauthenticate_credentials(self, key):
+        """Async twin of authenticate_credentials() for async views."""
+        entry = local_tokens.get(key)
+        if entry is None:
+            entry = await cache.aget(token_cache_key(key))
+            if entry is None:
+                try:
+                    token = await Token.objects.select_related('user').aget(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                entry, timeout = token_entry(token)
+                if timeout > 0:
+                    await cache.aset(token_cache_key(key), entry, timeout)
+            local_tokens.set(key, *entry)
+        return self.check_entry(key, entry)
+
+    def check_entry(self, key, entry):
+        user, expires_at = entry[0], entry[1]
+        if expires_at <= timezone.now():
+            invalidate_token(key)
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        # Hand out a copy so per-request attributes (e.g. cached roles) don't
+        # leak into the shared entry.
+        user = copy.copy(user)
+        return user, key
+
+    def load_token(self, key):
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        entry, timeout = token_entry(token)
+        if timeout > 0:
+            cache.set(token_cache_key(key), entry, timeout)
+        return entry
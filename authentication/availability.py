@@ -0,0 +1,86 @@
+# authentication/availability.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, DoctorSchedule, ScheduleException
+
+MINUTES_PER_DAY = 24 * 60
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+
+
+def minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def interval_mask(start, end):
+    # Bit n set means minute n of the day is busy.
+    start, end = max(start, 0), min(end, MINUTES_PER_DAY)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def find_free_slots(doctors, date_from, date_to):
+    """Compute open slots for many doctors over a date range in one pass.
+
+    Schedules, exceptions and booked appointments for every doctor in the
+    range are loaded with one query each. Each (doctor, day) gets a bitmap of
+    busy minutes, and a generated slot is free when its bits don't intersect
+    it. A booked appointment occupies one slot length from its start time.
+
+    Returns {doctor_id: {date: [time, ...]}} containing only days with free
+    slots. Unavailable doctors and slots that already started are skipped.
+    """
+    now = timezone.localtime()
+    date_from = max(date_from, now.date())
+    doctor_ids = [doctor.id for doctor in doctors if doctor.is_available]
+    if not doctor_ids or date_from > date_to:
+        return {}
+
+    hours = defaultdict(list)
+    for schedule in DoctorSchedule.objects.filter(doctor_id__in=doctor_ids).order_by('start_time'):
+        hours[schedule.doctor_id, schedule.weekday].append(schedule)
+
+    blocked = defaultdict(int)
+    for exception in ScheduleException.objects.filter(doctor_id__in=doctor_ids, date__range=(date_from, date_to)):
+        if exception.start_time is None or exception.end_time is None:
+            blocked[exception.doctor_id, exception.date] = FULL_DAY
+        else:
+            blocked[exception.doctor_id, exception.date] |= interval_mask(minute_of_day(exception.start_time), minute_of_day(exception.end_time))
+
+    booked = defaultdict(list)
+    for doctor_id, day, time in Appointment.objects.active().filter(doctor_id__in=doctor_ids, date__range=(date_from, date_to)).values_list('doctor_id', 'date', 'time'):
+        booked[doctor_id, day].append(minute_of_day(time))
+
+    free = {}
+    for doctor_id in doctor_ids:
+        days = {}
+        day = date_from
+        while day <= date_to:
+            busy = blocked[doctor_id, day]
+            if day == now.date():
+                busy |= interval_mask(0, minute_of_day(now) + 1)
+            slots = []
+            if busy != FULL_DAY:
+                for schedule in hours[doctor_id, day.weekday()]:
+                    slots.extend(generate_free_slots(schedule, busy, booked[doctor_id, day]))
+            if slots:
+                days[day] = sorted(slots)
+            day += timedelta(days=1)
+        if days:
+            free[doctor_id] = days
+    return free
+
+
+def generate_free_slots(schedule, busy, booked_minutes):
+    length = schedule.slot_minutes
+    for minute in booked_minutes:
+        busy |= interval_mask(minute, minute + length)
+    start = minute_of_day(schedule.start_time)
+    end = minute_of_day(schedule.end_time)
+    slot = (1 << length) - 1
+    for minute in range(start, end - length + 1, length):
+        if not busy & (slot << minute):
+            yield schedule.start_time.replace(hour=minute // 60, minute=minute % 60)
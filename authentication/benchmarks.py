@@ -0,0 +1,331 @@
+# authentication/benchmarks.py
+# Request scenarios for `manage.py bench_endpoints`. Every named URL in
+# authentication.urls needs at least one scenario here, or an entry in
+# SKIPPED saying why it can't be driven in a loop.
+import math
+import statistics
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import Appointment, CustomUser, Doctor, Message, Patient, Specialization
+from .seeding import MEDICATIONS
+
+PASSWORD = 'Secret123!'
+
+Scenario = namedtuple('Scenario', 'label url_name expected prepare')
+
+SCENARIOS = []
+SKIPPED = {
+    'events': 'server-sent event stream; the response stays open until the client disconnects',
+}
+
+
+def scenario(url_name, label=None, expected=200):
+    """Register prepare(bench, i), which returns the request to time as a zero-argument callable."""
+    def register(prepare):
+        SCENARIOS.append(Scenario(label or url_name, url_name, expected, prepare))
+        return prepare
+    return register
+
+
+class Bench:
+    """The client plus the seeded users and rows the scenarios act on."""
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.doctor = Doctor.objects.select_related('user').annotate(appointment_count=Count('appointment')).order_by('-appointment_count').first()
+        self.patient = Patient.objects.select_related('user').filter(appointment__doctor=self.doctor).annotate(appointment_count=Count('appointment')).order_by('-appointment_count').first()
+        self.doctor_token = Token.objects.get_or_create(user=self.doctor.user)[0].key
+        self.patient_token = Token.objects.get_or_create(user=self.patient.user)[0].key
+        self.admin_token = Token.objects.create(user=CustomUser.objects.create_superuser(f'{prefix}-admin', f'{prefix}-admin@example.com', PASSWORD)).key
+        # Logout and rotation revoke tokens, so they get a user of their own.
+        self.spare = CustomUser.objects.create_user(f'{prefix}-spare', password=PASSWORD)
+        self.specialty = Specialization.objects.order_by('id').first()
+        thread = Message.objects.filter(sender=self.patient.user, root__isnull=True).first()
+        self.thread_id = (thread or Message.objects.create(sender=self.patient.user, recipient=self.doctor.user, content='Benchmark thread')).id
+
+    def get(self, url_name, token, params=None, args=()):
+        return lambda: self.client.get(reverse(url_name, args=args), params or {}, headers={'Authorization': f'Token {token}'})
+
+    def send(self, method, url_name, token, data):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        request = getattr(self.client, method)
+        return lambda: request(reverse(url_name), data, content_type='application/json', headers=headers)
+
+
+def percentile(values, fraction):
+    # Nearest rank
+    return sorted(values)[math.ceil(len(values) * fraction) - 1]
+
+
+def run_scenario(bench, scenario, iterations, warmup):
+    """Return p50/p95 latency, queries and bytes per request for one scenario."""
+    latencies, queries, sizes = [], [], []
+    for i in range(warmup + iterations):
+        request = scenario.prepare(bench, i)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = request()
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - start
+        if response.status_code != scenario.expected:
+            raise AssertionError(f'{scenario.label} returned {response.status_code}, expected {scenario.expected}: {body[:200]!r}')
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(len(ctx.captured_queries))
+            sizes.append(len(body))
+    return {
+        'url_name': scenario.url_name,
+        'status': scenario.expected,
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'queries': statistics.median(queries),
+        'bytes': statistics.median(sizes),
+    }
+
+
+# Accounts
+
+@scenario('patient_register', expected=201)
+def register_patient(bench, i):
+    return bench.send('post', 'patient_register', None, {
+        'username': f'bench-new-patient-{i}', 'email': f'bench-new-patient-{i}@example.com', 'password': PASSWORD, 'confirm_password': PASSWORD,
+        'date_of_birth': '1990-01-01', 'gender': 'female', 'address': '1 Main St', 'contact_number': f'0730{i:06d}',
+    })
+
+
+@scenario('doctor_register', expected=201)
+def register_doctor(bench, i):
+    return bench.send('post', 'doctor_register', None, {
+        'username': f'bench-new-doctor-{i}', 'email': f'bench-new-doctor-{i}@example.com', 'password': PASSWORD, 'confirm_password': PASSWORD,
+        'specialty': bench.specialty.id, 'license_number': f'BENCH-NEW-{i}', 'contact_number': f'0740{i:06d}',
+    })
+
+
+@scenario('bulk_import_patients', expected=201)
+def import_patients(bench, i):
+    return bench.send('post', 'bulk_import_patients', bench.admin_token, [
+        {'username': f'bench-import-patient-{i}-{n}', 'email': f'bench-import-patient-{i}-{n}@example.com', 'date_of_birth': '1990-01-01', 'gender': 'male', 'address': '1 Main St', 'contact_number': f'0750{i:04d}{n:02d}', 'allergies': 'Penicillin'}
+        for n in range(10)
+    ])
+
+
+@scenario('bulk_import_doctors', expected=201)
+def import_doctors(bench, i):
+    return bench.send('post', 'bulk_import_doctors', bench.admin_token, [
+        {'username': f'bench-import-doctor-{i}-{n}', 'email': f'bench-import-doctor-{i}-{n}@example.com', 'specialty': bench.specialty.name, 'license_number': f'BENCH-IMPORT-{i}-{n}', 'contact_number': f'0760{i:04d}{n:02d}'}
+        for n in range(10)
+    ])
+
+
+@scenario('patient_login')
+def patient_login(bench, i):
+    return bench.send('post', 'patient_login', None, {'username': bench.patient.user.username, 'password': PASSWORD})
+
+
+@scenario('doctor_login')
+def doctor_login(bench, i):
+    return bench.send('post', 'doctor_login', None, {'username': bench.doctor.user.username, 'password': PASSWORD})
+
+
+@scenario('async_patient_login')
+def async_patient_login(bench, i):
+    return bench.send('post', 'async_patient_login', None, {'username': bench.patient.user.username, 'password': PASSWORD})
+
+
+@scenario('async_doctor_login')
+def async_doctor_login(bench, i):
+    return bench.send('post', 'async_doctor_login', None, {'username': bench.doctor.user.username, 'password': PASSWORD})
+
+
+@scenario('logout')
+def logout(bench, i):
+    return bench.send('post', 'logout', Token.objects.get_or_create(user=bench.spare)[0].key, {})
+
+
+@scenario('rotate_token')
+def rotate_token(bench, i):
+    return bench.send('post', 'rotate_token', Token.objects.get_or_create(user=bench.spare)[0].key, {})
+
+
+# Appointments
+
+@scenario('list_appointments')
+def patient_appointments(bench, i):
+    return bench.get('list_appointments', bench.patient_token)
+
+
+@scenario('list_appointments', 'list_appointments compact')
+def patient_appointments_compact(bench, i):
+    return bench.get('list_appointments', bench.patient_token, {'compact': '1'})
+
+
+@scenario('async_list_appointments')
+def async_patient_appointments(bench, i):
+    return bench.get('async_list_appointments', bench.patient_token)
+
+
+@scenario('manage_appointments')
+def doctor_appointments(bench, i):
+    return bench.get('manage_appointments', bench.doctor_token)
+
+
+@scenario('manage_appointments', 'manage_appointments compact')
+def doctor_appointments_compact(bench, i):
+    return bench.get('manage_appointments', bench.doctor_token, {'compact': '1'})
+
+
+@scenario('manage_appointments', 'manage_appointments page')
+def doctor_appointments_page(bench, i):
+    return bench.get('manage_appointments', bench.doctor_token, {'page_size': 50})
+
+
+@scenario('manage_appointments', 'manage_appointments upcoming')
+def doctor_upcoming_appointments(bench, i):
+    return bench.get('manage_appointments', bench.doctor_token, {'date_from': timezone.localdate().isoformat(), 'status': 'pending'})
+
+
+@scenario('async_manage_appointments')
+def async_doctor_appointments(bench, i):
+    return bench.get('async_manage_appointments', bench.doctor_token)
+
+
+@scenario('manage_appointments', 'manage_appointments book', expected=201)
+def book_appointment(bench, i):
+    # Far enough ahead to never clash with the seeded calendar
+    return bench.send('post', 'manage_appointments', bench.doctor_token, {
+        'patient': bench.patient.id, 'date': (date(2100, 1, 1) + timedelta(days=i)).isoformat(), 'time': '09:00', 'reason_for_visit': 'Benchmark',
+    })
+
+
+@scenario('manage_appointments', 'manage_appointments status')
+def update_status(bench, i):
+    appointment_id = Appointment.objects.filter(doctor=bench.doctor, date__gte=timezone.localdate()).values_list('id', flat=True).first()
+    return bench.send('patch', 'manage_appointments', bench.doctor_token, {'id': appointment_id, 'status': ('confirmed', 'pending')[i % 2]})
+
+
+@scenario('manage_appointments', 'manage_appointments batch status')
+def update_statuses(bench, i):
+    # An end-of-day round: 20 upcoming appointments confirmed, or put back
+    ids = Appointment.objects.filter(doctor=bench.doctor, date__gte=timezone.localdate()).exclude(status='cancelled').order_by('date', 'time').values_list('id', flat=True)[:20]
+    return bench.send('patch', 'manage_appointments', bench.doctor_token, [{'id': appointment_id, 'status': ('confirmed', 'pending')[i % 2]} for appointment_id in ids])
+
+
+@scenario('doctor_availability')
+def availability(bench, i):
+    return bench.get('doctor_availability', bench.patient_token, {'doctor': bench.doctor.id, 'date_from': timezone.localdate().isoformat()})
+
+
+@scenario('manage_schedule')
+def schedule(bench, i):
+    return bench.get('manage_schedule', bench.doctor_token)
+
+
+@scenario('manage_schedule', 'manage_schedule update')
+def update_schedule(bench, i):
+    return bench.send('put', 'manage_schedule', bench.doctor_token, {
+        'hours': [{'weekday': weekday, 'start_time': '09:00', 'end_time': '17:00'} for weekday in range(5)],
+        'exceptions': [],
+    })
+
+
+@scenario('doctor_directory')
+def directory(bench, i):
+    return bench.get('doctor_directory', bench.patient_token)
+
+
+@scenario('doctor_directory', 'doctor_directory filtered')
+def directory_filtered(bench, i):
+    return bench.get('doctor_directory', bench.patient_token, {'specialty': bench.specialty.id, 'available': '1', 'sort': 'rating'})
+
+
+@scenario('doctor_directory', 'doctor_directory name')
+def directory_name(bench, i):
+    return bench.get('doctor_directory', bench.patient_token, {'name': bench.doctor.user.full_name[:3]})
+
+
+@scenario('appointment_report')
+def report_by_doctor(bench, i):
+    return bench.get('appointment_report', bench.admin_token, {'date_from': (timezone.localdate() - timedelta(days=365)).isoformat(), 'group_by': 'doctor'})
+
+
+@scenario('appointment_report', 'appointment_report daily')
+def report_by_day(bench, i):
+    return bench.get('appointment_report', bench.admin_token, {'date_from': (timezone.localdate() - timedelta(days=90)).isoformat(), 'group_by': 'day,specialty'})
+
+
+# Prescriptions
+
+@scenario('list_prescriptions')
+def patient_prescriptions(bench, i):
+    return bench.get('list_prescriptions', bench.patient_token)
+
+
+@scenario('list_prescriptions', 'list_prescriptions doctor')
+def doctor_prescriptions(bench, i):
+    return bench.get('list_prescriptions', bench.doctor_token)
+
+
+@scenario('create_prescription', expected=201)
+def prescribe(bench, i):
+    return bench.send('post', 'create_prescription', bench.doctor_token, {
+        'patient': bench.patient.id, 'medication': 'Vitamin D', 'dosage': '1000IU', 'quantity': 30, 'expiration_date': '2100-01-01',
+    })
+
+
+@scenario('screen_prescriptions')
+def screen(bench, i):
+    return bench.send('post', 'screen_prescriptions', bench.doctor_token, {'patient': bench.patient.id, 'medications': [name for name, dosage in MEDICATIONS]})
+
+
+# Messages
+
+@scenario('inbox')
+def inbox(bench, i):
+    return bench.get('inbox', bench.doctor_token)
+
+
+@scenario('inbox', 'inbox unread')
+def inbox_unread(bench, i):
+    return bench.get('inbox', bench.doctor_token, {'unread': '1'})
+
+
+@scenario('inbox', 'inbox send', expected=201)
+def send_message(bench, i):
+    return bench.send('post', 'inbox', bench.patient_token, {'recipient': bench.doctor.user.id, 'content': f'Benchmark message {i}'})
+
+
+@scenario('outbox')
+def outbox(bench, i):
+    return bench.get('outbox', bench.patient_token)
+
+
+@scenario('message_thread')
+def thread(bench, i):
+    return bench.get('message_thread', bench.patient_token, args=[bench.thread_id])
+
+
+@scenario('mark_messages_read')
+def mark_read(bench, i):
+    ids = list(Message.objects.filter(recipient=bench.doctor.user, is_read=False).values_list('id', flat=True)[:20])
+    return bench.send('post', 'mark_messages_read', bench.doctor_token, {'ids': ids})
+
+
+@scenario('unread_messages_count')
+def unread_count(bench, i):
+    return bench.get('unread_messages_count', bench.doctor_token)
+
+
+# Operations
+
+@scenario('metrics')
+def scrape_metrics(bench, i):
+    return bench.get('metrics', bench.admin_token)
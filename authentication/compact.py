@@ -0,0 +1,88 @@
+# authentication/compact.py
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .pagination import DEFAULT_PAGE_SIZE, apaginate_appointments, paginate_appointments
+
+# Compact list representation: each row carries related ids only, and the
+# related patients/doctors are emitted once in an "included" map keyed by id.
+# Rows come from .values(), so no model instances or DRF fields are built.
+#
+# Related specs map an included section to (id column, {attribute: lookup}).
+
+PATIENTS = ('patient_id', {'full_name': 'patient__user__full_name'})
+DOCTORS = ('doctor_id', {'full_name': 'doctor__user__full_name', 'specialty': 'doctor__specialty__name'})
+
+APPOINTMENT_FIELDS = ('id', 'patient_id', 'doctor_id', 'date', 'time', 'status', 'reason_for_visit', 'additional_notes', 'is_completed', 'prescription_id', 'updated_at')
+APPOINTMENT_RELATED = {'patients': PATIENTS, 'doctors': DOCTORS}
+
+PRESCRIPTION_FIELDS = ('id', 'patient_id', 'doctor_id', 'medication', 'dosage', 'quantity', 'refill_instructions', 'expiration_date', 'date_prescribed', 'is_active', 'notes', 'updated_at')
+PRESCRIPTION_RELATED = {'patients': PATIENTS, 'doctors': DOCTORS}
+
+
+def compact_values(queryset, fields, related):
+    """Select the row fields plus the related display columns in one query."""
+    lookups = [lookup for id_field, attributes in related.values() for lookup in attributes.values()]
+    return queryset.values(*fields, *lookups)
+
+
+def side_load(rows, related, included=None):
+    """Move related display columns out of each row into the included map.
+
+    Rows are modified in place. Pass an existing included map to keep
+    adding to it across pages.
+    """
+    if included is None:
+        included = {name: {} for name in related}
+    for row in rows:
+        for name, (id_field, attributes) in related.items():
+            entities = included[name]
+            pk = row[id_field]
+            if pk in entities:
+                for lookup in attributes.values():
+                    del row[lookup]
+            else:
+                entity = {'id': pk}
+                for attribute, lookup in attributes.items():
+                    entity[attribute] = row.pop(lookup)
+                entities[pk] = entity
+    return rows, included
+
+
+def stream_compact(rows, related, chunk_size=DEFAULT_PAGE_SIZE):
+    """Yield {"results": [...], "included": {...}} one keyset chunk at a time.
+
+    The included map is written after the last row, once every related
+    entity has been seen.
+    """
+    yield '{"results": ['
+    included = None
+    cursor = None
+    first = True
+    while True:
+        chunk, cursor = paginate_appointments(rows, cursor, chunk_size)
+        chunk, included = side_load(chunk, related, included)
+        for row in chunk:
+            yield ('' if first else ',') + json.dumps(row, cls=DjangoJSONEncoder)
+            first = False
+        if cursor is None:
+            break
+    yield '], "included": ' + json.dumps(included, cls=DjangoJSONEncoder) + '}'
+
+
+async def astream_compact(rows, related, chunk_size=DEFAULT_PAGE_SIZE):
+    """Async twin of stream_compact() for async views."""
+    yield '{"results": ['
+    included = None
+    cursor = None
+    first = True
+    while True:
+        chunk, cursor = await apaginate_appointments(rows, cursor, chunk_size)
+        chunk, included = side_load(chunk, related, included)
+        for row in chunk:
+            yield ('' if first else ',') + json.dumps(row, cls=DjangoJSONEncoder)
+            first = False
+        if cursor is None:
+            break
+    yield '], "included": ' + json.dumps(included, cls=DjangoJSONEncoder) + '}'
@@ -0,0 +1,114 @@
+# authentication/directory.py
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, Coalesce, Lower, NullIf, Round
+
+from .models import Doctor
+
+DIRECTORY_PAGE_SIZE = 20
+MAX_DIRECTORY_PAGE_SIZE = 100
+VERSION_KEY = 'doctor-directory:version'
+# Pages deeper than this are rare enough to always come from the database.
+CACHED_PAGES = 5
+STARS = range(1, 6)
+DIRECTORY_FIELDS = ('id', 'full_name', 'specialty_id', 'specialty_name', 'is_available', 'rating_count', 'rating_average', *(f'stars_{stars}' for stars in STARS))
+SORTS = {
+    'name': ('name_key', 'id'),
+    # Best rated first; unrated doctors last
+    'rating': (F('rating_average').desc(nulls_last=True), 'name_key', 'id'),
+}
+# Highest code point; "prefix" <= name < "prefix" + MAX_CHAR covers every name
+# starting with "prefix", as a range the Lower(full_name) index can seek.
+MAX_CHAR = '\U0010ffff'
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def parse_search(params):
+    """Normalize directory query params into a hashable search tuple."""
+    try:
+        specialty = int(params['specialty']) if params.get('specialty') else None
+        page = int(params.get('page') or 1)
+        page_size = min(int(params.get('page_size') or DIRECTORY_PAGE_SIZE), MAX_DIRECTORY_PAGE_SIZE)
+    except ValueError:
+        raise InvalidSearch('specialty, page and page_size must be integers.')
+    if page < 1 or page_size < 1:
+        raise InvalidSearch('page and page_size must be positive.')
+    sort = params.get('sort') or 'name'
+    if sort not in SORTS:
+        raise InvalidSearch(f'sort must be one of: {", ".join(SORTS)}.')
+    available = params.get('available')
+    if available is not None:
+        available = available.lower() in ('1', 'true', 'yes')
+    name = ' '.join((params.get('name') or '').split()).lower()
+    return specialty, available, name, page, page_size, sort
+
+
+def directory_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate_directory():
+    # A fresh version orphans every cached page at once; they expire on
+    # their own. A timestamp never repeats, even if the key was evicted.
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def directory_cache_key(search):
+    specialty, available, name, page, page_size, sort = search
+    query = urlencode({'specialty': specialty or '', 'available': '' if available is None else int(available), 'name': name, 'page': page, 'page_size': page_size, 'sort': sort})
+    return f'doctor-directory:{directory_version()}:{query}'
+
+
+def search_doctors(search):
+    """Return one page of the doctor directory as plain dicts.
+
+    Only the listed columns are selected (no model instances), ordered by
+    name so name prefixes and specialty filters are served from indexes, or
+    by average rating.
+    """
+    specialty, available, name, page, page_size, sort = search
+    doctors = Doctor.objects.annotate(
+        full_name=F('user__full_name'),
+        specialty_name=F('specialty__name'),
+        name_key=Lower('user__full_name'),
+        # From the incrementally maintained DoctorRating row, not an AVG over Feedback
+        rating_count=Coalesce('rating_summary__count', 0),
+        rating_average=Round(Cast('rating_summary__total', FloatField()) / NullIf('rating_summary__count', 0), 2),
+        **{f'stars_{stars}': Coalesce(f'rating_summary__stars_{stars}', 0) for stars in STARS},
+    )
+    if specialty:
+        doctors = doctors.filter(specialty_id=specialty)
+    if available is not None:
+        doctors = doctors.filter(is_available=available)
+    if name:
+        doctors = doctors.filter(name_key__gte=name, name_key__lt=name + MAX_CHAR)
+    offset = (page - 1) * page_size
+    # One extra row tells whether there is a next page without a COUNT.
+    rows = list(doctors.order_by(*SORTS[sort]).values(*DIRECTORY_FIELDS)[offset:offset + page_size + 1])
+    for row in rows:
+        row['rating_histogram'] = {stars: row.pop(f'stars_{stars}') for stars in STARS}
+    return {'results': rows[:page_size], 'page': page, 'has_next': len(rows) > page_size}
+
+
+def cached_search_doctors(search):
+    page = search[3]
+    if page > CACHED_PAGES:
+        return search_doctors(search)
+    key = directory_cache_key(search)
+    result = cache.get(key)
+    if result is None:
+        result = search_doctors(search)
+        cache.set(key, result, getattr(settings, 'DOCTOR_DIRECTORY_CACHE_TIMEOUT', 300))
+    return result
@@ -0,0 +1,127 @@
+# authentication/events.py
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'authentication.events.InMemoryBroker'
+# Events buffered per connection before the slowest clients start losing them.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """One connection's view of a channel; events arrive on an asyncio queue."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Called from any thread; hop onto the subscriber's event loop.
+        self.loop.call_soon_threadsafe(self.put, event)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout=None):
+        """Return the next (type, data) event, or None after timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Fan events out to subscribers in this process.
+
+    Enough for a single ASGI worker and for tests. Brokers for several
+    workers (Redis pub/sub, PostgreSQL LISTEN/NOTIFY...) implement the same
+    publish(), subscribe() and unsubscribe() methods and are selected with
+    the EVENT_BROKER setting.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver((event_type, data))
+
+    def subscribe(self, channel):
+        """Subscribe from inside the event loop that will consume the events."""
+        subscription = Subscription(self, channel)
+        with self.lock:
+            self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENT_BROKER', DEFAULT_BROKER))()
+        return _broker
+
+
+def publish_to_users(user_ids, event_type, data):
+    """Publish an event to each user's channel once the current transaction commits."""
+    def publish():
+        broker = get_broker()
+        for user_id in set(user_ids):
+            broker.publish(user_channel(user_id), event_type, data)
+    transaction.on_commit(publish)
+
+
+def format_event(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def event_stream(user_id, keepalive=15):
+    """Server-sent events for one user until the client disconnects."""
+    subscription = get_broker().subscribe(user_channel(user_id))
+    try:
+        # Tell EventSource clients how soon to reconnect after a drop.
+        yield 'retry: 3000\n\n'
+        event_id = 0
+        while True:
+            event = await subscription.get(timeout=keepalive)
+            if event is None:
+                # Comment line; keeps proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+                continue
+            event_id += 1
+            yield format_event(event_id, *event)
+    finally:
+        subscription.close()
@@ -0,0 +1,56 @@
+# authentication/hashers.py
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+def hasher_params(profile):
+    return getattr(settings, 'PASSWORD_HASHER_PARAMS', {}).get(profile, {})
+
+
+def hashers_for_profile(profile):
+    """Return PASSWORD_HASHERS reordered so the given profile's hasher is preferred."""
+    preferred = settings.PASSWORD_HASHER_PROFILES[profile]
+    return [preferred] + [hasher for hasher in settings.PASSWORD_HASHERS if hasher != preferred]
+
+
+# The hashers below keep Django's algorithm names, so existing hashes still
+# verify. Django's check_password() re-hashes on the next successful login
+# whenever the stored cost differs from these settings or the preferred
+# profile changed.
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return hasher_params('pbkdf2').get('iterations', PBKDF2PasswordHasher.iterations)
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return hasher_params('argon2').get('time_cost', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return hasher_params('argon2').get('memory_cost', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return hasher_params('argon2').get('parallelism', Argon2PasswordHasher.parallelism)
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return hasher_params('scrypt').get('work_factor', ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return hasher_params('scrypt').get('block_size', ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return hasher_params('scrypt').get('parallelism', ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        return hasher_params('scrypt').get('maxmem', ScryptPasswordHasher.maxmem)
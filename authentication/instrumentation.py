@@ -0,0 +1,249 @@
+# authentication/instrumentation.py
+# Per-endpoint request metrics keyed by resolved URL name: a latency
+# histogram, SQL query count and time, DRF serializer time and response
+# size, rendered in the Prometheus text format. Turned on by
+# INSTRUMENTATION["ENABLED"]; when off, the middleware removes itself at
+# startup and neither the query hook nor the serializer hook is installed,
+# so requests pay nothing. The query hook is shared with profiling.py: one
+# execute wrapper reports each query to every observer in the context.
+# Metrics live in the process, like the in-memory event broker; scrape
+# every worker.
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+from .response_cache import cache_stats
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The timings of the request being handled. asgiref copies the context into
+# sync_to_async threads, so async views' ORM calls are counted too.
+current_timings = ContextVar('current_timings', default=None)
+# Callables (sql, seconds) told about every query in this context: the
+# request timings here, and profiling's QueryProfile.
+query_observers = ContextVar('query_observers', default=())
+_sync_thread_hooked = False
+
+
+def instrumentation_settings():
+    return {'ENABLED': False, 'SERVER_TIMING': False, 'LATENCY_BUCKETS': DEFAULT_LATENCY_BUCKETS, **getattr(settings, 'INSTRUMENTATION', {})}
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db', 'serialize', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.db += seconds
+
+
+def observe_query(execute, sql, params, many, context):
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        for observer in observers:
+            observer(sql, seconds)
+
+
+def add_query_hook(connection, **kwargs):
+    # A permanent entry in execute_wrappers (what connection.execute_wrapper()
+    # pushes temporarily), so connections opened by sync_to_async threads
+    # are covered as well.
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+def install_query_hook():
+    """Hook every connection, open or future, into the query observers."""
+    connection_created.connect(add_query_hook, dispatch_uid='instrumentation-query-hook')
+    for connection in connections.all(initialized_only=True):
+        add_query_hook(connection)
+
+
+async def ainstall_query_hook():
+    # Async views query from the thread-sensitive sync thread, whose
+    # connections may predate the hook; later ones get it on creation.
+    global _sync_thread_hooked
+    if not _sync_thread_hooked:
+        await sync_to_async(install_query_hook)()
+        _sync_thread_hooked = True
+
+
+@contextmanager
+def observing_queries(observer):
+    token = query_observers.set((*query_observers.get(), observer))
+    try:
+        yield
+    finally:
+        query_observers.reset(token)
+
+
+def endpoint_name(request):
+    match = request.resolver_match
+    return (match.url_name or match.view_name) if match else 'unmatched'
+
+
+_serializer_data = BaseSerializer.data
+
+
+def timed_serializer_data(self):
+    timings = current_timings.get()
+    if timings is None or timings.serializing:
+        return _serializer_data.fget(self)
+    # Only the outermost .data is timed; nested serializers run inside it.
+    timings.serializing = True
+    start = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        timings.serialize += time.perf_counter() - start
+        timings.serializing = False
+
+
+def install_serializer_timer():
+    BaseSerializer.data = property(timed_serializer_data)
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.configure(buckets)
+
+    def configure(self, buckets):
+        with self.lock:
+            self.buckets = tuple(sorted(buckets))
+            self.endpoints = {}
+
+    def reset(self):
+        self.configure(self.buckets)
+
+    def observe(self, endpoint, method, seconds, timings, size):
+        with self.lock:
+            entry = self.endpoints.get((endpoint, method))
+            if entry is None:
+                entry = self.endpoints[endpoint, method] = {
+                    'buckets': [0] * (len(self.buckets) + 1), 'count': 0, 'seconds': 0.0,
+                    'queries': 0, 'db': 0.0, 'serialize': 0.0, 'bytes': 0,
+                }
+            entry['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['queries'] += timings.queries
+            entry['db'] += timings.db
+            entry['serialize'] += timings.serialize
+            # Streamed bodies aren't materialized; their size is unknown.
+            entry['bytes'] += size or 0
+
+    def snapshot(self):
+        with self.lock:
+            return {key: {**entry, 'buckets': list(entry['buckets'])} for key, entry in self.endpoints.items()}
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        endpoints = sorted(self.snapshot().items())
+        lines = [
+            '# HELP hms_request_duration_seconds Request latency by URL name.',
+            '# TYPE hms_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), entry in endpoints:
+            labels = f'endpoint="{escape(endpoint)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), entry['buckets']):
+                cumulative += count
+                lines.append(f'hms_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'hms_request_duration_seconds_sum{{{labels}}} {number(entry["seconds"])}')
+            lines.append(f'hms_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+        for name, key, help_text in [
+            ('hms_request_queries_total', 'queries', 'SQL queries issued.'),
+            ('hms_request_db_seconds_total', 'db', 'Time spent in SQL queries.'),
+            ('hms_request_serializer_seconds_total', 'serialize', 'Time spent in DRF serializers.'),
+            ('hms_response_bytes_total', 'bytes', 'Response body bytes, streamed responses excluded.'),
+        ]:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{endpoint="{escape(endpoint)}",method="{method}"}} {number(entry[key])}' for (endpoint, method), entry in endpoints]
+        lines += ['# HELP hms_appointment_list_cache_total Appointment list response cache lookups.', '# TYPE hms_appointment_list_cache_total counter']
+        lines += [f'hms_appointment_list_cache_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(cache_stats().items())]
+        return '\n'.join(lines) + '\n'
+
+
+def number(value):
+    return f'{value:.6f}' if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = instrumentation_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config['SERVER_TIMING']
+        metrics.configure(config['LATENCY_BUCKETS'])
+        install_serializer_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_hook()
+        timings = RequestTimings()
+        start = time.perf_counter()
+        with self.timing(timings):
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start, timings)
+
+    async def __acall__(self, request):
+        await ainstall_query_hook()
+        timings = RequestTimings()
+        start = time.perf_counter()
+        with self.timing(timings):
+            response = await self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start, timings)
+
+    @contextmanager
+    def timing(self, timings):
+        token = current_timings.set(timings)
+        try:
+            with observing_queries(timings.record_query):
+                yield
+        finally:
+            current_timings.reset(token)
+
+    def finish(self, request, response, elapsed, timings):
+        metrics.observe(endpoint_name(request), request.method, elapsed, timings, None if response.streaming else len(response.content))
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries", '
+                f'serialize;dur={timings.serialize * 1000:.1f}, total;dur={elapsed * 1000:.1f}'
+            )
+        return response
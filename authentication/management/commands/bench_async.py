@@ -0,0 +1,128 @@
+# authentication/management/commands/bench_async.py
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as clock, timedelta
+
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from authentication.models import Appointment, CustomUser, Doctor, Patient, Specialization
+
+PASSWORD = 'Secret123!'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the sync (WSGI) and async (ASGI) appointment list and login '
+        'views with many concurrent clients, in process, against a throwaway '
+        'test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=10, help='Requests per client and endpoint.')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # The in-memory test database can't be shared between threads.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            token = self.create_data()
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                results = self.run_endpoints(token, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'mode':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for mode, result in results.items():
+            self.stdout.write(f"{mode:<14}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+    def run_endpoints(self, token, options):
+        results = {}
+        for endpoint, sync_name, async_name, request in [
+            ('list', 'list_appointments', 'async_list_appointments', lambda client, url: client.get(url, headers={'Authorization': f'Token {token}'})),
+            ('login', 'patient_login', 'async_patient_login', lambda client, url: client.post(url, {'username': 'bench-patient', 'password': PASSWORD})),
+        ]:
+            results[f'wsgi {endpoint}'] = self.run_wsgi(reverse(sync_name), request, options)
+            results[f'asgi {endpoint}'] = asyncio.run(self.run_asgi(reverse(async_name), request, options))
+        return results
+
+    def create_data(self):
+        specialty = Specialization.objects.create(name='Benchmark')
+        doctor = Doctor.objects.create(user=CustomUser.objects.create_user(username='bench-doctor'), specialty=specialty, license_number='BENCH-1', contact_number='0790000000')
+        user = CustomUser.objects.create_user(username='bench-patient', password=PASSWORD)
+        user.groups.add(Group.objects.get(name='Patients'))
+        patient = Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='other', address='Benchmark', contact_number='0710000000')
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, date=date(2030, 1, 1) + timedelta(days=i), time=clock(9, 0), reason_for_visit='Benchmark')
+            for i in range(20)
+        ])
+        return Token.objects.create(user=user).key
+
+    def summarize(self, latencies, elapsed):
+        if not latencies:
+            raise CommandError('No requests succeeded.')
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'requests': len(latencies),
+        }
+
+    def run_wsgi(self, url, request, options):
+        # Like a threaded WSGI server: clients queue for --threads workers,
+        # and the wait counts towards their first request.
+        def client_session(_):
+            client = Client()
+            latencies = []
+            queued = time.perf_counter() - start
+            try:
+                for _ in range(options['requests']):
+                    request_start = time.perf_counter()
+                    response = request(client, url)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url} returned {response.status_code}')
+                    latencies.append(time.perf_counter() - request_start + queued)
+                    queued = 0
+            finally:
+                connections.close_all()
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            latencies = [latency for session in pool.map(client_session, range(options['clients'])) for latency in session]
+        return self.summarize(latencies, time.perf_counter() - start)
+
+    async def run_asgi(self, url, request, options):
+        # One event loop serves every client, like a single ASGI worker.
+        async def client_session():
+            client = AsyncClient()
+            latencies = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = await request(client, url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} returned {response.status_code}')
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        sessions = await asyncio.gather(*(client_session() for _ in range(options['clients'])))
+        return self.summarize([latency for session in sessions for latency in session], time.perf_counter() - start)
@@ -0,0 +1,127 @@
+# authentication/management/commands/bench_booking.py
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from authentication.models import CustomUser, Doctor, Patient, Specialization
+from authentication.views import list_appointments
+
+# Environment overrides for each database mode (see DATABASES in settings).
+MODES = {
+    'sqlite': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNED': '0'},
+    'sqlite-tuned': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNED': '1'},
+    'postgresql': {'DB_ENGINE': 'postgresql', 'DB_POOL': '0'},
+    'postgresql-pool': {'DB_ENGINE': 'postgresql', 'DB_POOL': '1'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent booking throughput across database modes. Each mode '
+        'runs in a subprocess against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=['sqlite', 'sqlite-tuned'])
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--bookings', type=int, default=50, help='Bookings per thread.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+        parser.add_argument('--worker', action='store_true', help='Run one benchmark with the current settings (internal).')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_benchmark(options['threads'], options['bookings'])))
+            return
+
+        results = {}
+        for mode in options['modes']:
+            completed = subprocess.run(
+                [sys.executable, '-m', 'django', 'bench_booking', '--worker', '--threads', str(options['threads']), '--bookings', str(options['bookings'])],
+                env={**os.environ, **MODES[mode]}, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                self.stderr.write(f'{mode} failed:\n{completed.stderr}')
+                continue
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'mode':<18}{'bookings/s':>12}{'ok':>8}{'errors':>8}")
+        for mode, result in results.items():
+            self.stdout.write(f"{mode:<18}{result['bookings_per_second']:>12.1f}{result['ok']:>8}{result['errors']:>8}")
+
+    def run_benchmark(self, threads, bookings):
+        if connection.vendor == 'sqlite':
+            # The default SQLite test database lives in memory; use a file so
+            # journal and sync settings matter.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            pairs = self.create_people(threads)
+            return self.book_concurrently(pairs, bookings)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_people(self, count):
+        specialty = Specialization.objects.create(name='Benchmark')
+        patients_group = Group.objects.get(name='Patients')
+        pairs = []
+        for i in range(count):
+            doctor_user = CustomUser.objects.create_user(username=f'bench-doctor-{i}')
+            doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, license_number=f'BENCH-{i}', contact_number=f'079{i:07d}')
+            patient_user = CustomUser.objects.create_user(username=f'bench-patient-{i}')
+            patient_user.groups.add(patients_group)
+            Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), gender='other', address='Benchmark', contact_number=f'071{i:07d}')
+            pairs.append((patient_user, doctor))
+        return pairs
+
+    def book_concurrently(self, pairs, bookings):
+        factory = APIRequestFactory()
+        barrier = threading.Barrier(len(pairs))
+        counts = {'ok': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(user, doctor):
+            ok = errors = 0
+            barrier.wait()
+            try:
+                for j in range(bookings):
+                    request = factory.post('/appointments/', {'doctor': doctor.id, 'date': (date(2030, 1, 1) + timedelta(days=j)).isoformat(), 'time': '09:00', 'reason_for_visit': 'Benchmark'})
+                    force_authenticate(request, user=user)
+                    try:
+                        if list_appointments(request).status_code == 201:
+                            ok += 1
+                        else:
+                            errors += 1
+                    except OperationalError:
+                        # "database is locked" when a writer gives up waiting
+                        errors += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    counts['ok'] += ok
+                    counts['errors'] += errors
+
+        workers = [threading.Thread(target=worker, args=pair) for pair in pairs]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if counts['ok'] == 0:
+            raise CommandError('No bookings succeeded.')
+        return {'bookings_per_second': counts['ok'] / elapsed, 'seconds': elapsed, **counts}
@@ -0,0 +1,86 @@
+# authentication/management/commands/bench_endpoints.py
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from authentication import urls
+from authentication.benchmarks import SCENARIOS, SKIPPED, Bench, run_scenario
+from authentication.seeding import ClinicSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every endpoint in authentication/urls.py through the test '
+        'client against a seeded throwaway database, reporting p50/p95 '
+        'latency, queries and bytes per request. Use --json (or --output) '
+        'and diff the results between commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario first.')
+        parser.add_argument('--doctors', type=int, default=5)
+        parser.add_argument('--patients', type=int, default=100)
+        parser.add_argument('--years', type=int, default=1)
+        parser.add_argument('--per-day', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated clinic.')
+        parser.add_argument('--only', action='append', help='Run scenarios whose label starts with this; repeatable.')
+        parser.add_argument('--no-response-cache', action='store_true', help='Disable the appointment list response cache.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+        parser.add_argument('--output', help='Also write the JSON results to this file.')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in SCENARIOS if not options['only'] or any(s.label.startswith(prefix) for prefix in options['only'])]
+        if not scenarios:
+            raise CommandError('No scenario matches --only.')
+        if connection.vendor == 'sqlite':
+            # A file, not :memory:, so the async views' threads share it.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            overrides = {'ALLOWED_HOSTS': ['testserver']}
+            if options['no_response_cache']:
+                overrides['APPOINTMENT_LIST_CACHE_TIMEOUT'] = 0
+            with override_settings(**overrides):
+                counts = ClinicSeeder(
+                    doctors=options['doctors'], patients=options['patients'], years=options['years'],
+                    per_day=options['per_day'], prefix='bench', seed=options['seed'],
+                ).run()
+                bench = Bench(Client(), 'bench')
+                results = {}
+                for scenario in scenarios:
+                    try:
+                        results[scenario.label] = run_scenario(bench, scenario, options['iterations'], options['warmup'])
+                    except AssertionError as e:
+                        raise CommandError(str(e))
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'options': {name: options[name] for name in ('iterations', 'warmup', 'seed', 'no_response_cache')},
+            'data': counts,
+            'endpoints': results,
+            'skipped': SKIPPED,
+            'uncovered': uncovered_endpoints(),
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+            return
+        self.stdout.write(f"{'endpoint':<36}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'bytes':>12}")
+        for label, result in results.items():
+            self.stdout.write(f"{label:<36}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['queries']:>9g}{result['bytes']:>12.0f}")
+        for name in report['uncovered']:
+            self.stderr.write(f'No scenario for {name}.')
+
+
+def uncovered_endpoints():
+    covered = {scenario.url_name for scenario in SCENARIOS} | set(SKIPPED)
+    return sorted(pattern.name for pattern in urls.urlpatterns if pattern.name not in covered)
@@ -0,0 +1,75 @@
+# authentication/management/commands/bench_password_hashing.py
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from authentication.hashers import hashers_for_profile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure patient registration and login requests/sec for each password '
+        'hasher profile in this process. All writes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.PASSWORD_HASHER_PROFILES), choices=list(settings.PASSWORD_HASHER_PROFILES))
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint and profile.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile in options['profiles']:
+            try:
+                results[profile] = self.bench_profile(profile, options['requests'])
+            except ValueError as e:
+                # e.g. argon2-cffi is not installed
+                self.stderr.write(f'Skipping {profile}: {e}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'profile':<10}{'register req/s':>16}{'login req/s':>14}")
+        for profile, result in results.items():
+            self.stdout.write(f"{profile:<10}{result['register_rps']:>16.1f}{result['login_rps']:>14.1f}")
+
+    def bench_profile(self, profile, requests):
+        client = Client(HTTP_HOST='localhost')
+        password = 'Secret123!'
+        try:
+            with override_settings(PASSWORD_HASHERS=hashers_for_profile(profile)), transaction.atomic():
+                # Fail fast (ValueError) if the hasher's library is missing.
+                make_password(password)
+
+                start = time.perf_counter()
+                for i in range(requests):
+                    response = client.post(reverse('patient_register'), {
+                        'username': f'bench-{profile}-{i}', 'email': f'bench-{profile}-{i}@example.com',
+                        'password': password, 'confirm_password': password,
+                        'date_of_birth': '1990-01-01', 'gender': 'other', 'address': 'Benchmark',
+                        'contact_number': f'07{i:08d}',
+                    })
+                    if response.status_code != 201:
+                        raise CommandError(f'Registration failed: {response.content.decode()}')
+                register_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for i in range(requests):
+                    response = client.post(reverse('patient_login'), {'username': f'bench-{profile}-0', 'password': password})
+                    if response.status_code != 200:
+                        raise CommandError(f'Login failed: {response.content.decode()}')
+                login_seconds = time.perf_counter() - start
+                raise Rollback
+        except Rollback:
+            pass
+        return {'register_rps': requests / register_seconds, 'login_rps': requests / login_seconds}
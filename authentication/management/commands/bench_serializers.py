@@ -0,0 +1,82 @@
+# authentication/management/commands/bench_serializers.py
+import json
+import time
+from datetime import date, time as clock, timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from authentication.compact import APPOINTMENT_FIELDS, APPOINTMENT_RELATED, compact_values, side_load
+from authentication.models import Appointment, CustomUser, Doctor, Patient, Specialization
+from authentication.serializers import AppointmentSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full and compact appointment list representations in '
+        'microseconds and bytes per row. All writes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--patients', type=int, default=50)
+        parser.add_argument('--doctors', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                appointments = self.create_appointments(options['rows'], options['patients'], options['doctors'])
+                results = {
+                    'full': self.measure(lambda: AppointmentSerializer(appointments.for_listing(), many=True).data, options),
+                    'compact': self.measure(lambda: dict(zip(('results', 'included'), side_load(list(compact_values(appointments, APPOINTMENT_FIELDS, APPOINTMENT_RELATED)), APPOINTMENT_RELATED))), options),
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'mode':<10}{'us/row':>10}{'bytes/row':>12}")
+        for mode, result in results.items():
+            self.stdout.write(f"{mode:<10}{result['us_per_row']:>10.1f}{result['bytes_per_row']:>12.1f}")
+
+    def measure(self, build, options):
+        # Query plus serialization, as a list view would pay it.
+        best = None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            data = build()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        size = len(json.dumps(data, cls=DjangoJSONEncoder))
+        return {'us_per_row': best * 1e6 / options['rows'], 'bytes_per_row': size / options['rows']}
+
+    def create_appointments(self, rows, patients, doctors):
+        specialty = Specialization.objects.create(name='Benchmark')
+        users = CustomUser.objects.bulk_create([CustomUser(username=f'bench-{i}', full_name=f'Bench User {i}') for i in range(patients + doctors)])
+        if any(user.pk is None for user in users):
+            users = list(CustomUser.objects.filter(username__startswith='bench-').order_by('id'))
+        patient_rows = Patient.objects.bulk_create([
+            Patient(user=user, date_of_birth=date(1990, 1, 1), gender='other', address='1 Benchmark Road', contact_number=f'071{i:07d}')
+            for i, user in enumerate(users[:patients])
+        ])
+        doctor_rows = Doctor.objects.bulk_create([
+            Doctor(user=user, specialty=specialty, license_number=f'BENCH-{i}', contact_number=f'079{i:07d}')
+            for i, user in enumerate(users[patients:])
+        ])
+        if any(row.pk is None for row in patient_rows + doctor_rows):
+            patient_rows = list(Patient.objects.filter(user__in=users[:patients]))
+            doctor_rows = list(Doctor.objects.filter(user__in=users[patients:]))
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient_rows[i % patients], doctor=doctor_rows[i % doctors], date=date(2030, 1, 1) + timedelta(days=i // 8), time=clock(9 + i % 8, 0), reason_for_visit='Benchmark')
+            for i in range(rows)
+        ])
+        return Appointment.objects.filter(doctor__in=doctor_rows).order_by('date', 'time', 'id')
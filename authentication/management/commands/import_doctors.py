@@ -0,0 +1,9 @@
+# authentication/management/commands/import_doctors.py
+from authentication.onboarding import DoctorImporter
+
+from .import_patients import Command as ImportPatientsCommand
+
+
+class Command(ImportPatientsCommand):
+    help = 'Bulk-import doctors from a CSV or JSONL file.'
+    importer_class = DoctorImporter
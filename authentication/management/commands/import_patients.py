@@ -0,0 +1,33 @@
+# authentication/management/commands/import_patients.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.onboarding import DEFAULT_CHUNK_SIZE, PatientImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import patients from a CSV or JSONL file.'
+    importer_class = PatientImporter
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows inserted per transaction.')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (defaults to the CPU count).')
+        parser.add_argument('--no-welcome-email', action='store_true')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        try:
+            with path.open('rb') as stream:
+                rows = read_rows(stream, fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        importer = self.importer_class(chunk_size=options['chunk_size'], workers=options['workers'], send_welcome=not options['no_welcome_email'])
+        report = importer.import_rows(rows)
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(f"Imported {report['created']} of {len(rows)} row(s).")
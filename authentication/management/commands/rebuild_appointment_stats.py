@@ -0,0 +1,12 @@
+# authentication/management/commands/rebuild_appointment_stats.py
+from django.core.management.base import BaseCommand
+
+from authentication.reports import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily per-doctor appointment counts from Appointment in one grouped query.'
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_stats()
+        self.stdout.write(f'Rebuilt daily appointment counts: {count} doctor-day row{"" if count == 1 else "s"}.')
@@ -0,0 +1,14 @@
+# authentication/management/commands/rebuild_doctor_ratings.py
+from django.core.management.base import BaseCommand
+
+from authentication.directory import invalidate_directory
+from authentication.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute every doctor rating summary from Feedback in one grouped query.'
+
+    def handle(self, *args, **options):
+        count = rebuild_ratings()
+        invalidate_directory()
+        self.stdout.write(f'Rebuilt {count} doctor rating summar{"y" if count == 1 else "ies"}.')
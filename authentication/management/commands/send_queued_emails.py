@@ -0,0 +1,28 @@
+# authentication/management/commands/send_queued_emails.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.notifications import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending emails from the outbox, reusing one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting once it is drained.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            sent = send_queued_emails(options['batch_size'], options['max_attempts'])
+            total += sent
+            if sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'Sent {total} email(s).')
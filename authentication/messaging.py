@@ -0,0 +1,77 @@
+# authentication/messaging.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import publish_to_users
+from .models import Message
+from .serializers import MessageSerializer
+
+
+def unread_cache_key(user_id):
+    return f'unread-messages:{user_id}'
+
+
+def unread_messages(user_id):
+    return Message.objects.filter(recipient_id=user_id, is_archived=False, is_read=False)
+
+
+def unread_count(user_id):
+    """Return the user's unread inbox count.
+
+    The count lives in the cache and is adjusted when messages are sent or
+    read; on a miss it is recounted from message_inbox_idx.
+    """
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = unread_messages(user_id).count()
+        cache.set(key, count, getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 3600))
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    # Applied after commit so a rolled-back send or read leaves it alone.
+    def adjust():
+        try:
+            cache.incr(unread_cache_key(user_id), delta)
+        except ValueError:
+            # Not cached; the next read recounts.
+            pass
+    transaction.on_commit(adjust)
+
+
+def send_message(sender, recipient, content, thread=None):
+    message = Message.objects.create(sender=sender, recipient=recipient, content=content, thread=thread)
+    adjust_unread_count(recipient.pk, 1)
+    publish_to_users([recipient.pk], 'message', MessageSerializer(message).data)
+    return message
+
+
+def mark_read(user, message_ids):
+    """Mark the user's unread inbox messages among message_ids as read; return how many changed."""
+    updated = unread_messages(user.pk).filter(id__in=message_ids).update(is_read=True, updated_at=timezone.now())
+    if updated:
+        adjust_unread_count(user.pk, -updated)
+    return updated
+
+
+def participant_filter(user):
+    return Q(sender=user) | Q(recipient=user)
+
+
+def thread_messages(message, user):
+    """Return every message of message's conversation that the user sent or received, oldest first.
+
+    Replies carry the id of the conversation's first message in root, so
+    this is one query whatever the depth of the reply tree.
+    """
+    root_id = message.root_id or message.id
+    return list(
+        Message.objects.filter(Q(id=root_id) | Q(root_id=root_id))
+        .filter(participant_filter(user))
+        .select_related('sender', 'recipient')
+        .order_by('timestamp', 'id')
+    )
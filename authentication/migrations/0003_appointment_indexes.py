@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0002_allergy_emergencycontact_medicalcondition_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "date", "time"], name="appointment_doctor_slot_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "date", "time"], name="appointment_patient_slot_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "status", "date"], name="appointment_doctor_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "status", "date"],
+                name="appointment_patient_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "confirmed"])),
+                fields=["doctor", "date"],
+                name="appointment_doctor_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "confirmed"])),
+                fields=["patient", "date"],
+                name="appointment_patient_active_idx",
+            ),
+        ),
+    ]
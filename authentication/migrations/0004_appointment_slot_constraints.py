@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:51
+
+from django.db import migrations, models
+
+
+def cancel_double_bookings(apps, schema_editor):
+    # Keep the earliest booking for each slot and cancel the rest so the
+    # unique constraints below can be created on existing data.
+    Appointment = apps.get_model("authentication", "Appointment")
+    for owner in ("doctor", "patient"):
+        seen = set()
+        duplicates = []
+        rows = (
+            Appointment.objects.exclude(status="cancelled")
+            .order_by("id")
+            .values_list("id", f"{owner}_id", "date", "time")
+        )
+        for pk, owner_id, date, time in rows.iterator():
+            slot = (owner_id, date, time)
+            if slot in seen:
+                duplicates.append(pk)
+            else:
+                seen.add(slot)
+        Appointment.objects.filter(id__in=duplicates).update(status="cancelled")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0003_appointment_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "cancelled"), _negated=True),
+                fields=("doctor", "date", "time"),
+                name="appointment_doctor_slot_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "cancelled"), _negated=True),
+                fields=("patient", "date", "time"),
+                name="appointment_patient_slot_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def create_role_groups(apps, schema_editor):
+    # The registration views look these groups up by name.
+    Group = apps.get_model("auth", "Group")
+    for name in ("Patients", "Doctors"):
+        Group.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("authentication", "0005_outboundemail"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_role_groups, migrations.RunPython.noop),
+    ]
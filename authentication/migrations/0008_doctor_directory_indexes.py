@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("authentication", "0007_doctor_schedules"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                django.db.models.functions.text.Lower("full_name"),
+                name="customuser_full_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(
+                fields=["specialty", "is_available"], name="doctor_specialty_idx"
+            ),
+        ),
+    ]
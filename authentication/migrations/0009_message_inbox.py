@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_roots(apps, schema_editor):
+    # Follow each reply's thread chain up to the first message.
+    Message = apps.get_model("authentication", "Message")
+    parents = dict(
+        Message.objects.filter(thread__isnull=False).values_list("id", "thread_id")
+    )
+    updated = []
+    for message_id in parents:
+        root, seen = parents[message_id], {message_id}
+        while root in parents and root not in seen:
+            seen.add(root)
+            root = parents[root]
+        updated.append(Message(id=message_id, root_id=root))
+    Message.objects.bulk_update(updated, ["root"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0008_doctor_directory_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="root",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="thread_messages",
+                to="authentication.message",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["recipient", "is_archived", "is_read", "timestamp"],
+                name="message_inbox_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "timestamp"], name="message_outbox_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_roots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_ratings(apps, schema_editor):
+    Feedback = apps.get_model("authentication", "Feedback")
+    DoctorRating = apps.get_model("authentication", "DoctorRating")
+    stars = {f"stars_{i}": Count("id", filter=Q(rating=i)) for i in range(1, 6)}
+    rows = Feedback.objects.values("doctor").annotate(
+        count=Count("id"), total=Sum("rating"), **stars
+    )
+    DoctorRating.objects.bulk_create(
+        [DoctorRating(doctor_id=row.pop("doctor"), **row) for row in rows]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0009_message_inbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorRating",
+            fields=[
+                (
+                    "doctor",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_summary",
+                        serialize=False,
+                        to="authentication.doctor",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("stars_1", models.PositiveIntegerField(default=0)),
+                ("stars_2", models.PositiveIntegerField(default=0)),
+                ("stars_3", models.PositiveIntegerField(default=0)),
+                ("stars_4", models.PositiveIntegerField(default=0)),
+                ("stars_5", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
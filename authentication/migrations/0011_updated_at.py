@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0010_doctor_rating"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "updated_at"], name="appointment_doctor_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "updated_at"], name="appointment_patient_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["recipient", "updated_at"], name="message_recipient_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "updated_at"], name="message_sender_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="prescription",
+            index=models.Index(
+                fields=["doctor", "updated_at"], name="prescription_doctor_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="prescription",
+            index=models.Index(
+                fields=["patient", "updated_at"], name="prescription_patient_upd_idx"
+            ),
+        ),
+    ]
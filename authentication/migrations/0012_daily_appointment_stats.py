@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_daily_stats(apps, schema_editor):
+    Appointment = apps.get_model("authentication", "Appointment")
+    DailyAppointmentStats = apps.get_model("authentication", "DailyAppointmentStats")
+    counts = {
+        status: Count("id", filter=Q(status=status))
+        for status in ("pending", "confirmed", "cancelled")
+    }
+    counts["completed"] = Count(
+        "id", filter=Q(is_completed=True) & ~Q(status="cancelled")
+    )
+    rows = Appointment.objects.order_by().values("doctor", "date").annotate(**counts)
+    DailyAppointmentStats.objects.bulk_create(
+        [DailyAppointmentStats(doctor_id=row.pop("doctor"), **row) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0011_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyAppointmentStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("pending", models.PositiveIntegerField(default=0)),
+                ("confirmed", models.PositiveIntegerField(default=0)),
+                ("cancelled", models.PositiveIntegerField(default=0)),
+                ("completed", models.PositiveIntegerField(default=0)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="authentication.doctor",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["date"], name="daily_stats_date_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("doctor", "date"), name="daily_stats_doctor_date_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_daily_stats, migrations.RunPython.noop),
+    ]
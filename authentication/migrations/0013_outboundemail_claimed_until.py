@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0012_daily_appointment_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboundemail",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
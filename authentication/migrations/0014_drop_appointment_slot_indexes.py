@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0013_outboundemail_claimed_until"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointment_doctor_slot_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointment_patient_slot_idx",
+        ),
+    ]
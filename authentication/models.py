@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, Group
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import Permission
 from django.utils import timezone
+from django.db.models.functions import Lower
 
 # Custom User Model
 class CustomUser(AbstractUser):
@@ -14,6 +15,12 @@ class CustomUser(AbstractUser):
     groups = models.ManyToManyField(Group, verbose_name=_('groups'), blank=True, related_name='customuser_set', related_query_name='user')
     user_permissions = models.ManyToManyField(Permission, verbose_name=_('user permissions'), blank=True, related_name='customuser_set', related_query_name='user')
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive name prefix search (doctor directory)
+            models.Index(Lower('full_name'), name='customuser_full_name_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -89,9 +96,74 @@ class Doctor(models.Model):
         )
     ], unique=True, default='')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['specialty', 'is_available'], name='doctor_specialty_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
 
+# Doctor Schedule Model
+class DoctorSchedule(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveIntegerField(default=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'weekday'], name='schedule_doctor_weekday_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.user.username} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+# Schedule Exception Model
+class ScheduleException(models.Model):
+    # Time off; a missing start/end time blocks the whole day.
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedule_exceptions')
+    date = models.DateField()
+    start_time = models.TimeField(blank=True, null=True)
+    end_time = models.TimeField(blank=True, null=True)
+    reason = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='exception_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.user.username} - {self.date}"
+
+# Appointment QuerySet
+class AppointmentQuerySet(models.QuerySet):
+    def active(self):
+        return self.exclude(status='cancelled')
+
+    def for_listing(self):
+        # Fetch everything AppointmentSerializer touches up front so list
+        # responses cost a fixed number of queries regardless of row count.
+        return self.select_related(
+            'patient__user',
+            'patient__emergency_contact',
+            'doctor__user',
+            'prescription',
+        ).prefetch_related(
+            'patient__allergies',
+        )
+
 # Appointment Model
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -109,10 +181,55 @@ class Appointment(models.Model):
     additional_notes = models.TextField(blank=True, null=True)
     is_completed = models.BooleanField(default=False)
     prescription = models.ForeignKey('Prescription', on_delete=models.SET_NULL, blank=True, null=True)
+    # Bumped on every save; queryset.update() callers must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Dashboard listings filtered by status and date range
+            models.Index(fields=['doctor', 'status', 'date'], name='appointment_doctor_status_idx'),
+            models.Index(fields=['patient', 'status', 'date'], name='appointment_patient_status_idx'),
+            # Upcoming (non-cancelled) appointments only
+            models.Index(fields=['doctor', 'date'], condition=models.Q(status__in=['pending', 'confirmed']), name='appointment_doctor_active_idx'),
+            models.Index(fields=['patient', 'date'], condition=models.Q(status__in=['pending', 'confirmed']), name='appointment_patient_active_idx'),
+            # List ETags (MAX(updated_at)) and since= deltas
+            models.Index(fields=['doctor', 'updated_at'], name='appointment_doctor_upd_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='appointment_patient_upd_idx'),
+        ]
+        constraints = [
+            # A doctor or patient can hold only one non-cancelled appointment
+            # per slot; their indexes also serve the booking conflict checks.
+            models.UniqueConstraint(fields=['doctor', 'date', 'time'], condition=~models.Q(status='cancelled'), name='appointment_doctor_slot_unique'),
+            models.UniqueConstraint(fields=['patient', 'date', 'time'], condition=~models.Q(status='cancelled'), name='appointment_patient_slot_unique'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The doctor's DailyAppointmentStats rows are adjusted by signals;
+        # keep them in the same transaction as the appointment.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.patient.user.username} - {self.doctor.user.username} - {self.date}"
 
+# Prescription QuerySet
+class PrescriptionQuerySet(models.QuerySet):
+    def for_listing(self):
+        # Everything PrescriptionSerializer touches, as in AppointmentQuerySet
+        return self.select_related(
+            'patient__user',
+            'patient__emergency_contact',
+            'doctor__user',
+        ).prefetch_related(
+            'patient__allergies',
+        )
+
 # Prescription Model
 class Prescription(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
@@ -125,6 +242,16 @@ class Prescription(models.Model):
     date_prescribed = models.DateField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PrescriptionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # List ETags and since= deltas, as on Appointment
+            models.Index(fields=['doctor', 'updated_at'], name='prescription_doctor_upd_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='prescription_patient_upd_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.user.username} - {self.doctor.user.username} - {self.medication}"
@@ -139,6 +266,26 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     is_archived = models.BooleanField(default=False)
     thread = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='replies')
+    # First message of the conversation (None for the first message itself),
+    # so a whole thread is one indexed lookup instead of a walk over replies.
+    root = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='thread_messages')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Inbox listing and unread counts
+            models.Index(fields=['recipient', 'is_archived', 'is_read', 'timestamp'], name='message_inbox_idx'),
+            # Outbox listing
+            models.Index(fields=['sender', 'timestamp'], name='message_outbox_idx'),
+            # List ETags and since= deltas
+            models.Index(fields=['recipient', 'updated_at'], name='message_recipient_upd_idx'),
+            models.Index(fields=['sender', 'updated_at'], name='message_sender_upd_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.thread_id and not self.root_id:
+            self.root_id = self.thread.root_id or self.thread_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sender.username} - {self.recipient.username} - {self.timestamp}"
@@ -151,7 +298,82 @@ class Feedback(models.Model):
     rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     comments = models.TextField(blank=True, null=True)
 
+    def save(self, *args, **kwargs):
+        # The doctor's DoctorRating is adjusted by signals; keep both writes
+        # in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.patient.user.username} - {self.doctor.user.username} - {self.rating}"
 
+# Doctor Rating Model
+class DoctorRating(models.Model):
+    # Running totals over the doctor's Feedback, updated incrementally by
+    # signals; `manage.py rebuild_doctor_ratings` recomputes them.
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
 
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    def __str__(self):
+        return f"{self.doctor.user.username} - {self.count} ratings"
+
+# Daily Appointment Stats Model
+class DailyAppointmentStats(models.Model):
+    # Per-doctor appointment counts for one day, by status, kept up to date
+    # by signals for the reporting endpoint; `manage.py
+    # rebuild_appointment_stats` recomputes them. completed counts the
+    # non-cancelled appointments that were completed, so past pending or
+    # confirmed ones beyond it are no-shows.
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    pending = models.PositiveIntegerField(default=0)
+    confirmed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='daily_stats_doctor_date_unique'),
+        ]
+        indexes = [
+            # Clinic-wide range queries
+            models.Index(fields=['date'], name='daily_stats_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.user.username} - {self.date}"
+
+# Outbound Email Model
+class OutboundEmail(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    # Set while a worker is sending the email; other workers skip it until then
+    claimed_until = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(sent_at__isnull=True), name='outboundemail_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {', '.join(self.recipients)}"
@@ -0,0 +1,119 @@
+# authentication/notifications.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundEmail
+
+DEFAULT_QUEUE = 'authentication.notifications.OutboxQueue'
+
+
+class OutboxQueue:
+    """Store emails in the OutboundEmail table for the send_queued_emails worker."""
+
+    def enqueue(self, subject, body, from_email, recipients):
+        OutboundEmail.objects.create(subject=subject, body=body, from_email=from_email, recipients=recipients)
+
+    def enqueue_many(self, messages):
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject=subject, body=body, from_email=from_email, recipients=recipients)
+            for subject, body, from_email, recipients in messages
+        ])
+
+
+class ImmediateQueue:
+    """Send emails straight away through EMAIL_BACKEND; handy for local development."""
+
+    def enqueue(self, subject, body, from_email, recipients):
+        EmailMessage(subject, body, from_email, recipients).send()
+
+    def enqueue_many(self, messages):
+        with get_connection() as connection:
+            connection.send_messages([EmailMessage(*message) for message in messages])
+
+
+def get_queue():
+    return import_string(getattr(settings, 'NOTIFICATION_QUEUE', DEFAULT_QUEUE))()
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """Hand an email to the notification queue once the current transaction commits.
+
+    Nothing is queued if the transaction rolls back, and no SMTP work happens
+    while the caller still holds the transaction open.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    queue = get_queue()
+    transaction.on_commit(lambda: queue.enqueue(subject, body, from_email, list(recipients)))
+
+
+def queue_emails(messages, from_email=None):
+    """Queue many (subject, body, recipients) emails on commit in one batch."""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    messages = [(subject, body, from_email, list(recipients)) for subject, body, recipients in messages]
+    if messages:
+        queue = get_queue()
+        transaction.on_commit(lambda: queue.enqueue_many(messages))
+
+
+def patient_welcome_email(user):
+    return (
+        'Welcome to Our Health Service',
+        f'Hello {user.full_name},\n\nThank you for registering as a patient. We are here to take care of your health.',
+        [user.email],
+    )
+
+
+def doctor_welcome_email(user):
+    return (
+        'Welcome to Our Health Service',
+        f'Hello Dr. {user.full_name},\n\nThank you for registering as a doctor. We are excited to have you on board.',
+        [user.email],
+    )
+
+
+def send_queued_emails(batch_size=100, max_attempts=5, claim_seconds=300):
+    """Deliver one batch of pending outbox emails over a single SMTP connection.
+
+    The batch is claimed in a short transaction and sent after it commits,
+    so no row locks are held while the SMTP server is slow. Emails claimed by
+    a worker that died are picked up again once claim_seconds have passed.
+    Returns the number of emails sent.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers claim batches at the same time
+        # without blocking on each other (where the backend supports row locks).
+        pending = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now), sent_at__isnull=True, attempts__lt=max_attempts)
+            .order_by('id')[:batch_size]
+        )
+        if not pending:
+            return 0
+        for email in pending:
+            email.attempts += 1
+            email.claimed_until = now + timedelta(seconds=claim_seconds)
+        OutboundEmail.objects.bulk_update(pending, ['attempts', 'claimed_until'])
+
+    sent = 0
+    with get_connection() as connection:
+        for email in pending:
+            email.claimed_until = None
+            try:
+                connection.send_messages([EmailMessage(email.subject, email.body, email.from_email, email.recipients)])
+            except Exception as e:
+                email.last_error = str(e)
+            else:
+                email.sent_at = timezone.now()
+                email.last_error = None
+                sent += 1
+
+    # bulk_update runs in a transaction of its own
+    OutboundEmail.objects.bulk_update(pending, ['sent_at', 'last_error', 'claimed_until'])
+    return sent
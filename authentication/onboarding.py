@@ -0,0 +1,292 @@
+# authentication/onboarding.py
+import csv
+import io
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+
+from .forms import PASSWORD_HELP, PASSWORD_PATTERN, PHONE_PATTERN
+from .directory import invalidate_directory
+from .models import CustomUser, Patient, Doctor, Specialization, Allergy, MedicalCondition
+from .notifications import queue_emails, patient_welcome_email, doctor_welcome_email
+from .roles import DOCTORS, PATIENTS
+from .screening import invalidate_allergen_index
+
+DEFAULT_CHUNK_SIZE = 500
+GENDERS = {value for value, label in Patient._meta.get_field('gender').choices}
+username_validator = UnicodeUsernameValidator()
+
+
+def read_rows(stream, fmt):
+    """Parse an uploaded CSV or JSONL stream into a list of dicts."""
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    if fmt == 'jsonl':
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    raise ValueError(f'Unsupported format: {fmt}')
+
+
+def split_names(value):
+    # CSV cells carry "a; b" lists, JSONL rows carry real lists.
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(';', ',').split(',')
+    return [name.strip() for name in value if name.strip()]
+
+
+def _init_hash_worker():
+    # Workers started with "spawn" don't inherit the configured settings.
+    django.setup()
+
+
+@contextmanager
+def password_pool(workers=None):
+    """A process pool for hash_passwords(), or None to hash in-process (workers=1)."""
+    if workers == 1:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        yield pool
+
+
+def hash_passwords(passwords, pool=None):
+    """Hash passwords, in the pool if given; None entries get an unusable password."""
+    if pool is None or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=64))
+
+
+class BulkImporter:
+    """Validate and insert users of one role in set-based queries and chunked transactions.
+
+    Each row is a dict of registration fields. import_rows() returns
+    {'created': int, 'errors': [{'row': index, 'errors': {...}}]} where
+    index is the 1-based position of the row in the input.
+    """
+    group_name = None
+    profile_model = None
+    welcome_email = None
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, send_welcome=True):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.send_welcome = send_welcome
+
+    def import_rows(self, rows):
+        errors = {}
+        cleaned = {}
+        for index, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                errors[index] = {'__all__': ['Each row must be an object.']}
+                continue
+            try:
+                cleaned[index] = self.clean_row(row)
+            except ValidationError as e:
+                errors[index] = e.message_dict
+        self.check_unique(cleaned, errors)
+
+        valid = [(index, data) for index, data in cleaned.items() if index not in errors]
+        created = 0
+        # One pool for every chunk; its workers start on the first hash.
+        with password_pool(self.workers) as pool:
+            for start in range(0, len(valid), self.chunk_size):
+                chunk = valid[start:start + self.chunk_size]
+                # Hashing is the slow part; keep it out of the transaction.
+                hashes = hash_passwords([data['password'] for index, data in chunk], pool)
+                try:
+                    with transaction.atomic():
+                        self.insert_chunk([data for index, data in chunk], hashes)
+                    created += len(chunk)
+                except IntegrityError as e:
+                    # Lost a race with a concurrent registration; report the whole chunk.
+                    for index, data in chunk:
+                        errors[index] = {'__all__': [f'Chunk failed: {e}']}
+
+        return {'created': created, 'errors': [{'row': index, 'errors': errors[index]} for index in sorted(errors)]}
+
+    # Validation
+
+    def clean_user(self, row):
+        errors = {}
+        data = {
+            'username': (row.get('username') or '').strip(),
+            'email': (row.get('email') or '').strip(),
+            'full_name': (row.get('full_name') or '').strip() or None,
+            'password': row.get('password') or None,
+        }
+        try:
+            username_validator(data['username'])
+            if not data['username']:
+                raise ValidationError('This field is required.')
+        except ValidationError as e:
+            errors['username'] = e.messages
+        try:
+            validate_email(data['email'])
+        except ValidationError as e:
+            errors['email'] = e.messages
+        if data['password'] and not re.match(PASSWORD_PATTERN, data['password']):
+            errors['password'] = [PASSWORD_HELP]
+        return data, errors
+
+    def clean_row(self, row):
+        raise NotImplementedError
+
+    def check_unique(self, cleaned, errors):
+        # One query per unique column for the whole file, plus in-file duplicates.
+        self.check_unique_field(cleaned, errors, CustomUser, 'username', 'A user with that username already exists.')
+        self.check_unique_field(cleaned, errors, CustomUser, 'email', 'Email is already in use.')
+
+    def check_unique_field(self, cleaned, errors, model, field, message):
+        values = {data[field] for index, data in cleaned.items() if index not in errors}
+        taken = set(model.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+        seen = set()
+        for index, data in cleaned.items():
+            if index in errors:
+                continue
+            if data[field] in taken or data[field] in seen:
+                errors[index] = {field: [message]}
+            seen.add(data[field])
+
+    # Insertion
+
+    def insert_chunk(self, chunk, hashes):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=data['username'], email=data['email'], full_name=data['full_name'], password=password)
+            for data, password in zip(chunk, hashes)
+        ])
+        if any(user.pk is None for user in users):
+            # Backends without RETURNING support don't set primary keys.
+            ids = dict(CustomUser.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        profiles = self.profile_model.objects.bulk_create([self.build_profile(user, data) for user, data in zip(users, chunk)])
+        self.after_profiles_created(profiles, chunk)
+
+        group, created = Group.objects.get_or_create(name=self.group_name)
+        CustomUser.groups.through.objects.bulk_create([CustomUser.groups.through(customuser_id=user.pk, group_id=group.pk) for user in users])
+        Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+        if self.send_welcome:
+            queue_emails([self.welcome_email(user) for user in users if user.email])
+
+    def build_profile(self, user, data):
+        raise NotImplementedError
+
+    def after_profiles_created(self, profiles, chunk):
+        pass
+
+
+class PatientImporter(BulkImporter):
+    group_name = PATIENTS
+    profile_model = Patient
+    welcome_email = staticmethod(patient_welcome_email)
+
+    def clean_row(self, row):
+        data, errors = self.clean_user(row)
+        try:
+            data['date_of_birth'] = date.fromisoformat((row.get('date_of_birth') or '').strip())
+            if data['date_of_birth'] > date.today():
+                errors['date_of_birth'] = ['Date of birth cannot be in the future.']
+        except ValueError:
+            errors['date_of_birth'] = ['Enter a valid date (YYYY-MM-DD).']
+        data['gender'] = (row.get('gender') or '').strip().lower()
+        if data['gender'] not in GENDERS:
+            errors['gender'] = [f'Select one of: {", ".join(sorted(GENDERS))}.']
+        data['address'] = (row.get('address') or '').strip()
+        if not data['address']:
+            errors['address'] = ['This field is required.']
+        data['contact_number'] = (row.get('contact_number') or '').strip()
+        if not re.match(PHONE_PATTERN, data['contact_number']):
+            errors['contact_number'] = ['Enter a valid international phone number.']
+        data['blood_type'] = (row.get('blood_type') or '').strip() or None
+        if data['blood_type'] and len(data['blood_type']) > 5:
+            errors['blood_type'] = ['Ensure this value has at most 5 characters.']
+        data['allergies'] = split_names(row.get('allergies'))
+        data['medical_conditions'] = split_names(row.get('medical_conditions'))
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+    def build_profile(self, user, data):
+        return Patient(user=user, date_of_birth=data['date_of_birth'], gender=data['gender'], address=data['address'], contact_number=data['contact_number'], blood_type=data['blood_type'])
+
+    def after_profiles_created(self, profiles, chunk):
+        if any(patient.pk is None for patient in profiles):
+            ids = dict(Patient.objects.filter(user__in=[patient.user_id for patient in profiles]).values_list('user_id', 'pk'))
+            for patient in profiles:
+                patient.pk = ids[patient.user_id]
+        self.link_names(profiles, chunk, 'allergies', Allergy)
+        self.link_names(profiles, chunk, 'medical_conditions', MedicalCondition)
+
+    def link_names(self, patients, chunk, field, model):
+        # Resolve names to rows in one query, creating the missing ones in bulk.
+        names = {name for data in chunk for name in data[field]}
+        if not names:
+            return
+        by_name = dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+        missing = names - by_name.keys()
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in sorted(missing)])
+            transaction.on_commit(invalidate_allergen_index)
+            by_name.update(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+        through = getattr(Patient, field).through
+        target = f'{model._meta.model_name}_id'
+        links = {(patient.pk, by_name[name]) for patient, data in zip(patients, chunk) for name in data[field]}
+        through.objects.bulk_create([through(patient_id=patient_id, **{target: target_id}) for patient_id, target_id in links])
+
+
+
+class DoctorImporter(BulkImporter):
+    group_name = DOCTORS
+    profile_model = Doctor
+    welcome_email = staticmethod(doctor_welcome_email)
+
+    def import_rows(self, rows):
+        self.specialties = {}
+        for specialty_id, name in Specialization.objects.values_list('id', 'name'):
+            self.specialties[str(specialty_id)] = specialty_id
+            self.specialties[name.lower()] = specialty_id
+        return super().import_rows(rows)
+
+    def clean_row(self, row):
+        data, errors = self.clean_user(row)
+        data['specialty_id'] = self.specialties.get(str(row.get('specialty') or '').strip().lower())
+        if data['specialty_id'] is None:
+            errors['specialty'] = ['Unknown specialization.']
+        data['license_number'] = (row.get('license_number') or '').strip()
+        if not data['license_number']:
+            errors['license_number'] = ['This field is required.']
+        data['contact_number'] = (row.get('contact_number') or '').strip()
+        if not re.match(PHONE_PATTERN, data['contact_number']):
+            errors['contact_number'] = ['Enter a valid international phone number.']
+        data['bio'] = (row.get('bio') or '').strip() or None
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+    def check_unique(self, cleaned, errors):
+        super().check_unique(cleaned, errors)
+        self.check_unique_field(cleaned, errors, Doctor, 'license_number', 'License number must be unique.')
+        self.check_unique_field(cleaned, errors, Doctor, 'contact_number', 'Contact number must be unique.')
+
+    def after_profiles_created(self, profiles, chunk):
+        # bulk_create skips post_save, which normally refreshes the directory.
+        transaction.on_commit(invalidate_directory)
+
+    def build_profile(self, user, data):
+        return Doctor(user=user, specialty_id=data['specialty_id'], license_number=data['license_number'], contact_number=data['contact_number'], bio=data['bio'])
@@ -0,0 +1,130 @@
+# authentication/pagination.py
+import base64
+import json
+from datetime import date, datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+KEYSET_ORDERING = ('date', 'time', 'id')
+MESSAGE_ORDERING = ('-timestamp', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(appointment):
+    # Rows are model instances or .values() dicts (compact lists).
+    if isinstance(appointment, dict):
+        raw = f"{appointment['date'].isoformat()}|{appointment['time'].isoformat()}|{appointment['id']}"
+    else:
+        raw = f'{appointment.date.isoformat()}|{appointment.time.isoformat()}|{appointment.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        cursor_date, cursor_time, cursor_id = raw.split('|')
+        return date.fromisoformat(cursor_date), time.fromisoformat(cursor_time), int(cursor_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+def parse_page_size(value):
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise InvalidCursor('page_size must be an integer.')
+    if page_size < 1:
+        raise InvalidCursor('page_size must be positive.')
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def after_cursor(appointments, cursor):
+    # Keyset condition for (date, time, id) > cursor, which lets the
+    # database seek straight to the page instead of counting past OFFSET rows.
+    cursor_date, cursor_time, cursor_id = decode_cursor(cursor)
+    return appointments.filter(
+        Q(date__gt=cursor_date)
+        | Q(date=cursor_date, time__gt=cursor_time)
+        | Q(date=cursor_date, time=cursor_time, id__gt=cursor_id)
+    )
+
+
+def page_queryset(appointments, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    appointments = appointments.order_by(*KEYSET_ORDERING)
+    if cursor:
+        appointments = after_cursor(appointments, cursor)
+    # Fetch one extra row to learn whether another page exists.
+    return appointments[:page_size + 1]
+
+
+def split_page(rows, page_size):
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def paginate_appointments(appointments, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return one keyset page of appointments and the cursor for the next page."""
+    return split_page(list(page_queryset(appointments, cursor, page_size)), page_size)
+
+
+async def apaginate_appointments(appointments, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    return split_page([row async for row in page_queryset(appointments, cursor, page_size)], page_size)
+
+
+def stream_appointments(appointments, serializer_class, chunk_size=DEFAULT_PAGE_SIZE):
+    """Yield a JSON array of serialized appointments one keyset chunk at a time."""
+    yield '['
+    cursor = None
+    first = True
+    while True:
+        rows, cursor = paginate_appointments(appointments, cursor, chunk_size)
+        for item in serializer_class(rows, many=True).data:
+            yield ('' if first else ',') + json.dumps(item, cls=DjangoJSONEncoder)
+            first = False
+        if cursor is None:
+            break
+    yield ']'
+
+
+async def astream_appointments(appointments, serializer_class, chunk_size=DEFAULT_PAGE_SIZE):
+    """Async twin of stream_appointments() for async views."""
+    yield '['
+    cursor = None
+    first = True
+    while True:
+        rows, cursor = await apaginate_appointments(appointments, cursor, chunk_size)
+        for item in serializer_class(rows, many=True).data:
+            yield ('' if first else ',') + json.dumps(item, cls=DjangoJSONEncoder)
+            first = False
+        if cursor is None:
+            break
+    yield ']'
+
+
+def encode_message_cursor(message):
+    raw = f'{message.timestamp.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def paginate_messages(messages, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return one keyset page of messages, newest first, and the next cursor."""
+    messages = messages.order_by(*MESSAGE_ORDERING)
+    if cursor:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            cursor_timestamp, cursor_id = raw.split('|')
+            cursor_timestamp, cursor_id = datetime.fromisoformat(cursor_timestamp), int(cursor_id)
+        except (ValueError, UnicodeError):
+            raise InvalidCursor('Invalid cursor.')
+        messages = messages.filter(Q(timestamp__lt=cursor_timestamp) | Q(timestamp=cursor_timestamp, id__lt=cursor_id))
+    rows = list(messages[:page_size + 1])
+    next_cursor = encode_message_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
@@ -1,11 +1,11 @@
 # authentication/permissions.py
 from rest_framework.permissions import BasePermission
+from .roles import is_doctor, is_patient
 
 class IsDoctor(BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Doctors').exists()
+        return is_doctor(request.user)
 
 class IsPatient(BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Patients').exists()
-
+        return is_patient(request.user)
@@ -0,0 +1,169 @@
+# authentication/profiling.py
+# Opt-in query profiling. Every statement a request runs is grouped by its
+# normalized shape; a shape that repeats PROFILING["REPEAT_THRESHOLD"] times
+# is an N+1 signature and is logged with the application stack that issued
+# it, as is any query slower than SLOW_QUERY_MS. A PROFILE_SAMPLE_RATE
+# fraction of requests is also run under cProfile, dumped to PROFILE_DIR.
+# query_budget() applies the same grouping to a block of test code. Queries
+# reach the profile through instrumentation's shared query hook.
+import cProfile
+import logging
+import random
+import re
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from . import instrumentation
+from .instrumentation import ainstall_query_hook, endpoint_name, install_query_hook, observing_queries
+
+logger = logging.getLogger(__name__)
+
+# Literals and placeholder lists that differ between calls of the same query
+IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def profiling_settings():
+    return {
+        'ENABLED': False, 'SLOW_QUERY_MS': 100, 'REPEAT_THRESHOLD': 5, 'PROFILE_SAMPLE_RATE': 0.0,
+        'PROFILE_DIR': Path(settings.BASE_DIR) / 'profiles', **getattr(settings, 'PROFILING', {}),
+    }
+
+
+def normalize(sql):
+    """Return sql with literals and IN lists replaced, so calls with different arguments match."""
+    sql = IN_LIST.sub('(...)', sql)
+    sql = STRING.sub('?', sql)
+    return NUMBER.sub('?', sql)
+
+
+HOOK_FILES = {__file__, instrumentation.__file__}
+
+
+def caller_stack():
+    # Frames from this project only; the ORM and DRF frames between them
+    # say nothing about which line to fix.
+    base = str(settings.BASE_DIR)
+    return [
+        f'{frame.filename.removeprefix(base + "/")}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base) and frame.filename not in HOOK_FILES and '/site-packages/' not in frame.filename
+    ]
+
+
+class QueryProfile:
+    """The queries run while a profile is current, grouped by normalized statement."""
+
+    def __init__(self, repeat_threshold=5, slow_query_ms=100):
+        self.repeat_threshold = repeat_threshold
+        self.slow_query_ms = slow_query_ms
+        self.groups = {}
+        self.slow = []
+
+    @property
+    def count(self):
+        return sum(group['count'] for group in self.groups.values())
+
+    def record(self, sql, seconds):
+        shape = normalize(sql)
+        group = self.groups.get(shape)
+        if group is None:
+            group = self.groups[shape] = {'count': 0, 'seconds': 0.0, 'stack': None}
+        group['count'] += 1
+        group['seconds'] += seconds
+        # The stack is taken once a shape repeats, which is where an N+1
+        # loop shows up; one-off queries don't pay for it.
+        if group['count'] == 2:
+            group['stack'] = caller_stack()
+        if seconds * 1000 >= self.slow_query_ms:
+            self.slow.append({'sql': sql, 'ms': round(seconds * 1000, 3), 'stack': caller_stack()})
+
+    def repeated(self):
+        """Return [(shape, group)] for shapes run at least repeat_threshold times, most frequent first."""
+        found = [(shape, group) for shape, group in self.groups.items() if group['count'] >= self.repeat_threshold]
+        return sorted(found, key=lambda item: -item[1]['count'])
+
+    def report(self, everything=False):
+        lines = [f'{self.count} queries, {len(self.groups)} distinct']
+        for shape, group in (self.groups.items() if everything else self.repeated()):
+            lines.append(f'{group["count"]}x ({group["seconds"] * 1000:.1f} ms) {shape}')
+            lines += [f'    {frame}' for frame in group['stack'] or []]
+        for query in self.slow:
+            lines.append(f'slow ({query["ms"]} ms) {query["sql"]}')
+            lines += [f'    {frame}' for frame in query['stack']]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, repeat_threshold=None):
+    """Fail with a grouped report if the block runs more than max_queries
+    queries, or any statement shape repeat_threshold times or more.
+
+        with query_budget(4, repeat_threshold=3):
+            self.client.get(url)
+    """
+    install_query_hook()
+    profile = QueryProfile(repeat_threshold or max_queries + 1, slow_query_ms=float('inf'))
+    with observing_queries(profile.record):
+        yield profile
+    if profile.count > max_queries or profile.repeated():
+        raise AssertionError(f'Query budget of {max_queries} exceeded\n{profile.report(everything=True)}')
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = profiling_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_threshold = config['REPEAT_THRESHOLD']
+        self.slow_query_ms = config['SLOW_QUERY_MS']
+        self.sample_rate = config['PROFILE_SAMPLE_RATE']
+        self.profile_dir = Path(config['PROFILE_DIR'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_hook()
+        profile = QueryProfile(self.repeat_threshold, self.slow_query_ms)
+        profiler = cProfile.Profile() if random.random() < self.sample_rate else None
+        with observing_queries(profile.record):
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        self.finish(request, profile, profiler)
+        return response
+
+    async def __acall__(self, request):
+        # cProfile only sees the thread it runs in, which for an async view
+        # is the event loop and not its ORM calls; async requests get the
+        # query checks only.
+        await ainstall_query_hook()
+        profile = QueryProfile(self.repeat_threshold, self.slow_query_ms)
+        with observing_queries(profile.record):
+            response = await self.get_response(request)
+        self.finish(request, profile, None)
+        return response
+
+    def finish(self, request, profile, profiler):
+        endpoint = endpoint_name(request)
+        if profile.repeated() or profile.slow:
+            logger.warning('%s %s (%s): %s', request.method, request.path, endpoint, profile.report())
+        if profiler is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            path = self.profile_dir / f'{endpoint}-{request.method}-{timezone.now():%Y%m%dT%H%M%S%f}.prof'
+            profiler.dump_stats(path)
+            logger.info('Profiled %s %s to %s', request.method, request.path, path)
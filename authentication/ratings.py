@@ -0,0 +1,35 @@
+# authentication/ratings.py
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import DoctorRating, Feedback
+
+STAR_FIELDS = {stars: f'stars_{stars}' for stars in range(1, 6)}
+
+
+def adjust_rating(doctor_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one rating from a doctor's summary."""
+    star_field = STAR_FIELDS[rating]
+    updated = DoctorRating.objects.filter(doctor_id=doctor_id).update(
+        count=F('count') + sign, total=F('total') + sign * rating, **{star_field: F(star_field) + sign},
+    )
+    if updated or sign < 0:
+        return
+    try:
+        # First rating for this doctor
+        with transaction.atomic():
+            DoctorRating.objects.create(doctor_id=doctor_id, count=1, total=rating, **{star_field: 1})
+    except IntegrityError:
+        # A concurrent first rating created the row in the meantime.
+        adjust_rating(doctor_id, rating, sign)
+
+
+def rebuild_ratings():
+    """Recompute every summary from Feedback with one grouped query; return how many were written."""
+    stars = {field: Count('id', filter=Q(rating=stars)) for stars, field in STAR_FIELDS.items()}
+    rows = Feedback.objects.order_by().values('doctor').annotate(count=Count('id'), total=Sum('rating'), **stars)
+    summaries = [DoctorRating(doctor_id=row.pop('doctor'), **row) for row in rows]
+    with transaction.atomic():
+        DoctorRating.objects.all().delete()
+        DoctorRating.objects.bulk_create(summaries)
+    return len(summaries)
@@ -0,0 +1,134 @@
+# authentication/reports.py
+# Clinic appointment statistics, answered from the DailyAppointmentStats
+# rollup (one row per doctor and day) instead of grouping years of
+# Appointment rows.
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Appointment, DailyAppointmentStats
+
+STATUSES = ('pending', 'confirmed', 'cancelled')
+COUNT_FIELDS = (*STATUSES, 'completed')
+REPORT_DAYS = 30
+MAX_REPORT_DAYS = 5 * 366
+# Columns each grouping adds to the rows; None marks the rollup's own fields
+GROUPINGS = {
+    'day': {'date': None},
+    'doctor': {'doctor_id': None, 'doctor_name': F('doctor__user__full_name')},
+    'specialty': {'specialty_id': F('doctor__specialty_id'), 'specialty_name': F('doctor__specialty__name')},
+}
+
+
+class InvalidReport(ValueError):
+    pass
+
+
+def stat_fields(status, is_completed):
+    """Return the rollup counters one appointment in this state adds to."""
+    if status not in STATUSES:
+        return []
+    return [status, 'completed'] if is_completed and status != 'cancelled' else [status]
+
+
+def adjust_daily_counts(doctor_id, day, counts):
+    """Apply {counter: delta} to the doctor's counts for day."""
+    counts = {field: delta for field, delta in counts.items() if delta}
+    if not counts:
+        return
+    updated = DailyAppointmentStats.objects.filter(doctor_id=doctor_id, date=day).update(**{field: F(field) + delta for field, delta in counts.items()})
+    if updated or all(delta < 0 for delta in counts.values()):
+        return
+    try:
+        # First appointment for this doctor and day
+        with transaction.atomic():
+            DailyAppointmentStats.objects.create(doctor_id=doctor_id, date=day, **{field: max(delta, 0) for field, delta in counts.items()})
+    except IntegrityError:
+        # A concurrent booking created the row in the meantime.
+        adjust_daily_counts(doctor_id, day, counts)
+
+
+def adjust_daily_stats(doctor_id, day, status, is_completed, delta):
+    """Add delta appointments in this state to the doctor's counts for day."""
+    adjust_daily_counts(doctor_id, day, {field: delta for field in stat_fields(status, is_completed)})
+
+
+def rebuild_daily_stats():
+    """Recompute every doctor's daily counts with one grouped query; return how many rows were written."""
+    counts = {status: Count('id', filter=Q(status=status)) for status in STATUSES}
+    counts['completed'] = Count('id', filter=Q(is_completed=True) & ~Q(status='cancelled'))
+    rows = Appointment.objects.order_by().values('doctor', 'date').annotate(**counts)
+    stats = [DailyAppointmentStats(doctor_id=row.pop('doctor'), **row) for row in rows]
+    with transaction.atomic():
+        DailyAppointmentStats.objects.all().delete()
+        DailyAppointmentStats.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+def parse_report(params):
+    """Normalize report query params into (date_from, date_to, group_by, doctor, specialty)."""
+    try:
+        date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else timezone.localdate()
+        date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else date_to - timedelta(days=REPORT_DAYS - 1)
+    except ValueError:
+        raise InvalidReport('date_from and date_to must be YYYY-MM-DD dates.')
+    if date_to < date_from or (date_to - date_from).days >= MAX_REPORT_DAYS:
+        raise InvalidReport(f'date_to must be on or after date_from, at most {MAX_REPORT_DAYS} days later.')
+    group_by = [name for name in (params.get('group_by') or '').split(',') if name]
+    unknown = set(group_by) - set(GROUPINGS)
+    if unknown or len(set(group_by)) != len(group_by):
+        raise InvalidReport(f'group_by must be a comma-separated subset of: {", ".join(GROUPINGS)}.')
+    try:
+        doctor = int(params['doctor']) if params.get('doctor') else None
+        specialty = int(params['specialty']) if params.get('specialty') else None
+    except ValueError:
+        raise InvalidReport('doctor and specialty must be integers.')
+    return date_from, date_to, group_by, doctor, specialty
+
+
+def with_rates(row):
+    # Sums over no rows, or over no past days, come back as None
+    for field in (*COUNT_FIELDS, 'no_shows', 'past_scheduled'):
+        row[field] = row[field] or 0
+    row['total'] = sum(row[status] for status in STATUSES)
+    row['cancellation_rate'] = round(row['cancelled'] / row['total'], 4) if row['total'] else None
+    row['no_show_rate'] = round(row['no_shows'] / row['past_scheduled'], 4) if row['past_scheduled'] else None
+    return row
+
+
+def appointment_report(report):
+    """Return appointment counts and cancellation/no-show rates over the range, grouped as asked.
+
+    No-shows are past appointments that were neither cancelled nor
+    completed; today's don't count yet.
+    """
+    date_from, date_to, group_by, doctor, specialty = report
+    stats = DailyAppointmentStats.objects.filter(date__range=(date_from, date_to))
+    if doctor:
+        stats = stats.filter(doctor_id=doctor)
+    if specialty:
+        stats = stats.filter(doctor__specialty_id=specialty)
+    past = Q(date__lt=timezone.localdate())
+    # Ahead of the plain sums, which would shadow the fields in these F()s
+    sums = {
+        'past_scheduled': Sum(F('pending') + F('confirmed'), filter=past),
+        'no_shows': Sum(F('pending') + F('confirmed') - F('completed'), filter=past),
+        **{field: Sum(field) for field in COUNT_FIELDS},
+    }
+
+    results = []
+    if group_by:
+        columns = {name: expression for grouping in group_by for name, expression in GROUPINGS[grouping].items()}
+        fields = [name for name, expression in columns.items() if expression is None]
+        expressions = {name: expression for name, expression in columns.items() if expression is not None}
+        rows = stats.order_by().values(*fields, **expressions).annotate(**sums).order_by(*columns)
+        results = [with_rates(row) for row in rows]
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'group_by': group_by,
+        'totals': with_rates(stats.aggregate(**sums)),
+        'results': results,
+    }
@@ -0,0 +1,194 @@
+# authentication/response_cache.py
+# Per-user cache for the appointment list GETs. Each patient and doctor has
+# a version number that is part of every cache key for their lists; the
+# signals bump it whenever something their lists show changes, which
+# orphans all of their cached pages at once. ETags are the row validators
+# from conditional, computed on a miss and stored with the body.
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .conditional import aconditional_list_response, conditional_list_response
+from .models import Appointment, Prescription
+
+# Query params that change the response body, with their defaults
+CACHED_PARAMS = {
+    'date_from': '',
+    'date_to': '',
+    'status': '',
+    'sort_by': 'date',
+    'compact': '',
+    'cursor': '',
+    'page_size': '',
+    'since': '',
+}
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    """Return this process's hit/miss/not_modified/bypass counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def version_key(owner, owner_id):
+    return f'appointment-lists:{owner}:{owner_id}:version'
+
+
+def list_version(owner, owner_id):
+    key = version_key(owner, owner_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def alist_version(owner, owner_id):
+    key = version_key(owner, owner_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def invalidate_lists(patient_ids=(), doctor_ids=()):
+    # Called after commit, like invalidate_directory, so a concurrent reader
+    # can't cache the old rows under the new version.
+    version = time.time_ns()
+    keys = {version_key('patient', pk): version for pk in patient_ids}
+    keys.update({version_key('doctor', pk): version for pk in doctor_ids})
+    if keys:
+        cache.set_many(keys, None)
+
+
+def invalidate_lists_on_commit(patient_ids=(), doctor_ids=()):
+    patient_ids, doctor_ids = set(patient_ids), set(doctor_ids)
+    transaction.on_commit(lambda: invalidate_lists(patient_ids, doctor_ids))
+
+
+def counterparts(field, **owner):
+    # Everyone whose appointment or prescription lists embed the owner
+    appointments = Appointment.objects.filter(**owner).order_by().values_list(field, flat=True)
+    prescriptions = Prescription.objects.filter(**owner).order_by().values_list(field, flat=True)
+    return appointments.union(prescriptions)
+
+
+def invalidate_patient_lists(*patient_ids):
+    if patient_ids:
+        invalidate_lists_on_commit(patient_ids, counterparts('doctor_id', patient_id__in=patient_ids))
+
+
+def invalidate_doctor_lists(*doctor_ids):
+    if doctor_ids:
+        invalidate_lists_on_commit(counterparts('patient_id', doctor_id__in=doctor_ids), doctor_ids)
+
+
+def normalize_params(params):
+    return urlencode({name: params.get(name) or default for name, default in CACHED_PARAMS.items()})
+
+
+def response_cache_key(owner, owner_id, params):
+    return f'appointment-lists:{owner}:{owner_id}:{list_version(owner, owner_id)}:{normalize_params(params)}'
+
+
+async def aresponse_cache_key(owner, owner_id, params):
+    return f'appointment-lists:{owner}:{owner_id}:{await alist_version(owner, owner_id)}:{normalize_params(params)}'
+
+
+def cache_timeout():
+    # 0 turns the cache off; conditional GETs still work.
+    return getattr(settings, 'APPOINTMENT_LIST_CACHE_TIMEOUT', 300)
+
+
+def make_entry(response):
+    return {
+        'etag': response['ETag'],
+        'last_modified': response.get('Last-Modified'),
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }
+
+
+def render_entry(request, entry, outcome):
+    response = get_conditional_response(request, etag=entry['etag'])
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    return finish(response, entry['etag'], entry['last_modified'], outcome)
+
+
+def finish(response, etag, last_modified, outcome):
+    record(outcome)
+    if response.status_code == 304:
+        record('not_modified')
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = last_modified
+    response['X-Cache'] = outcome.upper()
+    # Per-user data: browsers may keep it, but must revalidate; shared caches must not.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def cached_list_response(request, owner, owner_id, params, queryset, build):
+    """Serve build()'s response from the cache, honoring If-None-Match.
+
+    On a miss the ETag comes from the rows' validators (see conditional),
+    so a client holding the current version gets a 304 without the list
+    being serialized at all.
+    """
+    if params.get('stream'):
+        # Streamed bodies are never materialized, so there is nothing to store.
+        record('bypass')
+        return build()
+    timeout = cache_timeout()
+    key = response_cache_key(owner, owner_id, params)
+    entry = cache.get(key) if timeout else None
+    if entry is not None:
+        return render_entry(request, entry, 'hit')
+    response = conditional_list_response(request, queryset, key, build)
+    if response.status_code not in (200, 304):
+        return response
+    if response.status_code == 200 and timeout:
+        cache.set(key, make_entry(response), timeout)
+    return finish(response, response['ETag'], response.get('Last-Modified'), 'miss' if timeout else 'bypass')
+
+
+async def acached_list_response(request, owner, owner_id, params, queryset, build):
+    """Async counterpart of cached_list_response; build is a coroutine function."""
+    if params.get('stream'):
+        record('bypass')
+        return await build()
+    timeout = cache_timeout()
+    key = await aresponse_cache_key(owner, owner_id, params)
+    entry = await cache.aget(key) if timeout else None
+    if entry is not None:
+        return render_entry(request, entry, 'hit')
+    response = await aconditional_list_response(request, queryset, key, build)
+    if response.status_code not in (200, 304):
+        return response
+    if response.status_code == 200 and timeout:
+        await cache.aset(key, make_entry(response), timeout)
+    return finish(response, response['ETag'], response.get('Last-Modified'), 'miss' if timeout else 'bypass')
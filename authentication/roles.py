@@ -0,0 +1,58 @@
+# authentication/roles.py
+from django.conf import settings
+from django.core.cache import cache
+
+DOCTORS = 'Doctors'
+PATIENTS = 'Patients'
+ROLE_GROUPS = (DOCTORS, PATIENTS)
+
+
+def role_cache_key(user_id):
+    return f'user-roles:{user_id}'
+
+
+def get_user_roles(user):
+    """Return the role group names a user belongs to.
+
+    The result is memoized on the user object for the rest of the request and
+    in the shared cache across requests, so permission checks don't have to
+    join through the groups table each time.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        key = role_cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.filter(name__in=ROLE_GROUPS).values_list('name', flat=True))
+            cache.set(key, roles, getattr(settings, 'ROLE_CACHE_TIMEOUT', 3600))
+        user._roles = roles
+    return roles
+
+
+async def aget_user_roles(user):
+    """Async twin of get_user_roles() for async views."""
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        key = role_cache_key(user.pk)
+        roles = await cache.aget(key)
+        if roles is None:
+            roles = frozenset([name async for name in user.groups.filter(name__in=ROLE_GROUPS).values_list('name', flat=True)])
+            await cache.aset(key, roles, getattr(settings, 'ROLE_CACHE_TIMEOUT', 3600))
+        user._roles = roles
+    return roles
+
+
+def is_doctor(user):
+    return DOCTORS in get_user_roles(user)
+
+
+def is_patient(user):
+    return PATIENTS in get_user_roles(user)
+
+
+def invalidate_user_roles(*user_ids):
+    cache.delete_many([role_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,177 @@
+# authentication/screening.py
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict, deque
+
+from django.core.cache import cache
+from django.db.models import Value
+
+from .models import Allergy, MedicalCondition
+
+VERSION_KEY = 'allergen-index:version'
+# Words that describe the reaction rather than the substance ("Penicillin allergy").
+REACTION_WORDS = frozenset(['allergy', 'allergies', 'allergic', 'intolerance', 'sensitivity', 'to'])
+# Description segments longer than this are prose, not medication terms.
+MAX_TERM_WORDS = 4
+MIN_TERM_LENGTH = 3
+TERM_SEPARATORS = re.compile(r'[,;\n]+')
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Casefold, strip accents and punctuation, and pad with spaces."""
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    words = NON_WORD.sub(' ', text.casefold()).split()
+    return f" {' '.join(words)} " if words else ''
+
+
+def medication_words(text):
+    return [word for word in normalize(text).split() if word not in REACTION_WORDS]
+
+
+def allergen_terms(name, description, include_name=True):
+    """Medication terms for an allergen: its name and the comma-, semicolon-
+    or line-separated entries of its description ("amoxicillin, ampicillin").
+
+    Terms are matched as whole words anywhere in a medication name. Condition
+    names ("Asthma") never appear in medication names, so conditions only
+    contribute their description entries.
+    """
+    terms = set()
+    for segment in TERM_SEPARATORS.split(description or ''):
+        words = medication_words(segment)
+        term = ' '.join(words)
+        if len(term) >= MIN_TERM_LENGTH and len(words) <= MAX_TERM_WORDS:
+            terms.add(f' {term} ')
+    if include_name:
+        # The name is the allergen, whatever its length; only description
+        # segments can be prose. A name that is all reaction words is kept whole.
+        term = ' '.join(medication_words(name)) or normalize(name).strip()
+        if term:
+            terms.add(f' {term} ')
+    return terms
+
+
+class Automaton:
+    """Aho-Corasick matcher: finds every known term in one pass over the text."""
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for term in terms:
+            state = 0
+            for char in term:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state] += (term,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] += self.out[self.fail[child]]
+
+    def find(self, text):
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found.update(self.out[state])
+        return found
+
+
+class AllergenIndex:
+    """Normalized term -> allergen index over every Allergy and MedicalCondition.
+
+    Allergens are keyed ('allergy', id) or ('condition', id).
+    """
+
+    def __init__(self, allergens):
+        self.names = {}
+        self.keys_by_term = defaultdict(set)
+        for key, name, terms in allergens:
+            self.names[key] = name
+            for term in terms:
+                self.keys_by_term[term].add(key)
+        self.automaton = Automaton(self.keys_by_term)
+
+    @classmethod
+    def build(cls):
+        allergens = [
+            (('allergy', pk), name, allergen_terms(name, description))
+            for pk, name, description in Allergy.objects.values_list('id', 'name', 'description')
+        ] + [
+            (('condition', pk), name, allergen_terms(name, description, include_name=False))
+            for pk, name, description in MedicalCondition.objects.values_list('id', 'name', 'description')
+        ]
+        return cls(allergens)
+
+    def screen(self, medication, keys):
+        """Return the conflicts between a medication and a patient's allergens."""
+        conflicts = []
+        for term in sorted(self.automaton.find(normalize(medication))):
+            for kind, pk in sorted(self.keys_by_term[term] & keys):
+                conflicts.append({'type': kind, 'id': pk, 'name': self.names[kind, pk], 'term': term.strip()})
+        return conflicts
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def index_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate_allergen_index():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def get_allergen_index():
+    # Rebuilt in-process only when an Allergy or MedicalCondition changed
+    # (in any process) since the last build.
+    global _index
+    version = index_version()
+    with _index_lock:
+        if _index is None or _index[0] != version:
+            _index = (version, AllergenIndex.build())
+        return _index[1]
+
+
+def patient_allergen_keys(patient_ids):
+    """Map each patient id to its allergen keys with one UNION query over both M2M tables."""
+    allergies = Allergy.objects.filter(patient__in=patient_ids).values_list('patient', Value('allergy'), 'id')
+    conditions = MedicalCondition.objects.filter(patient__in=patient_ids).values_list('patient', Value('condition'), 'id')
+    keys = {patient_id: set() for patient_id in patient_ids}
+    for patient_id, kind, pk in allergies.union(conditions, all=True):
+        keys[patient_id].add((kind, pk))
+    return keys
+
+
+def screen_medications(patient_id, medications):
+    """Screen candidate medications for one patient.
+
+    Returns [{'medication': ..., 'conflicts': [...]}] in input order.
+    """
+    index = get_allergen_index()
+    keys = patient_allergen_keys([patient_id])[patient_id]
+    return [{'medication': medication, 'conflicts': index.screen(medication, keys) if keys else []} for medication in medications]
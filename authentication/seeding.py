@@ -0,0 +1,239 @@
+# authentication/seeding.py
+import random
+from datetime import time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .directory import invalidate_directory
+from .models import (
+    Allergy, Appointment, CustomUser, Doctor, DoctorSchedule, EmergencyContact, Feedback, MedicalCondition, Message, Patient,
+    Prescription, Specialization,
+)
+from .ratings import rebuild_ratings
+from .reports import rebuild_daily_stats
+from .roles import DOCTORS, PATIENTS
+from .screening import invalidate_allergen_index
+
+BATCH_SIZE = 1000
+
+SPECIALTIES = [
+    'Cardiology', 'Dermatology', 'Endocrinology', 'Gastroenterology', 'General Practice',
+    'Neurology', 'Oncology', 'Orthopedics', 'Pediatrics', 'Psychiatry',
+]
+# (name, medication terms), in the format the allergen index reads
+ALLERGIES = [
+    ('Penicillin', 'amoxicillin, ampicillin, penicillin'),
+    ('Sulfonamides', 'sulfamethoxazole, sulfasalazine'),
+    ('Aspirin', 'acetylsalicylic acid'),
+    ('NSAIDs', 'ibuprofen, naproxen, diclofenac'),
+    ('Codeine', 'codeine, morphine'),
+    ('Latex', None),
+    ('Peanuts', None),
+    ('Shellfish', None),
+]
+CONDITIONS = [
+    ('Asthma', 'propranolol'),
+    ('Hypertension', 'pseudoephedrine'),
+    ('Type 2 diabetes', None),
+    ('Chronic kidney disease', 'ibuprofen, naproxen'),
+    ('Migraine', None),
+    ('Peptic ulcer', 'aspirin, diclofenac'),
+]
+MEDICATIONS = [
+    ('Amoxicillin', '500mg'), ('Ibuprofen', '400mg'), ('Metformin', '850mg'), ('Lisinopril', '10mg'),
+    ('Atorvastatin', '20mg'), ('Salbutamol', '100mcg'), ('Sertraline', '50mg'), ('Omeprazole', '20mg'),
+    ('Paracetamol', '500mg'), ('Cetirizine', '10mg'),
+]
+REASONS = ['Checkup', 'Follow-up', 'Chest pain', 'Skin rash', 'Headache', 'Back pain', 'Vaccination', 'Test results', 'Fatigue', 'Cough']
+FIRST_NAMES = ['Amara', 'Ben', 'Chloe', 'David', 'Esi', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal', 'Kofi', 'Lena', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq', 'Uma', 'Victor', 'Wanjiru', 'Yusuf', 'Zoe']
+LAST_NAMES = ['Adeyemi', 'Brown', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Johnson', 'Kamau', 'Lopez', 'Mensah', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Walker']
+RATINGS, RATING_WEIGHTS = [1, 2, 3, 4, 5], [4, 6, 15, 35, 40]
+# Half-hour slots from 09:00 to 16:30
+SLOTS = [time(9 + i // 2, 30 * (i % 2)) for i in range(16)]
+
+
+class SeedError(Exception):
+    pass
+
+
+def bulk_create(model, objects):
+    # Rows get their primary keys back (PostgreSQL, SQLite, MariaDB), which
+    # the related rows created next need.
+    return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def by_name(model, entries):
+    """Return instances for {name: other fields}, creating those that don't exist yet."""
+    existing = {item.name: item for item in model.objects.filter(name__in=entries)}
+    missing = [model(name=name, **fields) for name, fields in entries.items() if name not in existing]
+    return list(existing.values()) + bulk_create(model, missing)
+
+
+class ClinicSeeder:
+    """Generate a clinic's worth of synthetic data with bulk inserts.
+
+    Doctors see patients on weekdays from `years` back until a month ahead,
+    `per_day` appointments a day on average. Past visits are mostly
+    completed, some with a prescription, feedback or a message thread.
+    Signals don't fire for bulk inserts, so the derived data (rating
+    summaries, daily appointment counts, directory and allergen caches) is
+    rebuilt at the end.
+    """
+
+    def __init__(self, doctors=20, patients=500, years=2, per_day=4, prefix='seed', password='Secret123!', seed=None):
+        self.doctor_count = doctors
+        self.patient_count = patients
+        self.years = years
+        self.per_day = per_day
+        self.prefix = prefix
+        self.password = password
+        self.rng = random.Random(seed)
+        self.today = timezone.localdate()
+
+    def run(self):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise SeedError(f'Seeding needs bulk inserts that return primary keys, which {connection.vendor} lacks.')
+        if CustomUser.objects.filter(username__startswith=f'{self.prefix}-').exists():
+            raise SeedError(f'Users prefixed "{self.prefix}-" already exist; pick another prefix.')
+        with transaction.atomic():
+            counts = self.seed()
+        invalidate_directory()
+        invalidate_allergen_index()
+        return counts
+
+    def seed(self):
+        specialties = by_name(Specialization, {name: {} for name in SPECIALTIES})
+        allergies = by_name(Allergy, {name: {'description': terms} for name, terms in ALLERGIES})
+        conditions = by_name(MedicalCondition, {name: {'description': terms} for name, terms in CONDITIONS})
+        doctors = self.create_doctors(specialties)
+        patients = self.create_patients(allergies, conditions)
+        appointments, prescriptions = self.create_appointments(doctors, patients)
+        completed = [appointment for appointment in appointments if appointment.is_completed]
+        feedback = self.create_feedback(completed)
+        messages = self.create_messages(appointments)
+        rebuild_ratings()
+        rebuild_daily_stats()
+        return {
+            'doctors': len(doctors), 'patients': len(patients), 'appointments': len(appointments),
+            'prescriptions': len(prescriptions), 'messages': messages, 'feedback': len(feedback),
+        }
+
+    def name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+
+    def create_users(self, role, count, group_name):
+        # One hash for everyone: hashing thousands of passwords would dwarf the rest.
+        password = make_password(self.password)
+        users = bulk_create(CustomUser, [
+            CustomUser(username=f'{self.prefix}-{role}-{i}', email=f'{self.prefix}-{role}-{i}@example.com', full_name=self.name(), password=password)
+            for i in range(count)
+        ])
+        group = Group.objects.get_or_create(name=group_name)[0]
+        bulk_create(CustomUser.groups.through, [CustomUser.groups.through(customuser_id=user.pk, group_id=group.pk) for user in users])
+        return users
+
+    def create_doctors(self, specialties):
+        users = self.create_users('doctor', self.doctor_count, DOCTORS)
+        # Contact numbers are unique; continue after the existing ones.
+        offset = Doctor.objects.count()
+        doctors = bulk_create(Doctor, [
+            Doctor(user=user, specialty=self.rng.choice(specialties), license_number=f'{self.prefix.upper()}-{i:06d}', contact_number=f'079{offset + i:07d}', is_available=self.rng.random() < 0.9)
+            for i, user in enumerate(users)
+        ])
+        bulk_create(DoctorSchedule, [
+            DoctorSchedule(doctor=doctor, weekday=weekday, start_time=SLOTS[0], end_time=time(17, 0))
+            for doctor in doctors for weekday in range(5)
+        ])
+        return doctors
+
+    def create_patients(self, allergies, conditions):
+        users = self.create_users('patient', self.patient_count, PATIENTS)
+        contacts = bulk_create(EmergencyContact, [
+            EmergencyContact(name=self.name(), relationship=self.rng.choice(['Parent', 'Partner', 'Sibling', 'Friend']), phone_number=f'072{i:07d}')
+            for i in range(len(users) // 2)
+        ])
+        patients = bulk_create(Patient, [
+            Patient(
+                user=user, date_of_birth=self.today - timedelta(days=self.rng.randint(365, 90 * 365)),
+                gender=self.rng.choice(['male', 'female', 'other']), address=f'{self.rng.randint(1, 999)} {self.rng.choice(LAST_NAMES)} Street',
+                contact_number=f'071{i:07d}', blood_type=self.rng.choice(['A+', 'A-', 'B+', 'O+', 'O-', 'AB+', None]),
+                emergency_contact=contacts[i] if i < len(contacts) else None,
+            )
+            for i, user in enumerate(users)
+        ])
+        bulk_create(Patient.allergies.through, [
+            Patient.allergies.through(patient_id=patient.pk, allergy_id=allergy.pk)
+            for patient in patients for allergy in self.rng.sample(allergies, self.rng.choice([0, 0, 0, 1, 1, 2]))
+        ])
+        bulk_create(Patient.medical_conditions.through, [
+            Patient.medical_conditions.through(patient_id=patient.pk, medicalcondition_id=condition.pk)
+            for patient in patients for condition in self.rng.sample(conditions, self.rng.choice([0, 0, 1, 1, 2]))
+        ])
+        return patients
+
+    def visit_days(self):
+        day, end = self.today - timedelta(days=365 * self.years), self.today + timedelta(days=30)
+        while day <= end:
+            if day.weekday() < 5:
+                yield day
+            day += timedelta(days=1)
+
+    def create_appointments(self, doctors, patients):
+        appointments, prescriptions = [], []
+        booked = set()  # (patient id, date, time): a patient can't be in two places
+        for doctor in doctors:
+            for day in self.visit_days():
+                count = min(len(SLOTS), max(0, round(self.rng.gauss(self.per_day, self.per_day / 2))))
+                for slot in self.rng.sample(SLOTS, count):
+                    patient = self.rng.choice(patients)
+                    if (patient.pk, day, slot) in booked:
+                        continue
+                    booked.add((patient.pk, day, slot))
+                    appointment = self.appointment(doctor, patient, day, slot)
+                    if appointment.is_completed and self.rng.random() < 0.3:
+                        medication, dosage = self.rng.choice(MEDICATIONS)
+                        appointment.prescription = Prescription(
+                            patient=patient, doctor=doctor, medication=medication, dosage=dosage, quantity=self.rng.choice([10, 14, 28, 30, 60]),
+                            expiration_date=day + timedelta(days=180), is_active=day + timedelta(days=180) >= self.today,
+                        )
+                        prescriptions.append(appointment.prescription)
+                    appointments.append(appointment)
+        # Saved first; bulk_create picks up their new pks on the appointments.
+        bulk_create(Prescription, prescriptions)
+        return bulk_create(Appointment, appointments), prescriptions
+
+    def appointment(self, doctor, patient, day, slot):
+        roll = self.rng.random()
+        if day < self.today:
+            status, completed = ('cancelled', False) if roll < 0.1 else ('confirmed', True)
+        else:
+            status, completed = ('cancelled', False) if roll < 0.05 else ('confirmed' if roll < 0.5 else 'pending', False)
+        return Appointment(
+            patient=patient, doctor=doctor, date=day, time=slot, status=status, is_completed=completed,
+            reason_for_visit=self.rng.choice(REASONS),
+        )
+
+    def create_feedback(self, completed):
+        return bulk_create(Feedback, [
+            Feedback(appointment=appointment, patient_id=appointment.patient_id, doctor_id=appointment.doctor_id, rating=self.rng.choices(RATINGS, RATING_WEIGHTS)[0])
+            for appointment in completed if self.rng.random() < 0.4
+        ])
+
+    def create_messages(self, appointments):
+        # A short thread between patient and doctor around some visits
+        threads = [appointment for appointment in appointments if self.rng.random() < 0.2]
+        roots = bulk_create(Message, [
+            Message(sender_id=appointment.patient.user_id, recipient_id=appointment.doctor.user_id, content=f'Question about my {appointment.reason_for_visit.lower()} appointment on {appointment.date}.', is_read=appointment.date < self.today)
+            for appointment in threads
+        ])
+        replies = []
+        for appointment, root in zip(threads, roots):
+            people = [appointment.doctor.user_id, appointment.patient.user_id]
+            for i in range(self.rng.randint(0, 3)):
+                sender, recipient = people[i % 2], people[(i + 1) % 2]
+                replies.append(Message(sender_id=sender, recipient_id=recipient, content=self.rng.choice(['Thanks!', 'See you then.', 'Please bring your test results.', 'Noted, thank you.']), thread=root, root=root, is_read=root.is_read))
+        bulk_create(Message, replies)
+        return len(roots) + len(replies)
@@ -1,7 +1,9 @@
 # authentication/serializers.py
+from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from django.core.validators import RegexValidator, validate_email
-from .models import Patient, Doctor, Appointment, Prescription, Message, Feedback, CustomUser
+from django.utils import timezone
+from .models import Patient, Doctor, Appointment, Prescription, Message, Feedback, CustomUser, EmergencyContact, DoctorSchedule, ScheduleException
 
 class CustomUserSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(validators=[UniqueValidator(queryset=CustomUser.objects.all()), validate_email])
@@ -19,7 +21,7 @@ class EmergencyContactSerializer(serializers.ModelSerializer):
 class PatientSerializer(serializers.ModelSerializer):
     user = CustomUserSerializer()
     full_name = serializers.ReadOnlyField(source='user.full_name')
-    emergency_contact = EmergencyContactSerializer(many=True, read_only=True)
+    emergency_contact = EmergencyContactSerializer(read_only=True)
     medical_conditions = serializers.CharField(write_only=True)  # Assuming it's a text field
 
     class Meta:
@@ -58,7 +60,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = ['id', 'patient', 'doctor', 'date', 'time', 'status', 'reason_for_visit', 'additional_notes', 'is_completed', 'has_prescription']
+        fields = ['id', 'patient', 'doctor', 'date', 'time', 'status', 'reason_for_visit', 'additional_notes', 'is_completed', 'has_prescription', 'updated_at']
 
 class PrescriptionSerializer(serializers.ModelSerializer):
     patient = PatientSerializer(read_only=True)
@@ -66,7 +68,7 @@ class PrescriptionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Prescription
-        fields = ['id', 'patient', 'doctor', 'medication', 'dosage', 'quantity', 'refill_instructions', 'expiration_date', 'date_prescribed', 'is_active', 'notes']
+        fields = ['id', 'patient', 'doctor', 'medication', 'dosage', 'quantity', 'refill_instructions', 'expiration_date', 'date_prescribed', 'is_active', 'notes', 'updated_at']
 
 class MessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.ReadOnlyField(source='sender.username')
@@ -74,7 +76,8 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ['id', 'sender', 'recipient', 'content', 'timestamp', 'is_read', 'is_archived', 'sender_username', 'recipient_username']
+        fields = ['id', 'sender', 'recipient', 'content', 'timestamp', 'is_read', 'is_archived', 'thread', 'sender_username', 'recipient_username', 'updated_at']
+        read_only_fields = ['sender', 'is_read', 'is_archived', 'updated_at']
 
 class FeedbackSerializer(serializers.ModelSerializer):
     patient_username = serializers.ReadOnlyField(source='patient.user.username')
@@ -84,3 +87,28 @@ class FeedbackSerializer(serializers.ModelSerializer):
         model = Feedback
         fields = ['id', 'appointment', 'patient', 'doctor', 'rating', 'comments', 'patient_username', 'doctor_username']
 
+
+class DoctorScheduleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DoctorSchedule
+        fields = ['id', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        if not 5 <= data.get('slot_minutes', 30) <= 480:
+            raise serializers.ValidationError("Slot length must be between 5 and 480 minutes.")
+        return data
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = ['id', 'date', 'start_time', 'end_time', 'reason']
+
+    def validate(self, data):
+        start_time, end_time = data.get('start_time'), data.get('end_time')
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError("Give both start and end time, or neither to block the whole day.")
+        if start_time is not None and start_time >= end_time:
+            raise serializers.ValidationError("End time must be after start time.")
+        return data
@@ -1,29 +1,198 @@
 # authentication/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from .models import Patient, Doctor
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .models import Patient, Doctor, CustomUser, Specialization, Allergy, MedicalCondition, EmergencyContact, Feedback, Appointment, Prescription
+from .authentication import invalidate_token
+from .roles import invalidate_user_roles
+from .directory import invalidate_directory
+from .screening import invalidate_allergen_index
+from .ratings import adjust_rating
+from .reports import adjust_daily_stats
+from .response_cache import invalidate_doctor_lists, invalidate_lists_on_commit, invalidate_patient_lists
+from .notifications import queue_email, patient_welcome_email, doctor_welcome_email
 
 @receiver(post_save, sender=Patient)
 def send_patient_registration_email(sender, instance, created, **kwargs):
     if created:
-        send_mail(
-            'Welcome to Our Health Service',
-            f'Hello {instance.user.full_name},\n\nThank you for registering as a patient. We are here to take care of your health.',
-            'from@example.com',
-            [instance.user.email],
-            fail_silently=False,
-        )
+        queue_email(*patient_welcome_email(instance.user))
 
 @receiver(post_save, sender=Doctor)
 def send_doctor_registration_email(sender, instance, created, **kwargs):
     if created:
-        send_mail(
-            'Welcome to Our Health Service',
-            f'Hello Dr. {instance.user.full_name},\n\nThank you for registering as a doctor. We are excited to have you on board.',
-            'from@example.com',
-            [instance.user.email],
-            fail_silently=False,
-        )
+        queue_email(*doctor_welcome_email(instance.user))
 
+
+def invalidate_roles_on_commit(user_ids):
+    # Not before: a request reading the groups until then would cache the
+    # old roles again.
+    transaction.on_commit(lambda: invalidate_user_roles(*user_ids))
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_roles_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Group-side change (group.customuser_set.add(...)); pk_set holds user ids,
+        # except for clear() where the members have to be read before removal.
+        if action == 'pre_clear':
+            invalidate_roles_on_commit(list(instance.customuser_set.values_list('pk', flat=True)))
+        elif action in ('post_add', 'post_remove'):
+            invalidate_roles_on_commit(list(pk_set))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        instance.__dict__.pop('_roles', None)
+        invalidate_roles_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_tokens_on_user_change(sender, instance, created, update_fields, **kwargs):
+    # Cached tokens carry a copy of the user; drop them when it changes
+    # (deactivation, password reset...). Login only bumps last_login.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=Specialization)
+def invalidate_directory_on_change(sender, **kwargs):
+    # After commit, so a concurrent reader can't re-cache the old rows
+    # under the new version.
+    transaction.on_commit(invalidate_directory)
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_directory_on_user_change(sender, instance, created, update_fields, **kwargs):
+    # Directory rows show the doctor's full_name. New users have no Doctor
+    # row yet, and logins don't touch the name.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    transaction.on_commit(invalidate_directory)
+
+
+@receiver([post_save, post_delete], sender=Allergy)
+@receiver([post_save, post_delete], sender=MedicalCondition)
+def invalidate_allergen_index_on_change(sender, **kwargs):
+    transaction.on_commit(invalidate_allergen_index)
+
+
+@receiver(pre_save, sender=Feedback)
+def remember_previous_rating(sender, instance, update_fields, **kwargs):
+    instance._previous_rating = None
+    if instance._state.adding or (update_fields is not None and not {'rating', 'doctor'} & set(update_fields)):
+        return
+    instance._previous_rating = Feedback.objects.filter(pk=instance.pk).values_list('doctor_id', 'rating').first()
+
+@receiver(post_save, sender=Feedback)
+def update_rating_on_feedback_save(sender, instance, created, **kwargs):
+    # Runs inside Feedback.save()'s transaction.
+    current = (instance.doctor_id, instance.rating)
+    previous = getattr(instance, '_previous_rating', None)
+    if not created and previous in (None, current):
+        return
+    if previous is not None:
+        adjust_rating(*previous, -1)
+    adjust_rating(*current, 1)
+    transaction.on_commit(invalidate_directory)
+
+@receiver(post_delete, sender=Feedback)
+def update_rating_on_feedback_delete(sender, instance, **kwargs):
+    adjust_rating(instance.doctor_id, instance.rating, -1)
+    transaction.on_commit(invalidate_directory)
+
+
+STATS_FIELDS = {'doctor', 'date', 'status', 'is_completed'}
+
+@receiver(pre_save, sender=Appointment)
+def remember_previous_stats(sender, instance, update_fields, **kwargs):
+    instance._previous_stats = None
+    if instance._state.adding or (update_fields is not None and not STATS_FIELDS & set(update_fields)):
+        return
+    instance._previous_stats = Appointment.objects.filter(pk=instance.pk).values_list('doctor_id', 'date', 'status', 'is_completed').first()
+
+@receiver(post_save, sender=Appointment)
+def update_daily_stats_on_appointment_save(sender, instance, created, **kwargs):
+    # Runs inside Appointment.save()'s transaction; queryset.update() and
+    # bulk_create() callers adjust the counts themselves.
+    current = (instance.doctor_id, instance.date, instance.status, instance.is_completed)
+    previous = getattr(instance, '_previous_stats', None)
+    if not created and previous in (None, current):
+        return
+    if previous is not None:
+        adjust_daily_stats(*previous, -1)
+    adjust_daily_stats(*current, 1)
+
+@receiver(post_delete, sender=Appointment)
+def update_daily_stats_on_appointment_delete(sender, instance, **kwargs):
+    adjust_daily_stats(instance.doctor_id, instance.date, instance.status, instance.is_completed, -1)
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=Prescription)
+def invalidate_lists_on_appointment_change(sender, instance, **kwargs):
+    # Deleting a prescription also clears has_prescription on its appointment.
+    invalidate_lists_on_commit([instance.patient_id], [instance.doctor_id])
+
+@receiver(pre_delete, sender=Prescription)
+def touch_appointments_on_prescription_delete(sender, instance, **kwargs):
+    # SET_NULL clears Appointment.prescription with a plain UPDATE; bump
+    # updated_at so since= deltas pick up the has_prescription change.
+    Appointment.objects.filter(prescription=instance).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Patient)
+@receiver(pre_delete, sender=Patient)
+def invalidate_lists_on_patient_change(sender, instance, **kwargs):
+    # pre_delete: the appointments naming the other side are gone by post_delete.
+    invalidate_patient_lists(instance.pk)
+
+@receiver(post_save, sender=Doctor)
+@receiver(pre_delete, sender=Doctor)
+def invalidate_lists_on_doctor_change(sender, instance, **kwargs):
+    invalidate_doctor_lists(instance.pk)
+
+@receiver(m2m_changed, sender=Patient.allergies.through)
+def invalidate_lists_on_allergies_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Patient rows list their allergy ids. medical_conditions is write-only
+    # in PatientSerializer, so condition links never show in the lists.
+    if reverse:
+        if action == 'pre_clear':
+            invalidate_patient_lists(*instance.patient_set.values_list('pk', flat=True))
+        elif action in ('post_add', 'post_remove'):
+            invalidate_patient_lists(*pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_patient_lists(instance.pk)
+
+@receiver(pre_delete, sender=Allergy)
+def invalidate_lists_on_allergy_delete(sender, instance, **kwargs):
+    # The links go with it, without an m2m_changed signal.
+    invalidate_patient_lists(*instance.patient_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=EmergencyContact)
+@receiver(pre_delete, sender=EmergencyContact)
+def invalidate_lists_on_emergency_contact_change(sender, instance, **kwargs):
+    # Embedded in the patient rows; a delete nulls Patient.emergency_contact
+    # with a plain UPDATE.
+    invalidate_patient_lists(*Patient.objects.filter(emergency_contact=instance).values_list('pk', flat=True))
+
+@receiver(post_save, sender=Specialization)
+def invalidate_lists_on_specialization_change(sender, instance, created, **kwargs):
+    # Compact lists show the specialty name. Deleting one deletes its
+    # doctors, whose pre_delete covers their lists.
+    if not created:
+        invalidate_doctor_lists(*Doctor.objects.filter(specialty=instance).values_list('pk', flat=True))
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_lists_on_user_change(sender, instance, created, update_fields, **kwargs):
+    # The lists embed the patient's and doctor's user (name, email, picture).
+    if created or update_fields == frozenset(['last_login']):
+        return
+    for patient_id in Patient.objects.filter(user=instance).values_list('pk', flat=True):
+        invalidate_patient_lists(patient_id)
+    for doctor_id in Doctor.objects.filter(user=instance).values_list('pk', flat=True):
+        invalidate_doctor_lists(doctor_id)
@@ -0,0 +1,105 @@
+# authentication/status_updates.py
+# Status changes for a doctor's appointments, one or many per request.
+# Rows are changed with one UPDATE per target state instead of a save()
+# each, so the work the Appointment signals would do (list cache versions,
+# the daily stats rollup, status events) is done here, once per batch.
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_to_users
+from .models import Appointment
+from .reports import adjust_daily_counts, stat_fields
+from .response_cache import invalidate_lists_on_commit
+
+MAX_BATCH_SIZE = 200
+STATUSES = {status for status, label in Appointment.STATUS_CHOICES}
+
+
+class InvalidChange(ValueError):
+    pass
+
+
+def clean_change(change):
+    """Return (id, status, is_completed) from one {id, status, is_completed} change; omitted fields are None."""
+    if not isinstance(change, dict):
+        raise InvalidChange('Each change must be an object.')
+    appointment_id, status, is_completed = change.get('id'), change.get('status'), change.get('is_completed')
+    if isinstance(appointment_id, bool) or not isinstance(appointment_id, int):
+        raise InvalidChange('id must be an integer.')
+    if status is not None and status not in STATUSES:
+        raise InvalidChange(f'status must be one of: {", ".join(sorted(STATUSES))}.')
+    if is_completed is not None and not isinstance(is_completed, bool):
+        raise InvalidChange('is_completed must be true or false.')
+    if status is None and is_completed is None:
+        raise InvalidChange('Status is required')
+    return appointment_id, status, is_completed
+
+
+def transition_error(current, target):
+    """Return why (status, is_completed) current can't become target, or None."""
+    if current[0] == 'cancelled' and target[0] != 'cancelled':
+        # Its slot may have been rebooked since; book a new appointment instead.
+        return 'Cancelled appointments cannot be reopened.'
+    if target[1] and target[0] != 'confirmed':
+        return 'Only confirmed appointments can be completed.'
+    return None
+
+
+def update_statuses(doctor, changes):
+    """Apply [{id, status, is_completed}] to the doctor's appointments.
+
+    Returns one result per change, in order: {id, status, is_completed,
+    updated} when it was applied (updated is False if nothing changed), or
+    {id, error}. Invalid changes don't stop the valid ones.
+    """
+    results = [None] * len(changes)
+    wanted = {}
+    for index, change in enumerate(changes):
+        try:
+            appointment_id, status, is_completed = clean_change(change)
+        except InvalidChange as e:
+            results[index] = {'id': change.get('id') if isinstance(change, dict) else None, 'error': str(e)}
+            continue
+        if appointment_id in wanted:
+            results[index] = {'id': appointment_id, 'error': 'Duplicate id in batch.'}
+            continue
+        wanted[appointment_id] = index, status, is_completed
+
+    with transaction.atomic():
+        rows = Appointment.objects.select_for_update(of=('self',)).filter(doctor=doctor, id__in=wanted)
+        current = {row['id']: row for row in rows.values('id', 'patient_id', 'patient__user_id', 'date', 'time', 'status', 'is_completed')}
+        targets = defaultdict(list)
+        for appointment_id, (index, status, is_completed) in wanted.items():
+            row = current.get(appointment_id)
+            if row is None:
+                results[index] = {'id': appointment_id, 'error': 'Appointment not found'}
+                continue
+            state = row['status'], row['is_completed']
+            target = status or state[0], state[1] if is_completed is None else is_completed
+            error = transition_error(state, target)
+            if error:
+                results[index] = {'id': appointment_id, 'error': error}
+                continue
+            results[index] = {'id': appointment_id, 'status': target[0], 'is_completed': target[1], 'updated': target != state}
+            if target != state:
+                targets[target].append(row)
+
+        # One UPDATE per target state; updated_at isn't set by update().
+        now = timezone.now()
+        counts = defaultdict(Counter)
+        for (status, is_completed), changed in targets.items():
+            Appointment.objects.filter(doctor=doctor, id__in=[row['id'] for row in changed]).update(status=status, is_completed=is_completed, updated_at=now)
+            for row in changed:
+                counts[row['date']].update({field: -1 for field in stat_fields(row['status'], row['is_completed'])})
+                counts[row['date']].update({field: 1 for field in stat_fields(status, is_completed)})
+                publish_to_users([row['patient__user_id'], doctor.user_id], 'appointment_status', {
+                    'id': row['id'], 'status': status, 'date': row['date'], 'time': row['time'],
+                })
+        for day, day_counts in counts.items():
+            adjust_daily_counts(doctor.id, day, day_counts)
+        changed = [row for rows in targets.values() for row in rows]
+        if changed:
+            invalidate_lists_on_commit([row['patient_id'] for row in changed], [doctor.id])
+    return results
@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import asyncio
+import json
+import pstats
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from django.db.models.functions import Lower
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import CustomUser, Specialization, Allergy, MedicalCondition, EmergencyContact, Patient, Doctor, Appointment, Prescription, Message, Feedback, DoctorRating, DailyAppointmentStats, OutboundEmail, DoctorSchedule, ScheduleException
+from .availability import find_free_slots
+from .benchmarks import SCENARIOS, SKIPPED
+from .seeding import ClinicSeeder, SeedError
+from . import events, notifications, onboarding, urls
+from .authentication import CachedTokenAuthentication, local_tokens
+from .forms import DoctorRegistrationForm
+from .hashers import hashers_for_profile
+from .instrumentation import metrics, observe_query
+from .onboarding import PatientImporter
+from .profiling import normalize, query_budget
+from .reports import rebuild_daily_stats
+from .status_updates import MAX_BATCH_SIZE
+from .screening import AllergenIndex, Automaton, allergen_terms
+from .response_cache import cache_stats, reset_cache_stats
+from .roles import get_user_roles, is_doctor, is_patient
+from .views import inbox, outbox, message_thread, mark_messages_read, create_prescription, screen_prescriptions, list_appointments, list_prescriptions, manage_appointments, manage_schedule, bulk_import_patients, doctor_availability, doctor_directory
+
+
+def create_patient(username, contact_number='0712345678', password=None):
+    user = CustomUser.objects.create_user(username=username, email=f'{username}@example.com', password=password, full_name=username.title())
+    user.groups.add(Group.objects.get_or_create(name='Patients')[0])
+    return Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='female', address='1 Main St', contact_number=contact_number)
+
+
+def create_doctor(username, license_number='LIC-1', contact_number='0798765432', password=None):
+    user = CustomUser.objects.create_user(username=username, email=f'{username}@example.com', password=password, full_name=username.title())
+    user.groups.add(Group.objects.get_or_create(name='Doctors')[0])
+    specialty = Specialization.objects.get_or_create(name='Cardiology')[0]
+    return Doctor.objects.create(user=user, specialty=specialty, license_number=license_number, contact_number=contact_number)
+
+
+# Measures building the response, not the response cache in front of it
+@override_settings(APPOINTMENT_LIST_CACHE_TIMEOUT=0)
+class AppointmentListQueryCountTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.allergy = Allergy.objects.create(name='Penicillin')
+        self.condition = MedicalCondition.objects.create(name='Asthma')
+        self.patients = []
+        for i in range(5):
+            patient = create_patient(f'patient{i}', contact_number=f'07100000{i:02d}')
+            patient.allergies.add(self.allergy)
+            patient.medical_conditions.add(self.condition)
+            self.patients.append(patient)
+
+    def book(self, count):
+        start = Appointment.objects.count()
+        for i in range(start, start + count):
+            patient = self.patients[i % len(self.patients)]
+            prescription = Prescription.objects.create(patient=patient, doctor=self.doctor, medication='Ibuprofen', dosage='200mg', quantity=10, expiration_date=date(2030, 1, 1))
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date=date(2024, 1, 1) + timedelta(days=i), time=time(9, 0), reason_for_visit='Checkup', prescription=prescription)
+
+    def count_queries(self, view, user):
+        request = self.factory.get('/appointments/')
+        force_authenticate(request, user=user)
+        # Warm up so per-user caches (roles) don't skew the comparison.
+        view(request)
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_doctor_list_query_count_is_constant(self):
+        self.book(2)
+        small = self.count_queries(manage_appointments, self.doctor.user)
+        self.book(20)
+        large = self.count_queries(manage_appointments, self.doctor.user)
+        self.assertEqual(small, large)
+
+    def test_patient_list_query_count_is_constant(self):
+        patient = self.patients[0]
+        self.book(5)
+        small = self.count_queries(list_appointments, patient.user)
+        self.book(25)
+        large = self.count_queries(list_appointments, patient.user)
+        self.assertEqual(small, large)
+
+    def test_unserialized_relations_are_not_loaded(self):
+        self.book(2)
+        request = self.factory.get('/appointments/')
+        force_authenticate(request, user=self.doctor.user)
+        with CaptureQueriesContext(connection) as ctx:
+            manage_appointments(request)
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('medical_condition', sql)
+        self.assertNotIn('authentication_specialization', sql)
+
+
+class AppointmentPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        # Some appointments share a date and time (the cancelled ones) so the id tiebreaker matters.
+        for i in range(7):
+            status = 'cancelled' if i % 3 == 2 else 'pending'
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2024, 1, 1 + i // 3), time=time(9 + i % 2, 0), status=status, reason_for_visit='Checkup')
+
+    def get(self, params):
+        request = self.factory.get('/appointments/manage/', params)
+        force_authenticate(request, user=self.doctor.user)
+        return manage_appointments(request)
+
+    def expected_ids(self):
+        return list(Appointment.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen = []
+        params = {'page_size': 3}
+        while True:
+            response = self.get(params)
+            self.assertEqual(response.status_code, 200)
+            body = json.loads(response.content)
+            self.assertLessEqual(len(body['results']), 3)
+            seen.extend(row['id'] for row in body['results'])
+            if body['next_cursor'] is None:
+                break
+            params = {'page_size': 3, 'cursor': body['next_cursor']}
+        self.assertEqual(seen, self.expected_ids())
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.get({'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaming_response_is_a_json_array(self):
+        response = self.get({'stream': '1', 'page_size': 2})
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in body], self.expected_ids())
+
+    def test_unpaginated_response_is_unchanged(self):
+        body = json.loads(self.get({}).content)
+        self.assertEqual(len(body), 7)
+
+
+class CompactListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.patients = [create_patient('alice'), create_patient('bob', contact_number='0722222222')]
+        self.prescription = Prescription.objects.create(patient=self.patients[0], doctor=self.doctor, medication='Ibuprofen', dosage='200mg', quantity=10, expiration_date=date(2030, 1, 1))
+        for i in range(6):
+            Appointment.objects.create(patient=self.patients[i % 2], doctor=self.doctor, date=date(2024, 1, 1 + i), time=time(9, 0), reason_for_visit='Checkup', prescription=self.prescription if i == 0 else None)
+
+    def get(self, view, params, user=None):
+        request = self.factory.get('/', params)
+        force_authenticate(request, user=user or self.doctor.user)
+        return view(request)
+
+    def test_rows_reference_side_loaded_entities(self):
+        body = json.loads(self.get(manage_appointments, {'compact': '1'}).content)
+        self.assertEqual(len(body['results']), 6)
+        row = body['results'][0]
+        self.assertEqual(row['patient_id'], self.patients[0].id)
+        self.assertEqual(row['prescription_id'], self.prescription.id)
+        self.assertNotIn('patient__user__full_name', row)
+        self.assertEqual(body['included']['patients'], {
+            str(patient.id): {'id': patient.id, 'full_name': patient.user.full_name} for patient in self.patients
+        })
+        self.assertEqual(body['included']['doctors'][str(self.doctor.id)], {'id': self.doctor.id, 'full_name': 'Drwho', 'specialty': 'Cardiology'})
+
+    @override_settings(APPOINTMENT_LIST_CACHE_TIMEOUT=0)
+    def test_compact_list_is_a_single_query(self):
+        self.get(manage_appointments, {'compact': '1'})
+        with CaptureQueriesContext(connection) as ctx:
+            self.get(manage_appointments, {'compact': '1'})
+        # The warm-up request cached user.doctor, leaving the ETag aggregate
+        # and the rows query.
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_cursor_pages_and_stream(self):
+        body = json.loads(self.get(manage_appointments, {'compact': '1', 'page_size': 4}).content)
+        self.assertEqual(len(body['results']), 4)
+        body = json.loads(self.get(manage_appointments, {'compact': '1', 'page_size': 4, 'cursor': body['next_cursor']}).content)
+        self.assertEqual(len(body['results']), 2)
+        self.assertIsNone(body['next_cursor'])
+
+        response = self.get(manage_appointments, {'compact': '1', 'stream': '1', 'page_size': 4})
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in body['results']], list(Appointment.objects.order_by('date', 'time', 'id').values_list('id', flat=True)))
+        self.assertEqual(len(body['included']['patients']), 2)
+
+    def test_prescription_lists(self):
+        full = json.loads(self.get(list_prescriptions, {}, user=self.patients[0].user).content)
+        self.assertEqual(full[0]['patient']['full_name'], 'Alice')
+        compact = json.loads(self.get(list_prescriptions, {'compact': '1'}).content)
+        self.assertEqual(compact['results'][0]['medication'], 'Ibuprofen')
+        self.assertEqual(compact['included']['patients'][str(self.patients[0].id)]['full_name'], 'Alice')
+        self.assertEqual(json.loads(self.get(list_prescriptions, {}, user=self.patients[1].user).content), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output is checked against the SQLite planner.')
+class AppointmentIndexTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('SCAN authentication_appointment', plan)
+
+    def test_conflict_checks_seek_slot_constraints(self):
+        # The queries book_appointment runs after an IntegrityError
+        slot = Appointment.objects.active().filter(date=date(2024, 1, 1), time=time(9, 0))
+        self.assertUsesIndex(slot.filter(doctor=self.doctor), 'appointment_doctor_slot_unique')
+        self.assertUsesIndex(slot.filter(patient=self.patient), 'appointment_patient_slot_unique')
+
+    def test_status_listing_seeks_status_index(self):
+        queryset = Appointment.objects.filter(doctor=self.doctor, status='confirmed', date__gte=date(2024, 1, 1))
+        self.assertUsesIndex(queryset, 'appointment_doctor_status_idx')
+
+
+class AppointmentBookingTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+
+    def book(self, patient, doctor=None):
+        request = self.factory.post('/appointments/', {'doctor': (doctor or self.doctor).id, 'date': '2024-03-01', 'time': '09:00', 'reason_for_visit': 'Checkup'})
+        force_authenticate(request, user=patient.user)
+        return list_appointments(request)
+
+    def test_booking_is_a_single_insert(self):
+        request = self.factory.post('/appointments/', {'doctor': self.doctor.id, 'date': '2024-03-01', 'time': '09:00', 'reason_for_visit': 'Checkup'})
+        force_authenticate(request, user=self.patient.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = list_appointments(request)
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "authentication_appointment"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse(any(q['sql'].startswith('SELECT 1 AS "a" FROM "authentication_appointment"') for q in ctx.captured_queries))
+
+    def test_doctor_slot_conflict(self):
+        self.assertEqual(self.book(self.patient).status_code, 201)
+        response = self.book(create_patient('bob', contact_number='0711111111'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'Doctor already has an appointment at this time.')
+
+    def test_patient_slot_conflict(self):
+        self.assertEqual(self.book(self.patient).status_code, 201)
+        other = create_doctor('drno', license_number='LIC-2', contact_number='0722222222')
+        response = self.book(self.patient, doctor=other)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'You already have an appointment at this time.')
+
+    def test_other_integrity_errors_are_not_reported_as_conflicts(self):
+        with mock.patch('authentication.serializers.AppointmentSerializer.save', side_effect=IntegrityError('NOT NULL constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self.book(self.patient)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        self.assertEqual(self.book(self.patient).status_code, 201)
+        Appointment.objects.update(status='cancelled')
+        self.assertEqual(self.book(self.patient).status_code, 201)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    workers = 8
+
+    def test_threads_cannot_double_book_a_slot(self):
+        doctor = create_doctor('drwho')
+        patients = [create_patient(f'patient{i}', contact_number=f'07100000{i:02d}') for i in range(self.workers)]
+        factory = APIRequestFactory()
+        barrier = threading.Barrier(self.workers)
+        statuses = []
+
+        def attempt(patient):
+            barrier.wait()
+            try:
+                while True:
+                    request = factory.post('/appointments/', {'doctor': doctor.id, 'date': '2024-03-01', 'time': '09:00', 'reason_for_visit': 'Checkup'})
+                    force_authenticate(request, user=patient.user)
+                    try:
+                        statuses.append(list_appointments(request).status_code)
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of blocking; retry.
+                        continue
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.workers - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), 1)
+
+
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = create_patient('alice')
+
+    def fresh_user(self):
+        return CustomUser.objects.get(pk=self.patient.user.pk)
+
+    def test_roles_are_resolved_once(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_patient(user))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_patient(user))
+            self.assertFalse(is_doctor(user))
+
+    def test_adding_a_group_invalidates_cached_roles_on_commit(self):
+        user = self.fresh_user()
+        self.assertFalse(is_doctor(user))
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.add(Group.objects.get_or_create(name='Doctors')[0])
+            self.assertFalse(is_doctor(self.fresh_user()))
+        self.assertTrue(is_doctor(user))
+        self.assertTrue(is_doctor(self.fresh_user()))
+
+    def test_group_side_changes_invalidate_cached_roles(self):
+        self.assertTrue(is_patient(self.fresh_user()))
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.get(name='Patients').customuser_set.clear()
+        self.assertEqual(get_user_roles(self.fresh_user()), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.get(name='Patients').customuser_set.add(self.patient.user)
+        self.assertTrue(is_patient(self.fresh_user()))
+
+    def test_rolled_back_group_change_keeps_cached_roles(self):
+        self.assertTrue(is_patient(self.fresh_user()))
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    self.patient.user.groups.clear()
+                    raise OperationalError
+            except OperationalError:
+                pass
+        self.assertEqual(callbacks, [])
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_patient(user))
+
+
+class RegistrationEmailOutboxTests(TestCase):
+    def test_registration_email_is_queued_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient('alice')
+            self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual(OutboundEmail.objects.get().recipients, ['alice@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rolled_back_registration_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    create_patient('alice')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_worker_sends_a_batch_over_one_connection(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient('alice')
+            create_patient('bob', contact_number='0711111111')
+            create_doctor('drwho')
+        with mock.patch.object(notifications, 'get_connection', wraps=notifications.get_connection) as get_connection:
+            call_command('send_queued_emails', stdout=mock.Mock())
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['alice@example.com', 'bob@example.com', 'drwho@example.com'])
+        self.assertFalse(OutboundEmail.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failed_delivery_is_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient('alice')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            self.assertEqual(notifications.send_queued_emails(), 0)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.attempts, email.last_error), (1, 'SMTP down'))
+        self.assertEqual(notifications.send_queued_emails(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_batch_is_claimed_before_sending(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient('alice')
+        during_send = []
+
+        def send_messages(messages):
+            # Another worker polling mid-send finds nothing to do
+            during_send.append((notifications.send_queued_emails(), OutboundEmail.objects.get().claimed_until is not None))
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            self.assertEqual(notifications.send_queued_emails(), 1)
+        self.assertEqual(during_send, [(0, True)])
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.attempts, email.claimed_until), (1, None))
+        self.assertIsNotNone(email.sent_at)
+
+    def test_expired_claims_are_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient('alice')
+        OutboundEmail.objects.update(attempts=1, claimed_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(notifications.send_queued_emails(), 0)
+        OutboundEmail.objects.update(claimed_until=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(notifications.send_queued_emails(), 1)
+        self.assertEqual(OutboundEmail.objects.get().attempts, 2)
+
+
+class BulkOnboardingTests(TestCase):
+    def patient_row(self, i, **overrides):
+        row = {'username': f'patient{i}', 'email': f'patient{i}@example.com', 'full_name': f'Patient {i}', 'date_of_birth': '1990-05-01', 'gender': 'female', 'address': '1 Main St', 'contact_number': f'07100000{i:02d}', 'allergies': 'Penicillin; Latex'}
+        row.update(overrides)
+        return row
+
+    def test_import_reports_per_row_errors(self):
+        create_patient('taken')
+        rows = [
+            self.patient_row(1, password='Secret123!'),
+            self.patient_row(2),
+            self.patient_row(3, username='patient1'),
+            self.patient_row(4, email='taken@example.com'),
+            self.patient_row(5, date_of_birth='not-a-date', gender='unknown'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            report = PatientImporter(workers=1).import_rows(rows)
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4, 5])
+        self.assertEqual(set(report['errors'][2]['errors']), {'date_of_birth', 'gender'})
+
+        patient = Patient.objects.get(user__username='patient1')
+        self.assertTrue(patient.user.check_password('Secret123!'))
+        self.assertFalse(Patient.objects.get(user__username='patient2').user.has_usable_password())
+        self.assertEqual(sorted(patient.allergies.values_list('name', flat=True)), ['Latex', 'Penicillin'])
+        self.assertTrue(is_patient(patient.user))
+        self.assertTrue(Token.objects.filter(user=patient.user).exists())
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def queries_for(rows):
+            with CaptureQueriesContext(connection) as ctx:
+                report = PatientImporter(workers=1, send_welcome=False).import_rows(rows)
+            self.assertEqual(report['created'], len(rows))
+            return len(ctx.captured_queries)
+
+        # The first import also creates the group and allergy rows.
+        queries_for([self.patient_row(0)])
+        self.assertEqual(queries_for([self.patient_row(i) for i in range(1, 3)]), queries_for([self.patient_row(i) for i in range(10, 40)]))
+
+    def test_passwords_are_hashed_in_one_worker_pool(self):
+        rows = [self.patient_row(i, password='Secret123!') for i in range(5)]
+        with mock.patch.object(onboarding, 'ProcessPoolExecutor', wraps=onboarding.ProcessPoolExecutor) as executor:
+            report = PatientImporter(chunk_size=2, workers=2, send_welcome=False).import_rows(rows)
+        self.assertEqual(report['created'], 5)
+        self.assertEqual(executor.call_count, 1)
+        self.assertTrue(CustomUser.objects.get(username='patient4').check_password('Secret123!'))
+
+    def test_passwords_are_hashed_outside_the_transaction(self):
+        depths = []
+
+        def hash_passwords(passwords, pool=None):
+            depths.append(len(connection.atomic_blocks))
+            return [make_password(password) for password in passwords]
+
+        depth = len(connection.atomic_blocks)
+        with mock.patch.object(onboarding, 'hash_passwords', side_effect=hash_passwords):
+            report = PatientImporter(chunk_size=2, send_welcome=False).import_rows([self.patient_row(i) for i in range(3)])
+        self.assertEqual(report['created'], 3)
+        self.assertEqual(depths, [depth, depth])
+
+    def test_rows_that_are_not_objects_are_reported(self):
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True)
+        request = APIRequestFactory().post('/patient/import/', [1, 'x', self.patient_row(1)], format='json')
+        force_authenticate(request, user=admin)
+        response = bulk_import_patients(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content), {'created': 1, 'errors': [
+            {'row': 1, 'errors': {'__all__': ['Each row must be an object.']}},
+            {'row': 2, 'errors': {'__all__': ['Each row must be an object.']}},
+        ]})
+
+    def test_endpoint_requires_staff(self):
+        factory = APIRequestFactory()
+        request = factory.post('/patient/import/', [self.patient_row(1)], format='json')
+        force_authenticate(request, user=create_patient('alice').user)
+        self.assertEqual(bulk_import_patients(request).status_code, 403)
+
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True)
+        request = factory.post('/patient/import/', [self.patient_row(1)], format='json')
+        force_authenticate(request, user=admin)
+        with mock.patch.object(onboarding, 'ProcessPoolExecutor') as executor:
+            response = bulk_import_patients(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content), {'created': 1, 'errors': []})
+        executor.assert_not_called()
+
+    def test_import_doctors_command_reads_csv(self):
+        Specialization.objects.create(name='Cardiology')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('username,email,full_name,specialty,license_number,contact_number\n')
+            f.write('drwho,drwho@example.com,The Doctor,cardiology,LIC-9,0799999999\n')
+            f.write('drno,drno@example.com,Dr No,Dermatology,LIC-10,0799999998\n')
+            f.flush()
+            stdout, stderr = mock.Mock(), mock.Mock()
+            call_command('import_doctors', f.name, '--workers', '1', stdout=stdout, stderr=stderr)
+        self.assertEqual(Doctor.objects.get().user.username, 'drwho')
+        stderr.write.assert_called_once()
+
+
+FAST_HASHER_PARAMS = {'pbkdf2': {'iterations': 1000}, 'scrypt': {'work_factor': 2 ** 8}}
+
+
+@override_settings(PASSWORD_HASHER_PARAMS=FAST_HASHER_PARAMS, PASSWORD_HASHERS=hashers_for_profile('pbkdf2'))
+class RegistrationAndLoginTests(TestCase):
+    password = 'Secret123!'
+
+    def register(self):
+        return self.client.post(reverse('patient_register'), {
+            'username': 'alice', 'email': 'alice@example.com', 'password': self.password, 'confirm_password': self.password,
+            'date_of_birth': '1990-01-01', 'gender': 'female', 'address': '1 Main St', 'contact_number': '0712345678',
+        })
+
+    def login(self):
+        return self.client.post(reverse('patient_login'), {'username': 'alice', 'password': self.password})
+
+    def test_registration_hashes_the_password_once(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as hasher:
+            response = self.register()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(hasher.call_count, 1)
+        user = CustomUser.objects.get(username='alice')
+        self.assertTrue(user.check_password(self.password))
+        self.assertTrue(is_patient(user))
+        self.assertEqual(json.loads(response.content)['token'], Token.objects.get(user=user).key)
+
+    def test_duplicate_username_is_rejected(self):
+        self.register()
+        response = self.register()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', json.loads(response.content)['errors'])
+
+    def test_account_checks_are_shared_with_the_user_form(self):
+        create_patient('bob')
+        data = {
+            'username': 'alice', 'email': 'bob@example.com', 'password': 'weak', 'confirm_password': 'weak',
+            'specialty': Specialization.objects.create(name='Cardiology').pk, 'license_number': 'LIC-1', 'contact_number': '0712345678',
+        }
+        form = DoctorRegistrationForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'email', 'password'})
+        form = DoctorRegistrationForm({**data, 'email': 'alice@example.com', 'password': self.password})
+        self.assertEqual(form.errors['__all__'], ['Passwords do not match.'])
+
+    def test_login_upgrades_hash_when_cost_changes(self):
+        self.register()
+        self.assertIn('$1000$', CustomUser.objects.get(username='alice').password)
+        with self.settings(PASSWORD_HASHER_PARAMS={'pbkdf2': {'iterations': 1500}}):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertIn('$1500$', CustomUser.objects.get(username='alice').password)
+
+    def test_login_upgrades_hash_when_profile_changes(self):
+        self.register()
+        with self.settings(PASSWORD_HASHERS=hashers_for_profile('scrypt')):
+            self.assertEqual(self.login().status_code, 200)
+        user = CustomUser.objects.get(username='alice')
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.assertTrue(user.check_password(self.password))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.patient = create_patient('alice')
+        self.token = Token.objects.create(user=self.patient.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cached_lookup_skips_the_database(self):
+        with self.assertNumQueries(1):
+            user, key = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.patient.user)
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+        local_tokens.clear()
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deleted_token_is_evicted(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_is_evicted(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.patient.user.is_active = False
+        self.patient.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_expired_token_is_rejected(self):
+        Token.objects.filter(pk=self.token.pk).update(created=self.token.created - timedelta(days=30))
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired.'):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_local_cache_is_bounded(self):
+        with self.settings(AUTH_TOKEN={'LOCAL_CACHE_SIZE': 1}):
+            other = Token.objects.create(user=create_patient('bob', contact_number='0711111111').user)
+            self.auth.authenticate_credentials(self.token.key)
+            self.auth.authenticate_credentials(other.key)
+        self.assertEqual(list(local_tokens.entries), [other.key])
+
+    def test_logout_and_rotation_revoke_the_old_key(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        response = self.client.post(reverse('rotate_token'), **headers)
+        new_key = json.loads(response.content)['token']
+        self.assertNotEqual(new_key, self.token.key)
+        self.assertEqual(self.client.post(reverse('logout'), **headers).status_code, 401)
+
+        headers = {'HTTP_AUTHORIZATION': f'Token {new_key}'}
+        self.assertEqual(self.client.get(reverse('list_appointments'), **headers).status_code, 200)
+        self.assertEqual(self.client.post(reverse('logout'), **headers).status_code, 200)
+        self.assertEqual(self.client.get(reverse('list_appointments'), **headers).status_code, 401)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite tuning only applies to the sqlite backend.')
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_tuned_pragmas_are_applied(self):
+        if 'init_command' not in connection.settings_dict.get('OPTIONS', {}):
+            self.skipTest('SQLITE_TUNED is disabled.')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+
+
+class AvailabilityTests(TestCase):
+    monday = date(2030, 1, 7)
+
+    def setUp(self):
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        DoctorSchedule.objects.create(doctor=self.doctor, weekday=0, start_time=time(9, 0), end_time=time(12, 0), slot_minutes=30)
+
+    def slots(self, doctor=None, day=None):
+        day = day or self.monday
+        free = find_free_slots([doctor or self.doctor], day, day)
+        return [slot.strftime('%H:%M') for slot in free.get((doctor or self.doctor).id, {}).get(day, [])]
+
+    def test_booked_and_blocked_slots_are_removed(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(10, 0), reason_for_visit='Checkup')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 0), status='cancelled', reason_for_visit='Checkup')
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday, start_time=time(11, 15), end_time=time(11, 45))
+        self.assertEqual(self.slots(), ['09:00', '09:30', '10:30'])
+
+    def test_off_schedule_booking_blocks_overlapping_slots(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 45), reason_for_visit='Checkup')
+        self.assertEqual(self.slots(), ['09:00', '10:30', '11:00', '11:30'])
+
+    def test_whole_day_exception_and_unavailable_doctor(self):
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday)
+        self.assertEqual(self.slots(), [])
+        self.assertEqual(self.slots(day=self.monday + timedelta(days=1)), [])  # no Tuesday hours
+        self.doctor.is_available = False
+        self.assertEqual(find_free_slots([self.doctor], self.monday, self.monday + timedelta(days=7)), {})
+
+    def test_specialty_search_uses_a_fixed_number_of_queries(self):
+        factory = APIRequestFactory()
+
+        def search():
+            request = factory.get('/availability/', {'specialty': self.doctor.specialty_id, 'date_from': '2030-01-07', 'date_to': '2030-01-13'})
+            force_authenticate(request, user=self.patient.user)
+            with CaptureQueriesContext(connection) as ctx:
+                response = doctor_availability(request)
+            self.assertEqual(response.status_code, 200)
+            return json.loads(response.content), len(ctx.captured_queries)
+
+        body, few = search()
+        self.assertEqual(body['doctors'][0]['slots']['2030-01-07'][:2], ['09:00', '09:30'])
+        for i in range(5):
+            doctor = create_doctor(f'doc{i}', license_number=f'LIC-{i + 10}', contact_number=f'07300000{i:02d}')
+            DoctorSchedule.objects.create(doctor=doctor, weekday=0, start_time=time(9, 0), end_time=time(17, 0))
+            Appointment.objects.create(patient=self.patient, doctor=doctor, date=self.monday, time=time(13 + i % 3, 0), status='cancelled' if i else 'pending', reason_for_visit='Checkup')
+        body, many = search()
+        self.assertEqual(len(body['doctors']), 6)
+        self.assertEqual(few, many)
+
+    def test_invalid_range_is_rejected(self):
+        request = APIRequestFactory().get('/availability/', {'doctor': self.doctor.id, 'date_from': '2030-01-07', 'date_to': '2030-03-07'})
+        force_authenticate(request, user=self.patient.user)
+        self.assertEqual(doctor_availability(request).status_code, 400)
+
+    def test_schedule_put_rejects_a_list_body(self):
+        request = APIRequestFactory().put('/doctor/schedule/', [{'weekday': 0}], format='json')
+        force_authenticate(request, user=self.doctor.user)
+        response = manage_schedule(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.doctor.schedules.exists())
+
+
+class DoctorDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = create_patient('alice')
+        self.cardio = create_doctor('drwho')
+        neuro = Specialization.objects.create(name='Neurology')
+        self.neuro = Doctor.objects.create(user=CustomUser.objects.create_user(username='drstrange', full_name='Stephen Strange'), specialty=neuro, license_number='LIC-2', contact_number='0700000002')
+        Doctor.objects.create(user=CustomUser.objects.create_user(username='drhouse', full_name='Gregory House'), specialty=neuro, license_number='LIC-3', contact_number='0700000003', is_available=False)
+
+    def search(self, **params):
+        request = APIRequestFactory().get('/doctors/', params)
+        force_authenticate(request, user=self.patient.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = doctor_directory(request)
+        self.assertEqual(response.status_code, 200)
+        self.queries = len(ctx.captured_queries)
+        return json.loads(response.content)
+
+    def names(self, **params):
+        return [row['full_name'] for row in self.search(**params)['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.names(), ['Drwho', 'Gregory House', 'Stephen Strange'])
+        self.assertEqual(self.names(specialty=self.neuro.specialty_id), ['Gregory House', 'Stephen Strange'])
+        self.assertEqual(self.names(specialty=self.neuro.specialty_id, available='true'), ['Stephen Strange'])
+        self.assertEqual(self.names(name='  sTePh'), ['Stephen Strange'])
+        self.assertEqual(self.names(name='house'), [])
+        row = self.search(name='steph')['results'][0]
+        self.assertEqual(row, {
+            'id': self.neuro.id, 'full_name': 'Stephen Strange', 'specialty_id': self.neuro.specialty_id, 'specialty_name': 'Neurology', 'is_available': True,
+            'rating_count': 0, 'rating_average': None, 'rating_histogram': {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0},
+        })
+
+    def test_pages(self):
+        body = self.search(page_size=2)
+        self.assertTrue(body['has_next'])
+        body = self.search(page_size=2, page=2)
+        self.assertEqual([row['full_name'] for row in body['results']], ['Stephen Strange'])
+        self.assertFalse(body['has_next'])
+
+    def test_pages_are_cached_until_a_doctor_changes(self):
+        self.search(specialty=self.neuro.specialty_id)
+        self.assertEqual(self.names(specialty=self.neuro.specialty_id), ['Gregory House', 'Stephen Strange'])
+        self.assertEqual(self.queries, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neuro.user.full_name = 'Doctor Strange'
+            self.neuro.user.save()
+        self.assertEqual(self.names(specialty=self.neuro.specialty_id), ['Doctor Strange', 'Gregory House'])
+        self.assertEqual(self.queries, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neuro.is_available = False
+            self.neuro.save()
+        self.assertEqual(self.names(specialty=self.neuro.specialty_id, available='1'), [])
+
+    def test_invalid_params_are_rejected(self):
+        request = APIRequestFactory().get('/doctors/', {'specialty': 'x'})
+        force_authenticate(request, user=self.patient.user)
+        self.assertEqual(doctor_directory(request).status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output is SQLite-specific')
+    def test_name_prefix_uses_the_name_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        plan = CustomUser.objects.annotate(name_key=Lower('full_name')).filter(name_key__gte='st', name_key__lt='st\U0010ffff').explain()
+        self.assertIn('customuser_full_name_idx', plan)
+
+
+class AllergyScreeningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        self.penicillin = Allergy.objects.create(name='Penicillin allergy', description='Amoxicillin; ampicillin')
+        self.ulcer = MedicalCondition.objects.create(name='Peptic ulcer', description='Aspirin, ibuprofen')
+        self.patient.allergies.add(self.penicillin)
+        self.patient.medical_conditions.add(self.ulcer)
+        Allergy.objects.create(name='Latex')
+
+    def post(self, view, data):
+        request = self.factory.post('/', data, format='json')
+        force_authenticate(request, user=self.doctor.user)
+        return view(request)
+
+    def test_terms_are_normalized(self):
+        self.assertEqual(allergen_terms('Penicillin Allergy', 'Amoxicillin,  AMPICILLIN\nSevere rash as a child in hospital'), {' penicillin ', ' amoxicillin ', ' ampicillin '})
+        self.assertEqual(allergen_terms('Asthma', 'Propranolol', include_name=False), {' propranolol '})
+
+    def test_names_are_indexed_regardless_of_length(self):
+        self.assertEqual(allergen_terms('Non steroidal anti inflammatory drugs', 'Ibuprofen; NSAIDs of any kind taken by mouth'), {' non steroidal anti inflammatory drugs ', ' ibuprofen '})
+        self.assertEqual(allergen_terms('Zn', ''), {' zn '})
+        self.assertEqual(allergen_terms('Allergy', ''), {' allergy '})
+        index = AllergenIndex([(('allergy', 1), 'NSAIDs', allergen_terms('Non steroidal anti inflammatory drugs', ''))])
+        self.assertEqual([c['id'] for c in index.screen('Non-steroidal anti-inflammatory drugs (generic)', {('allergy', 1)})], [1])
+
+    def test_automaton_finds_overlapping_terms(self):
+        automaton = Automaton([' he ', ' she ', ' hers ', 'her'])
+        self.assertEqual(automaton.find(' ushers she '), {'her', ' she '})
+
+    def test_screening_matches_whole_words_only(self):
+        index = AllergenIndex.build()
+        keys = {('allergy', self.penicillin.id), ('condition', self.ulcer.id)}
+        self.assertEqual([c['name'] for c in index.screen('Amoxicillin 500mg', keys)], ['Penicillin allergy'])
+        self.assertEqual([c['term'] for c in index.screen('Ibuprofen (Advil)', keys)], ['ibuprofen'])
+        self.assertEqual(index.screen('Aspirinex', keys), [])
+        self.assertEqual(index.screen('Latex gloves', keys), [])
+
+    def test_create_prescription_rejects_allergens(self):
+        data = {'patient': self.patient.id, 'medication': 'Amoxicillin', 'dosage': '500mg', 'quantity': 10, 'expiration_date': '2030-01-01'}
+        response = self.post(create_prescription, data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['conflicts'][0]['id'], self.penicillin.id)
+        self.assertEqual(json.loads(response.content)['error'], 'Contraindicated: Penicillin allergy (allergy).')
+        response = self.post(create_prescription, {**data, 'medication': 'Aspirin'})
+        self.assertEqual(json.loads(response.content)['error'], 'Contraindicated: Peptic ulcer (condition).')
+        response = self.post(create_prescription, {**data, 'medication': 'Paracetamol'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_batch_screening_uses_one_patient_query(self):
+        medications = ['Paracetamol', 'Aspirin', 'amoxicillin', 'Penicillin V']
+        self.post(screen_prescriptions, {'patient': self.patient.id, 'medications': medications})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post(screen_prescriptions, {'patient': self.patient.id, 'medications': medications})
+        results = json.loads(response.content)['results']
+        self.assertEqual([bool(result['conflicts']) for result in results], [False, True, True, True])
+        self.assertEqual(len(ctx.captured_queries), 2)  # patient exists + allergen union
+
+    def test_index_is_rebuilt_when_allergens_change(self):
+        self.post(screen_prescriptions, {'patient': self.patient.id, 'medications': ['Naproxen']})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ulcer.description = 'Aspirin, ibuprofen, naproxen'
+            self.ulcer.save()
+        results = json.loads(self.post(screen_prescriptions, {'patient': self.patient.id, 'medications': ['Naproxen']}).content)['results']
+        self.assertEqual(results[0]['conflicts'][0]['type'], 'condition')
+
+    def test_invalid_batch_is_rejected(self):
+        self.assertEqual(self.post(screen_prescriptions, {'patient': self.patient.id, 'medications': 'Aspirin'}).status_code, 400)
+        self.assertEqual(self.post(screen_prescriptions, {'patient': 'x', 'medications': []}).status_code, 400)
+        self.assertEqual(self.post(screen_prescriptions, {'patient': 0, 'medications': []}).status_code, 404)
+
+
+class MessagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.alice = create_patient('alice').user
+        self.doctor = create_doctor('drwho').user
+        self.bob = create_patient('bob', contact_number='0722222222').user
+
+    def call(self, view, user, method='get', data=None, **kwargs):
+        request = getattr(self.factory, method)('/', data, format='json' if method == 'post' else None)
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    def send(self, sender, recipient, content, thread=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            status, body = self.call(inbox, sender, 'post', {'recipient': recipient.id, 'content': content, 'thread': thread})
+        self.assertEqual(status, 201, body)
+        return body
+
+    def test_inbox_pages_and_unread_count(self):
+        for i in range(5):
+            self.send(self.doctor, self.alice, f'Message {i}')
+        self.send(self.alice, self.doctor, 'Reply')
+        status, body = self.call(inbox, self.alice, data={'page_size': 3})
+        self.assertEqual([m['content'] for m in body['results']], ['Message 4', 'Message 3', 'Message 2'])
+        self.assertEqual(body['unread_count'], 5)
+        status, body = self.call(inbox, self.alice, data={'page_size': 3, 'cursor': body['next_cursor']})
+        self.assertEqual([m['content'] for m in body['results']], ['Message 1', 'Message 0'])
+        self.assertIsNone(body['next_cursor'])
+        status, body = self.call(outbox, self.alice)
+        self.assertEqual([m['content'] for m in body['results']], ['Reply'])
+
+    def test_unread_counter_follows_sends_and_reads(self):
+        first = self.send(self.doctor, self.alice, 'Hello')
+        self.call(inbox, self.alice)  # caches the count
+        self.send(self.doctor, self.alice, 'Hello again')
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.call(inbox, self.alice, data={'unread': '1'})
+        self.assertEqual(body['unread_count'], 2)
+        # The only COUNT is the ETag aggregate (MAX(updated_at), COUNT(*)); no recount
+        self.assertFalse(any('COUNT' in query['sql'] and 'MAX' not in query['sql'] for query in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            status, body = self.call(mark_messages_read, self.alice, 'post', {'ids': [first['id'], first['id']]})
+        self.assertEqual(body['updated'], 1)
+        self.assertEqual(self.call(inbox, self.alice)[1]['unread_count'], 1)
+        # Reading again, or someone else's message, changes nothing.
+        status, body = self.call(mark_messages_read, self.bob, 'post', {'ids': [first['id']]})
+        self.assertEqual(body['updated'], 0)
+        cache.clear()
+        self.assertEqual(self.call(inbox, self.alice)[1]['unread_count'], 1)
+
+    def test_thread_is_fetched_in_one_query(self):
+        root = self.send(self.alice, self.doctor, 'Question')
+        reply = self.send(self.doctor, self.alice, 'Answer', thread=root['id'])
+        nested = self.send(self.alice, self.doctor, 'Follow-up', thread=reply['id'])
+        self.assertEqual(Message.objects.get(id=nested['id']).root_id, root['id'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.call(message_thread, self.doctor, message_id=nested['id'])
+        self.assertEqual([m['content'] for m in body['results']], ['Question', 'Answer', 'Follow-up'])
+        self.assertEqual(len(ctx.captured_queries), 2)  # the message itself + the thread
+
+    def test_outsiders_cannot_read_or_join_threads(self):
+        root = self.send(self.alice, self.doctor, 'Private')
+        self.assertEqual(self.call(message_thread, self.bob, message_id=root['id'])[0], 404)
+        status, body = self.call(inbox, self.bob, 'post', {'recipient': self.doctor.id, 'content': 'Hi', 'thread': root['id']})
+        self.assertEqual(status, 400)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        self.token = Token.objects.create(user=self.patient.user)
+
+    async def test_broker_fans_out_across_threads(self):
+        broker = events.InMemoryBroker()
+        first, second = broker.subscribe('user:1'), broker.subscribe('user:1')
+        other = broker.subscribe('user:2')
+        await asyncio.to_thread(broker.publish, 'user:1', 'message', {'id': 7})
+        self.assertEqual(await first.get(timeout=1), ('message', {'id': 7}))
+        self.assertEqual(await second.get(timeout=1), ('message', {'id': 7}))
+        self.assertIsNone(await other.get(timeout=0.01))
+        for subscription in (first, second, other):
+            subscription.close()
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_stream_delivers_events_for_the_user(self):
+        response = await self.async_client.get('/api/events/', {'token': self.token.key})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')  # subscribed from here on
+        events.get_broker().publish(events.user_channel(self.patient.user.pk), 'appointment_status', {'id': 1, 'status': 'confirmed'})
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(chunk, b'id: 1\nevent: appointment_status\ndata: {"id": 1, "status": "confirmed"}\n\n')
+        # A client disconnect cancels the pending read, which unsubscribes.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(events.user_channel(self.patient.user.pk), events.get_broker().subscribers)
+
+    async def test_stream_requires_a_token(self):
+        self.assertEqual((await self.async_client.get('/api/events/')).status_code, 401)
+        self.assertEqual((await self.async_client.get('/api/events/', {'token': 'nope'})).status_code, 401)
+
+    def test_status_changes_and_messages_are_published_on_commit(self):
+        appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2030, 1, 1), time=time(9, 0), reason_for_visit='Checkup')
+        broker = mock.Mock()
+        with mock.patch.object(events, 'get_broker', return_value=broker), self.captureOnCommitCallbacks(execute=True):
+            request = APIRequestFactory().patch('/appointments/manage/', {'id': appointment.id, 'status': 'confirmed'}, format='json')
+            force_authenticate(request, user=self.doctor.user)
+            self.assertEqual(manage_appointments(request).status_code, 200)
+            request = APIRequestFactory().post('/messages/', {'recipient': self.patient.user.id, 'content': 'See you soon'}, format='json')
+            force_authenticate(request, user=self.doctor.user)
+            self.assertEqual(inbox(request).status_code, 201)
+            broker.publish.assert_not_called()
+        channels = sorted((call.args[0], call.args[1]) for call in broker.publish.call_args_list)
+        self.assertEqual(channels, [
+            (events.user_channel(self.doctor.user.pk), 'appointment_status'),
+            (events.user_channel(self.patient.user.pk), 'appointment_status'),
+            (events.user_channel(self.patient.user.pk), 'message'),
+        ])
+
+
+# Committed rows: authenticate() runs on the password threads' own connections
+@override_settings(PASSWORD_HASHER_PARAMS=FAST_HASHER_PARAMS, PASSWORD_HASHERS=hashers_for_profile('pbkdf2'))
+class AsyncLoginTests(TransactionTestCase):
+    password = 'Secret123!'
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.doctor = create_doctor('drwho', password=self.password)
+        self.patient = create_patient('alice', password=self.password)
+        self.doctor_token = Token.objects.create(user=self.doctor.user).key
+        self.patient_token = Token.objects.create(user=self.patient.user).key
+
+    async def test_login_issues_the_existing_token(self):
+        response = await self.async_client.post(reverse('async_patient_login'), {'username': 'alice', 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['token'], self.patient_token)
+        response = await self.async_client.post(reverse('async_doctor_login'), {'username': 'drwho', 'password': self.password}, content_type='application/json')
+        self.assertEqual(json.loads(response.content)['token'], self.doctor_token)
+
+    async def test_login_rejects_bad_credentials_and_wrong_role(self):
+        failed = []
+        user_login_failed.connect(lambda sender, credentials, **kwargs: failed.append(credentials['username']), weak=False, dispatch_uid='async-login-test')
+        try:
+            for url, username, password in [('async_patient_login', 'alice', 'wrong'), ('async_patient_login', 'nobody', self.password), ('async_doctor_login', 'alice', self.password)]:
+                response = await self.async_client.post(reverse(url), {'username': username, 'password': password})
+                self.assertEqual(response.status_code, 400)
+        finally:
+            user_login_failed.disconnect(dispatch_uid='async-login-test')
+        # Same signal as the sync login; the wrong role isn't a failed login
+        self.assertEqual(failed, ['alice', 'nobody'])
+
+    async def test_login_honours_authentication_backends(self):
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend']):
+            await CustomUser.objects.filter(username='alice').aupdate(is_active=False)
+            response = await self.async_client.post(reverse('async_patient_login'), {'username': 'alice', 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHER_PARAMS=FAST_HASHER_PARAMS, PASSWORD_HASHERS=hashers_for_profile('pbkdf2'))
+class AsyncViewTests(TestCase):
+    password = 'Secret123!'
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.doctor = create_doctor('drwho', password=self.password)
+        self.patient = create_patient('alice', password=self.password)
+        self.doctor_token = Token.objects.create(user=self.doctor.user).key
+        self.patient_token = Token.objects.create(user=self.patient.user).key
+        self.appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2030, 1, 1), time=time(9, 0), reason_for_visit='Checkup')
+
+    def auth(self, token):
+        return {'headers': {'Authorization': f'Token {token}'}}
+
+    async def test_lists_match_the_sync_views(self):
+        for name, token in [('list_appointments', self.patient_token), ('manage_appointments', self.doctor_token)]:
+            for params in [{}, {'page_size': 1}, {'compact': '1'}]:
+                sync = await sync_to_async(self.client.get)(reverse(name), params, **self.auth(token))
+                response = await self.async_client.get(reverse(f'async_{name}'), params, **self.auth(token))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), json.loads(sync.content))
+        response = await self.async_client.get(reverse('async_manage_appointments'), {'stream': '1'}, **self.auth(self.doctor_token))
+        body = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([row['id'] for row in body], [self.appointment.id])
+
+    async def test_booking_and_status_update(self):
+        url = reverse('async_list_appointments')
+        data = {'doctor': self.doctor.id, 'date': '2030-01-02', 'time': '10:00', 'reason_for_visit': 'Follow-up'}
+        response = await self.async_client.post(url, data, content_type='application/json', **self.auth(self.patient_token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['patient']['id'], self.patient.id)
+        response = await self.async_client.post(url, data, content_type='application/json', **self.auth(self.patient_token))
+        self.assertEqual(response.status_code, 400)
+
+        url = reverse('async_manage_appointments')
+        response = await self.async_client.patch(url, {'id': self.appointment.id, 'status': 'confirmed'}, content_type='application/json', **self.auth(self.doctor_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Appointment.objects.aget(id=self.appointment.id)).status, 'confirmed')
+
+    async def test_authentication_and_roles_are_enforced(self):
+        url = reverse('async_manage_appointments')
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+        self.assertEqual((await self.async_client.get(url, **self.auth('nope'))).status_code, 401)
+        self.assertEqual((await self.async_client.get(url, **self.auth(self.patient_token))).status_code, 403)
+        self.assertEqual((await self.async_client.put(url, **self.auth(self.doctor_token))).status_code, 405)
+
+
+class DoctorRatingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor('drwho')
+        self.other = create_doctor('drhouse', license_number='LIC-2', contact_number='0700000002')
+        self.patients = [create_patient(f'patient{i}', contact_number=f'07100000{i:02d}') for i in range(4)]
+
+    def feedback(self, patient, rating, doctor=None):
+        appointment = Appointment.objects.create(patient=patient, doctor=doctor or self.doctor, date=date(2030, 1, 1), time=time(9, Appointment.objects.count()), reason_for_visit='Checkup')
+        return Feedback.objects.create(appointment=appointment, patient=patient, doctor=doctor or self.doctor, rating=rating)
+
+    def summary(self, doctor=None):
+        rating = DoctorRating.objects.get(doctor=doctor or self.doctor)
+        return rating.count, rating.total, rating.histogram
+
+    def test_summary_follows_create_update_and_delete(self):
+        first = self.feedback(self.patients[0], 5)
+        self.feedback(self.patients[1], 3)
+        self.assertEqual(self.summary(), (2, 8, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}))
+
+        first.rating = 1
+        first.save()
+        self.assertEqual(self.summary(), (2, 4, {1: 1, 2: 0, 3: 1, 4: 0, 5: 0}))
+        first.comments = 'Changed my mind'
+        first.save(update_fields=['comments'])
+        self.assertEqual(self.summary()[0], 2)
+
+        first.doctor = self.other
+        first.save()
+        self.assertEqual(self.summary(), (1, 3, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}))
+        self.assertEqual(self.summary(self.other), (1, 1, {1: 1, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+        first.delete()
+        Appointment.objects.filter(doctor=self.doctor).delete()  # cascades to the feedback
+        self.assertEqual(self.summary()[:2], (0, 0))
+        self.assertEqual(self.summary(self.other)[:2], (0, 0))
+
+    def test_rebuild_uses_one_grouped_query(self):
+        for i, rating in enumerate([5, 4, 4]):
+            self.feedback(self.patients[i], rating)
+        self.feedback(self.patients[3], 2, doctor=self.other)
+        DoctorRating.objects.update(count=99, total=0)
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('rebuild_doctor_ratings', stdout=mock.MagicMock())
+        self.assertEqual(sum('GROUP BY' in query['sql'] for query in ctx.captured_queries), 1)
+        self.assertEqual(self.summary(), (3, 13, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1}))
+        self.assertEqual(self.summary(self.other)[:2], (1, 2))
+
+    def test_directory_shows_and_sorts_by_rating(self):
+        self.feedback(self.patients[0], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feedback(self.patients[1], 5, doctor=self.other)
+        create_doctor('drnew', license_number='LIC-3', contact_number='0700000003')
+        request = APIRequestFactory().get('/doctors/', {'sort': 'rating'})
+        force_authenticate(request, user=self.patients[0].user)
+        rows = json.loads(doctor_directory(request).content)['results']
+        self.assertEqual([(row['full_name'], row['rating_average']) for row in rows], [('Drhouse', 5.0), ('Drwho', 2.0), ('Drnew', None)])
+        self.assertEqual(rows[1]['rating_histogram']['2'], 1)
+
+
+class DailyAppointmentStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor('drwho')
+        self.other = create_doctor('drhouse', license_number='LIC-2', contact_number='0700000002')
+        self.patient = create_patient('alice')
+        self.token = Token.objects.create(user=self.doctor.user).key
+        self.admin = CustomUser.objects.create_superuser('root', 'root@example.com', 'Secret123!')
+
+    def book(self, day, hour, doctor=None, **fields):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, date=day, time=time(hour, 0), reason_for_visit='Checkup', **fields)
+
+    def counts(self, day, doctor=None):
+        return DailyAppointmentStats.objects.filter(doctor=doctor or self.doctor, date=day).values_list('pending', 'confirmed', 'cancelled', 'completed').first()
+
+    def test_counts_follow_saves_status_changes_and_deletes(self):
+        day = date(2030, 1, 1)
+        first = self.book(day, 9)
+        self.book(day, 10, status='confirmed')
+        self.assertEqual(self.counts(day), (1, 1, 0, 0))
+
+        second = Appointment.objects.get(date=day, time=time(10, 0))
+        response = self.client.patch(reverse('manage_appointments'), {'id': first.id, 'status': 'confirmed'}, content_type='application/json', headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(day), (0, 2, 0, 0))
+        response = async_to_sync(self.async_client.patch)(reverse('async_manage_appointments'), {'id': second.id, 'status': 'cancelled'}, content_type='application/json', headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(day), (0, 1, 1, 0))
+
+        first.refresh_from_db()
+        first.is_completed = True
+        first.save()
+        self.assertEqual(self.counts(day), (0, 1, 1, 1))
+        first.reason_for_visit = 'Follow-up'
+        first.save(update_fields=['reason_for_visit'])
+        self.assertEqual(self.counts(day), (0, 1, 1, 1))
+
+        # Rescheduled to another day and doctor
+        first.date, first.doctor = date(2030, 1, 2), self.other
+        first.save()
+        self.assertEqual(self.counts(day), (0, 0, 1, 0))
+        self.assertEqual(self.counts(date(2030, 1, 2), self.other), (0, 1, 0, 1))
+
+        first.delete()
+        self.assertEqual(self.counts(date(2030, 1, 2), self.other), (0, 0, 0, 0))
+
+    def test_failed_stats_update_rolls_back_the_save(self):
+        day = date(2030, 1, 1)
+        appointment = self.book(day, 9)
+        adjust = mock.Mock(side_effect=[None, OperationalError('database is locked')])
+        with mock.patch('authentication.signals.adjust_daily_stats', adjust):
+            appointment.status = 'confirmed'
+            with self.assertRaises(OperationalError):
+                appointment.save()
+        # The status change and the pending decrement are undone together
+        self.assertEqual(adjust.call_count, 2)
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).status, 'pending')
+        self.assertEqual(self.counts(day), (1, 0, 0, 0))
+
+        with mock.patch('authentication.signals.adjust_daily_stats', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                Appointment.objects.get(pk=appointment.pk).delete()
+        self.assertTrue(Appointment.objects.filter(pk=appointment.pk).exists())
+
+    def test_rebuild_uses_one_grouped_query(self):
+        self.book(date(2030, 1, 1), 9)
+        self.book(date(2030, 1, 1), 10, status='cancelled')
+        self.book(date(2030, 1, 2), 9, status='confirmed', is_completed=True)
+        self.book(date(2030, 1, 1), 11, doctor=self.other)
+        expected = sorted(DailyAppointmentStats.objects.values_list('doctor', 'date', 'pending', 'confirmed', 'cancelled', 'completed'))
+        DailyAppointmentStats.objects.update(pending=99)
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('rebuild_appointment_stats', stdout=mock.MagicMock())
+        self.assertEqual(sum('GROUP BY' in query['sql'] for query in ctx.captured_queries), 1)
+        self.assertEqual(sorted(DailyAppointmentStats.objects.values_list('doctor', 'date', 'pending', 'confirmed', 'cancelled', 'completed')), expected)
+        self.assertEqual(len(expected), 3)
+
+    def test_report_groups_and_rates(self):
+        past, future = date.today() - timedelta(days=3), date.today() + timedelta(days=3)
+        self.book(past, 9, status='confirmed', is_completed=True)
+        self.book(past, 10, status='confirmed')  # no-show
+        self.book(past, 11, status='cancelled')
+        self.book(future, 9)
+        self.book(past, 12, doctor=self.other, status='confirmed', is_completed=True)
+        Appointment.objects.create(patient=create_patient('bob', contact_number='0700000009'), doctor=self.other, date=past, time=time(10, 0), reason_for_visit='Checkup', status='pending')
+
+        url = reverse('appointment_report')
+        auth = {'headers': {'Authorization': f'Token {Token.objects.create(user=self.admin).key}'}}
+        params = {'date_from': past.isoformat(), 'date_to': future.isoformat(), 'group_by': 'doctor'}
+        with CaptureQueriesContext(connection) as ctx:
+            body = json.loads(self.client.get(url, params, **auth).content)
+        self.assertFalse(any('authentication_appointment' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual(body['totals']['total'], 6)
+        self.assertEqual((body['totals']['no_shows'], body['totals']['no_show_rate']), (2, 0.5))
+        rows = {row['doctor_name']: row for row in body['results']}
+        self.assertEqual(
+            {name: (row['total'], row['cancelled'], row['completed'], row['no_shows']) for name, row in rows.items()},
+            {'Drwho': (4, 1, 1, 1), 'Drhouse': (2, 0, 1, 1)},
+        )
+        self.assertEqual(rows['Drwho']['cancellation_rate'], 0.25)
+        self.assertEqual(rows['Drwho']['no_show_rate'], 0.5)
+
+        body = json.loads(self.client.get(url, {**params, 'group_by': 'day,specialty', 'doctor': self.doctor.id}, **auth).content)
+        self.assertEqual([(row['date'], row['specialty_name'], row['total']) for row in body['results']], [(past.isoformat(), 'Cardiology', 3), (future.isoformat(), 'Cardiology', 1)])
+        self.assertIsNone(body['results'][1]['no_show_rate'])
+
+        for bad in [{'group_by': 'status'}, {'date_from': 'soon'}, {'date_from': '2030-01-02', 'date_to': '2030-01-01'}, {'doctor': 'x'}]:
+            self.assertEqual(self.client.get(url, bad, **auth).status_code, 400)
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Token {self.token}'}).status_code, 403)
+
+
+class BatchStatusUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor('drwho')
+        self.other = create_doctor('drhouse', license_number='LIC-2', contact_number='0700000002')
+        self.patient = create_patient('alice')
+        self.token = Token.objects.create(user=self.doctor.user).key
+        self.day = date(2030, 1, 1)
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(9 + hour, 0), reason_for_visit='Checkup')
+            for hour in range(4)
+        ]
+        self.cancelled = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(14, 0), reason_for_visit='Checkup', status='cancelled')
+        self.foreign = Appointment.objects.create(patient=self.patient, doctor=self.other, date=self.day, time=time(15, 0), reason_for_visit='Checkup')
+
+    def patch(self, data, url_name='manage_appointments'):
+        return self.client.patch(reverse(url_name), data, content_type='application/json', headers={'Authorization': f'Token {self.token}'})
+
+    def test_batch_applies_valid_changes_with_one_update_per_target(self):
+        first, second, third, fourth = self.appointments
+        self.client.get(reverse('manage_appointments'), headers={'Authorization': f'Token {self.token}'})
+        broker = mock.Mock()
+        changes = [
+            {'id': first.id, 'status': 'confirmed'},
+            {'id': second.id, 'status': 'confirmed'},
+            {'id': third.id, 'status': 'confirmed', 'is_completed': True},
+            {'id': fourth.id, 'status': 'pending'},
+            {'id': self.cancelled.id, 'status': 'pending'},
+            {'id': fourth.id, 'status': 'cancelled'},
+            {'id': self.foreign.id, 'status': 'confirmed'},
+            {'id': first.id, 'status': 'done'},
+            {'id': 'x'},
+            {'id': third.id + 100},
+        ]
+        with mock.patch.object(events, 'get_broker', return_value=broker), self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            response = self.patch(changes)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual(results[:4], [
+            {'id': first.id, 'status': 'confirmed', 'is_completed': False, 'updated': True},
+            {'id': second.id, 'status': 'confirmed', 'is_completed': False, 'updated': True},
+            {'id': third.id, 'status': 'confirmed', 'is_completed': True, 'updated': True},
+            {'id': fourth.id, 'status': 'pending', 'is_completed': False, 'updated': False},
+        ])
+        self.assertEqual([result['error'] for result in results[4:]], [
+            'Cancelled appointments cannot be reopened.', 'Duplicate id in batch.', 'Appointment not found',
+            'status must be one of: cancelled, confirmed, pending.', 'id must be an integer.', 'Status is required',
+        ])
+        updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "authentication_appointment"')]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(dict(Appointment.objects.filter(doctor=self.doctor).values_list('id', 'status')), {
+            first.id: 'confirmed', second.id: 'confirmed', third.id: 'confirmed', fourth.id: 'pending', self.cancelled.id: 'cancelled',
+        })
+        self.assertTrue(Appointment.objects.get(id=third.id).is_completed)
+        self.assertGreater(Appointment.objects.get(id=first.id).updated_at, Appointment.objects.get(id=fourth.id).updated_at)
+        self.assertEqual(Appointment.objects.get(id=self.foreign.id).status, 'pending')
+        self.assertEqual(broker.publish.call_count, 6)  # patient and doctor, for each changed appointment
+
+        # The rollup moved like a rebuild would, and the cached list was dropped
+        counts = sorted(DailyAppointmentStats.objects.values_list('doctor', 'date', 'pending', 'confirmed', 'cancelled', 'completed'))
+        rebuild_daily_stats()
+        self.assertEqual(sorted(DailyAppointmentStats.objects.values_list('doctor', 'date', 'pending', 'confirmed', 'cancelled', 'completed')), counts)
+        response = self.client.get(reverse('manage_appointments'), headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(sorted(row['status'] for row in json.loads(response.content)), ['cancelled', 'confirmed', 'confirmed', 'confirmed', 'pending'])
+
+    def test_async_batch_matches(self):
+        first, second = self.appointments[:2]
+        response = self.patch([{'id': first.id, 'status': 'cancelled'}, {'id': second.id, 'is_completed': True}], 'async_manage_appointments')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['results'], [
+            {'id': first.id, 'status': 'cancelled', 'is_completed': False, 'updated': True},
+            {'id': second.id, 'error': 'Only confirmed appointments can be completed.'},
+        ])
+        self.assertEqual(Appointment.objects.get(id=first.id).status, 'cancelled')
+
+    def test_single_change_and_body_validation(self):
+        self.assertEqual(self.patch({'id': self.appointments[0].id, 'status': 'confirmed'}).status_code, 200)
+        self.assertEqual(self.patch({'id': self.cancelled.id, 'status': 'confirmed'}).status_code, 400)
+        self.assertEqual(self.patch({'id': self.appointments[0].id}).status_code, 400)
+        self.assertEqual(self.patch({'id': self.foreign.id, 'status': 'confirmed'}).status_code, 404)
+        for url_name in ['manage_appointments', 'async_manage_appointments']:
+            self.assertEqual(self.patch([], url_name).status_code, 400)
+            self.assertEqual(self.patch([{'id': 1, 'status': 'confirmed'}] * (MAX_BATCH_SIZE + 1), url_name).status_code, 400)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        self.other = create_patient('bob', contact_number='0722222222')
+        self.appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2030, 1, 1), time=time(9, 0), reason_for_visit='Checkup')
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.doctor.user).key}'}
+
+    def get(self, params=None, **headers):
+        return self.client.get(reverse('manage_appointments'), params or {}, headers={**self.headers, **headers})
+
+    def test_hits_are_served_without_queries(self):
+        first = self.get({'status': 'pending'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as ctx:
+            # sort_by=date is the default, so this normalizes to the same key
+            second = self.get({'sort_by': 'date', 'status': 'pending'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertNotIn('appointment', ' '.join(query['sql'] for query in ctx.captured_queries))
+        self.assertEqual(self.get({'status': 'cancelled'})['X-Cache'], 'MISS')
+        self.assertEqual(cache_stats(), {'miss': 2, 'hit': 1})
+
+    def test_if_none_match_returns_304(self):
+        etag = self.get()['ETag']
+        response = self.get(**{'If-None-Match': f'"other", {etag}'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.get(**{'If-None-Match': '"stale"'}).status_code, 200)
+        self.assertEqual(cache_stats()['not_modified'], 1)
+
+    def test_changes_invalidate_both_sides(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(patient=self.other, doctor=self.doctor, date=date(2030, 1, 2), time=time(9, 0), reason_for_visit='Checkup')
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            # The doctor's list embeds the patient's contact number
+            self.patient.contact_number = '0733333333'
+            self.patient.save()
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.content)[0]['patient']['contact_number'], '0733333333')
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Prescription.objects.create(patient=self.patient, doctor=self.doctor, medication='Ibuprofen', dosage='200mg', quantity=10, expiration_date=date(2030, 1, 1))
+        self.assertEqual(self.get(**{'If-None-Match': etag})['X-Cache'], 'MISS')
+
+    def test_related_row_changes_invalidate_the_lists(self):
+        contact = EmergencyContact.objects.create(name='Carol', relationship='Sister', phone_number='0744444444')
+        allergy = Allergy.objects.create(name='Latex')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.emergency_contact = contact
+            self.patient.save()
+
+        def changes(change):
+            etag = self.get()['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.get(**{'If-None-Match': etag})
+            self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+            return json.loads(response.content)[0]
+
+        self.assertEqual(changes(lambda: self.patient.allergies.add(allergy))['patient']['allergies'], [allergy.pk])
+        self.assertEqual(changes(lambda: allergy.patient_set.clear())['patient']['allergies'], [])
+        changes(lambda: allergy.patient_set.add(self.patient))
+        self.assertEqual(changes(allergy.delete)['patient']['allergies'], [])
+        contact.phone_number = '0755555555'
+        self.assertEqual(changes(contact.save)['patient']['emergency_contact']['phone_number'], '0755555555')
+        self.assertIsNone(changes(contact.delete)['patient']['emergency_contact'])
+
+        etag = self.get({'compact': '1'})['ETag']
+        specialty = self.doctor.specialty
+        specialty.name = 'Cardiac surgery'
+        with self.captureOnCommitCallbacks(execute=True):
+            specialty.save()
+        response = self.get({'compact': '1'}, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cardiac surgery', response.content.decode())
+
+    def test_streams_bypass_the_cache(self):
+        response = self.get({'stream': '1'})
+        self.assertTrue(response.streaming)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(cache_stats(), {'bypass': 1})
+
+
+@override_settings(APPOINTMENT_LIST_CACHE_TIMEOUT=0)
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2030, 1, 1 + i), time=time(9, 0), reason_for_visit='Checkup')
+            for i in range(3)
+        ]
+
+    def get(self, view, params=None, user=None, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        request = self.factory.get('/', params or {}, **headers)
+        force_authenticate(request, user=user or self.doctor.user)
+        return view(request)
+
+    def test_unchanged_list_is_a_304_without_fetching_rows(self):
+        response = self.get(manage_appointments)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(manage_appointments, etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual([query['sql'].count('MAX') for query in ctx.captured_queries if 'authentication_appointment' in query['sql']], [1])
+
+    def test_updates_and_deletes_change_the_etag(self):
+        etag = self.get(manage_appointments)['ETag']
+        self.appointments[0].status = 'confirmed'
+        self.appointments[0].save()
+        response = self.get(manage_appointments, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # Deleting the oldest row leaves MAX(updated_at) alone; COUNT changes
+        self.appointments[1].delete()
+        self.assertEqual(self.get(manage_appointments, etag=etag).status_code, 200)
+        self.assertEqual(self.get(manage_appointments, {'status': 'pending'}, etag=etag).status_code, 200)
+
+    def test_since_returns_only_changed_rows(self):
+        since = Appointment.objects.get(pk=self.appointments[2].pk).updated_at
+        self.appointments[0].status = 'confirmed'
+        self.appointments[0].save()
+        body = json.loads(self.get(list_appointments, {'since': since.isoformat()}, user=self.patient.user).content)
+        self.assertEqual([row['id'] for row in body], [self.appointments[0].id])
+        self.assertEqual(body[0]['updated_at'], self.appointments[0].updated_at.isoformat().replace('+00:00', 'Z'))
+        self.assertEqual(self.get(manage_appointments, {'since': 'yesterday'}).status_code, 400)
+
+    def test_prescriptions_and_messages(self):
+        prescription = Prescription.objects.create(patient=self.patient, doctor=self.doctor, medication='Ibuprofen', dosage='200mg', quantity=10, expiration_date=date(2030, 1, 1))
+        etag = self.get(list_prescriptions, user=self.patient.user)['ETag']
+        self.assertEqual(self.get(list_prescriptions, user=self.patient.user, etag=etag).status_code, 304)
+        self.assertEqual(self.get(list_prescriptions, {'compact': '1'}, user=self.patient.user, etag=etag).status_code, 200)
+        self.assertEqual(self.get(list_prescriptions, {'since': prescription.updated_at.isoformat()}, user=self.patient.user).content, b'[]')
+
+        message = Message.objects.create(sender=self.doctor.user, recipient=self.patient.user, content='Hello')
+        response = self.get(inbox, user=self.patient.user)
+        self.assertEqual(self.get(inbox, user=self.patient.user, etag=response['ETag']).status_code, 304)
+        since = message.updated_at.isoformat()
+        self.assertEqual(json.loads(self.get(inbox, {'since': since}, user=self.patient.user).content)['results'], [])
+        request = self.factory.post('/', {'ids': [message.id]}, format='json')
+        force_authenticate(request, user=self.patient.user)
+        mark_messages_read(request)
+        body = json.loads(self.get(inbox, {'since': since}, user=self.patient.user).content)
+        self.assertEqual([(row['id'], row['is_read']) for row in body['results']], [(message.id, True)])
+        self.assertEqual(self.get(inbox, user=self.patient.user, etag=response['ETag']).status_code, 200)
+
+
+@override_settings(INSTRUMENTATION={'ENABLED': True, 'SERVER_TIMING': True}, APPOINTMENT_LIST_CACHE_TIMEOUT=0)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.doctor = create_doctor('drwho')
+        self.patient = create_patient('alice')
+        self.token = Token.objects.create(user=self.doctor.user).key
+        for day in range(3):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2030, 1, 1 + day), time=time(9, 0), reason_for_visit='Checkup')
+
+    def auth(self, token):
+        return {'headers': {'Authorization': f'Token {token}'}}
+
+    def test_records_queries_serializer_time_and_size(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('manage_appointments'), **self.auth(self.token))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="%d queries"' % len(ctx.captured_queries), response['Server-Timing'])
+        entry = metrics.snapshot()['manage_appointments', 'GET']
+        self.assertEqual(entry['count'], 1)
+        self.assertEqual(entry['queries'], len(ctx.captured_queries))
+        self.assertGreater(entry['serialize'], 0)
+        self.assertEqual(entry['bytes'], len(response.content))
+        self.assertEqual(sum(entry['buckets']), 1)
+
+    def test_async_views_are_measured(self):
+        response = async_to_sync(self.async_client.get)(reverse('async_manage_appointments'), **self.auth(self.token))
+        self.assertEqual(response.status_code, 200)
+        entry = metrics.snapshot()['async_manage_appointments', 'GET']
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['serialize'], 0)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.get('/api/no-such-page/')
+        self.assertEqual(self.client.get(reverse('metrics'), **self.auth(self.token)).status_code, 403)
+        admin = CustomUser.objects.create_superuser('root', 'root@example.com', 'Secret123!')
+        response = self.client.get(reverse('metrics'), **self.auth(Token.objects.create(user=admin).key))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('hms_request_duration_seconds_count{endpoint="metrics",method="GET"} 1', body)
+        self.assertIn('hms_request_duration_seconds_bucket{endpoint="unmatched",method="GET",le="+Inf"} 1', body)
+
+    @override_settings(INSTRUMENTATION={'ENABLED': False})
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('manage_appointments'), **self.auth(self.token))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.snapshot(), {})
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor('drwho')
+        self.token = Token.objects.create(user=self.doctor.user).key
+        for n in range(6):
+            patient = create_patient(f'patient{n}', contact_number=f'07100000{n:02d}')
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date=date(2030, 1, 1 + n), time=time(9, 0), reason_for_visit='Checkup')
+            Message.objects.create(sender=patient.user, recipient=self.doctor.user, content=f'Question {n}')
+
+    def auth(self):
+        return {'headers': {'Authorization': f'Token {self.token}'}}
+
+    def test_normalize_collapses_literals_and_in_lists(self):
+        self.assertEqual(normalize('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'), 'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+        self.assertEqual(normalize('WHERE id IN (%s)'), normalize('WHERE id IN (%s)'))
+
+    def test_budget_reports_repeated_queries_with_their_stack(self):
+        with self.assertRaises(AssertionError) as raised:
+            with query_budget(20, repeat_threshold=3):
+                [appointment.patient.user.username for appointment in Appointment.objects.all()]
+        report = str(raised.exception)
+        self.assertIn('6x', report)
+        self.assertIn('authentication/tests.py', report)
+        with self.assertRaises(AssertionError):
+            with query_budget(2):
+                list(Appointment.objects.all())
+                list(Patient.objects.all())
+                list(Doctor.objects.all())
+
+    @override_settings(APPOINTMENT_LIST_CACHE_TIMEOUT=0)
+    def test_list_endpoints_stay_within_budget(self):
+        # Token and role lookups are cached after the first request
+        self.client.get(reverse('manage_appointments'), {'compact': '1'}, **self.auth())
+        # Fixed budgets over six rows: a per-row query would repeat six times
+        for name, params, budget in [
+            ('manage_appointments', {}, 5), ('manage_appointments', {'compact': '1'}, 3), ('inbox', {}, 3),
+            ('list_prescriptions', {}, 3), ('doctor_directory', {}, 2),
+        ]:
+            with self.subTest(name, **params), query_budget(budget, repeat_threshold=3):
+                response = self.client.get(reverse(name), params, **self.auth())
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(INSTRUMENTATION={'ENABLED': True})
+    def test_metrics_and_budget_share_one_query_hook(self):
+        metrics.reset()
+        with query_budget(20) as profile:
+            response = self.client.get(reverse('inbox'), **self.auth())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(connection.execute_wrappers.count(observe_query), 1)
+        self.assertEqual(metrics.snapshot()['inbox', 'GET']['queries'], profile.count)
+
+    def test_middleware_logs_and_samples_profiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiling = {'ENABLED': True, 'SLOW_QUERY_MS': 0, 'PROFILE_SAMPLE_RATE': 1, 'PROFILE_DIR': directory}
+            with override_settings(PROFILING=profiling), self.assertLogs('authentication.profiling', 'WARNING') as logs:
+                response = self.client.get(reverse('inbox'), **self.auth())
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('(inbox): ', logs.output[0])
+            self.assertIn('slow (', logs.output[0])
+            profiles = list(Path(directory).glob('inbox-GET-*.prof'))
+            self.assertEqual(len(profiles), 1)
+            self.assertIn('views.py', ''.join(str(key) for key in pstats.Stats(str(profiles[0])).stats))
+
+
+class SeedingAndBenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seeded_clinic_is_consistent(self):
+        counts = ClinicSeeder(doctors=2, patients=10, years=1, per_day=2, prefix='t', seed=1).run()
+        self.assertEqual(Doctor.objects.count(), 2)
+        self.assertEqual(Appointment.objects.count(), counts['appointments'])
+        self.assertGreater(counts['appointments'], 500)
+        self.assertEqual(Appointment.objects.filter(prescription__isnull=False).count(), counts['prescriptions'])
+        self.assertFalse(Appointment.objects.filter(is_completed=True, date__gte=date.today()).exists())
+        # Bulk inserts skip the Feedback signals; the summaries are rebuilt
+        self.assertEqual(sum(DoctorRating.objects.values_list('count', flat=True)), Feedback.objects.count())
+        self.assertEqual(sum(sum(row) for row in DailyAppointmentStats.objects.values_list('pending', 'confirmed', 'cancelled')), counts['appointments'])
+        self.assertEqual(Message.objects.count(), counts['messages'])
+        self.assertFalse(Message.objects.filter(thread__isnull=False, root__isnull=True).exists())
+
+        doctor = Doctor.objects.select_related('user').first()
+        self.assertTrue(doctor.user.check_password('Secret123!'))
+        self.assertTrue(is_doctor(doctor.user))
+        with self.assertRaises(SeedError):
+            ClinicSeeder(doctors=1, patients=1, years=1, prefix='t').run()
+
+    def test_every_endpoint_has_a_scenario(self):
+        covered = {scenario.url_name for scenario in SCENARIOS} | set(SKIPPED)
+        self.assertEqual({pattern.name for pattern in urls.urlpatterns} - covered, set())
+        self.assertEqual(len({scenario.label for scenario in SCENARIOS}), len(SCENARIOS))
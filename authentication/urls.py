@@ -1,14 +1,37 @@
 # authentication/urls.py
 from django.urls import path
-from .views import patient_register, doctor_register, patient_login, doctor_login, create_prescription, list_appointments, manage_appointments
+from . import async_views
+from .views import patient_register, doctor_register, bulk_import_patients, bulk_import_doctors, patient_login, doctor_login, logout_view, rotate_token_view, list_prescriptions, create_prescription, screen_prescriptions, list_appointments, manage_appointments, doctor_availability, doctor_directory, manage_schedule, inbox, outbox, message_thread, mark_messages_read, unread_messages_count, events, metrics_view, appointment_report_view
 
 urlpatterns = [
     path('patient/register/', patient_register, name='patient_register'),
     path('doctor/register/', doctor_register, name='doctor_register'),
+    path('patient/import/', bulk_import_patients, name='bulk_import_patients'),
+    path('doctor/import/', bulk_import_doctors, name='bulk_import_doctors'),
     path('patient/login/', patient_login, name='patient_login'),
     path('doctor/login/', doctor_login, name='doctor_login'),
+    path('logout/', logout_view, name='logout'),
+    path('token/rotate/', rotate_token_view, name='rotate_token'),
+    path('prescriptions/', list_prescriptions, name='list_prescriptions'),
     path('prescriptions/create/', create_prescription, name='create_prescription'),
+    path('prescriptions/screen/', screen_prescriptions, name='screen_prescriptions'),
     path('appointments/', list_appointments, name='list_appointments'),
     path('appointments/manage/', manage_appointments, name='manage_appointments'),
+    path('availability/', doctor_availability, name='doctor_availability'),
+    path('reports/appointments/', appointment_report_view, name='appointment_report'),
+    path('doctors/', doctor_directory, name='doctor_directory'),
+    path('doctor/schedule/', manage_schedule, name='manage_schedule'),
+    path('messages/', inbox, name='inbox'),
+    path('messages/outbox/', outbox, name='outbox'),
+    path('messages/read/', mark_messages_read, name='mark_messages_read'),
+    path('messages/unread/', unread_messages_count, name='unread_messages_count'),
+    path('messages/<int:message_id>/thread/', message_thread, name='message_thread'),
+    path('events/', events, name='events'),
+    path('metrics/', metrics_view, name='metrics'),
+    # Async variants for ASGI deployments
+    path('async/patient/login/', async_views.patient_login, name='async_patient_login'),
+    path('async/doctor/login/', async_views.doctor_login, name='async_doctor_login'),
+    path('async/appointments/', async_views.list_appointments, name='async_list_appointments'),
+    path('async/appointments/manage/', async_views.manage_appointments, name='async_manage_appointments'),
 ]
 
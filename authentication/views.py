@@ -1,30 +1,128 @@
 # authentication/views.py
-from django.contrib.auth import authenticate, login
-from django.http import JsonResponse
-from django.db import transaction
+from django.contrib.auth import authenticate, login, logout
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django.contrib.auth.models import Group
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.authtoken.models import Token
+from datetime import date, timedelta
 from .forms import PatientRegistrationForm, DoctorRegistrationForm
 from .permissions import IsDoctor, IsPatient
-from .models import Patient, Doctor, Appointment, Prescription
-from .serializers import PatientSerializer, DoctorSerializer, AppointmentSerializer, PrescriptionSerializer
-from datetime import datetime
+from .roles import is_doctor, is_patient
+from .authentication import CachedTokenAuthentication, issue_token, request_token_key, rotate_token
+from .models import Patient, Doctor, Appointment, Prescription, Message, DoctorSchedule, ScheduleException
+from .serializers import PatientSerializer, DoctorSerializer, AppointmentSerializer, PrescriptionSerializer, DoctorScheduleSerializer, ScheduleExceptionSerializer, MessageSerializer
+from .availability import find_free_slots
+from .compact import APPOINTMENT_FIELDS, APPOINTMENT_RELATED, PRESCRIPTION_FIELDS, PRESCRIPTION_RELATED, compact_values, side_load, stream_compact
+from .directory import InvalidSearch, cached_search_doctors, parse_search
+from .reports import InvalidReport, appointment_report, parse_report
+from .status_updates import MAX_BATCH_SIZE, update_statuses
+from .screening import screen_medications
+from .onboarding import PatientImporter, DoctorImporter, read_rows
+from .pagination import InvalidCursor, paginate_appointments, paginate_messages, parse_page_size, stream_appointments
+from .events import event_stream
+from .messaging import mark_read, participant_filter, send_message, thread_messages, unread_count
+from .response_cache import cached_list_response, list_version
+from .conditional import InvalidSince, conditional_list_response, filter_since
+from .instrumentation import metrics
+
+def filter_appointments(appointments, params):
+    # Filtering
+    appointments = filter_since(appointments, params)
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    status = params.get('status')
+    if date_from:
+        appointments = appointments.filter(date__gte=date_from)
+    if date_to:
+        appointments = appointments.filter(date__lte=date_to)
+    if status:
+        appointments = appointments.filter(status=status)
+
+    # Sorting
+    sort_by = params.get('sort_by', 'date')
+    if sort_by in ['date', 'time']:
+        appointments = appointments.order_by(sort_by)
+
+    return appointments
+
+def appointment_list_response(appointments, params):
+    compact = bool(params.get('compact'))
+    if compact:
+        # Rows of ids with patients/doctors side-loaded once in 'included'
+        appointments = compact_values(appointments, APPOINTMENT_FIELDS, APPOINTMENT_RELATED)
+    else:
+        appointments = appointments.for_listing()
+    try:
+        # Streaming: write the JSON array incrementally, one keyset chunk at a time
+        if params.get('stream'):
+            chunk_size = parse_page_size(params.get('page_size'))
+            if compact:
+                return StreamingHttpResponse(stream_compact(appointments, APPOINTMENT_RELATED, chunk_size), content_type='application/json')
+            return StreamingHttpResponse(stream_appointments(appointments, AppointmentSerializer, chunk_size), content_type='application/json')
+
+        # Cursor pagination on (date, time, id)
+        if 'cursor' in params or 'page_size' in params:
+            rows, next_cursor = paginate_appointments(appointments, params.get('cursor'), parse_page_size(params.get('page_size')))
+            if compact:
+                rows, included = side_load(rows, APPOINTMENT_RELATED)
+                return JsonResponse({'results': rows, 'included': included, 'next_cursor': next_cursor})
+            serializer = AppointmentSerializer(rows, many=True)
+            return JsonResponse({'results': serializer.data, 'next_cursor': next_cursor})
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if compact:
+        rows, included = side_load(list(appointments), APPOINTMENT_RELATED)
+        return JsonResponse({'results': rows, 'included': included})
+    serializer = AppointmentSerializer(appointments, many=True)
+    return JsonResponse(serializer.data, safe=False)
+
+def patch_appointments(doctor, data):
+    # A JSON list is a batch of {id, status, is_completed} changes answered
+    # with per-id results; a single {id, status} keeps its plain responses.
+    if isinstance(data, list):
+        if not data or len(data) > MAX_BATCH_SIZE:
+            return JsonResponse({'error': f'Send between 1 and {MAX_BATCH_SIZE} changes.'}, status=400)
+        return JsonResponse({'results': update_statuses(doctor, data)}, status=200)
+    try:
+        appointment_id = int(data.get('id'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Appointment not found'}, status=404)
+    result = update_statuses(doctor, [{'id': appointment_id, 'status': data.get('status') or None}])[0]
+    if 'error' in result:
+        return JsonResponse({'error': result['error']}, status=404 if result['error'] == 'Appointment not found' else 400)
+    return JsonResponse({'message': 'Appointment status updated successfully'}, status=200)
+
+def book_appointment(serializer, patient, doctor):
+    # The slot constraints on Appointment reject double bookings, so the
+    # happy path is a single INSERT with no conflict queries beforehand.
+    # Returns 'doctor' or 'patient' when that side already holds the slot;
+    # any other integrity error is re-raised.
+    try:
+        with transaction.atomic():
+            serializer.save(patient=patient, doctor=doctor)
+        return None
+    except IntegrityError:
+        slot = Appointment.objects.active().filter(date=serializer.validated_data['date'], time=serializer.validated_data['time'])
+        if slot.filter(doctor=doctor).exists():
+            return 'doctor'
+        if slot.filter(patient=patient).exists():
+            return 'patient'
+        raise
 
 @api_view(['POST'])
 def patient_register(request):
     form = PatientRegistrationForm(request.data)
     if form.is_valid():
         with transaction.atomic():
-            user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-            patient = Patient(user=user, **form.cleaned_data)
-            patient.save()
+            patient = form.save()
             patient_group = Group.objects.get(name='Patients')
-            user.groups.add(patient_group)
-            token, created = Token.objects.get_or_create(user=user)
+            patient.user.groups.add(patient_group)
+            token = Token.objects.create(user=patient.user)
         return JsonResponse({'token': token.key}, status=201)
     return JsonResponse({'errors': form.errors}, status=400)
 
@@ -33,25 +131,56 @@ def doctor_register(request):
     form = DoctorRegistrationForm(request.data)
     if form.is_valid():
         with transaction.atomic():
-            user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-            doctor = Doctor(user=user, **form.cleaned_data)
-            doctor.save()
+            doctor = form.save()
             doctor_group = Group.objects.get(name='Doctors')
-            user.groups.add(doctor_group)
-            token, created = Token.objects.get_or_create(user=user)
+            doctor.user.groups.add(doctor_group)
+            token = Token.objects.create(user=doctor.user)
         return JsonResponse({'token': token.key}, status=201)
     return JsonResponse({'errors': form.errors}, status=400)
 
+def run_bulk_import(request, importer_class):
+    # Accept either a JSON list of rows or a CSV/JSONL file upload
+    if isinstance(request.data, list):
+        rows = request.data
+    elif 'file' in request.FILES:
+        upload = request.FILES['file']
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        try:
+            rows = read_rows(upload, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        return JsonResponse({'error': 'Send a JSON list of rows or a CSV/JSONL file upload.'}, status=400)
+
+    # Hashed in-process: no worker pool forked from a web worker. Large
+    # files belong in the import_patients/import_doctors commands.
+    report = importer_class(workers=1).import_rows(rows)
+    return JsonResponse(report, status=201 if report['created'] else 400)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def bulk_import_patients(request):
+    return run_bulk_import(request, PatientImporter)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def bulk_import_doctors(request):
+    return run_bulk_import(request, DoctorImporter)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def metrics_view(request):
+    # Prometheus scrape target; empty unless INSTRUMENTATION is enabled
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @api_view(['POST'])
 def patient_login(request):
     username = request.data.get('username')
     password = request.data.get('password')
     user = authenticate(request, username=username, password=password)
-    if user is not None and user.groups.filter(name='Patients').exists():
+    if user is not None and is_patient(user):
         login(request, user)
-        token, created = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         return JsonResponse({'token': token.key}, status=200)
     return JsonResponse({'error': 'Invalid credentials or not a patient'}, status=400)
 
@@ -60,11 +189,25 @@ def doctor_login(request):
     username = request.data.get('username')
     password = request.data.get('password')
     user = authenticate(request, username=username, password=password)
-    if user is not None and user.groups.filter(name='Doctors').exists():
+    if user is not None and is_doctor(user):
         login(request, user)
-        token, created = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         return JsonResponse({'token': token.key}, status=200)
     return JsonResponse({'error': 'Invalid credentials or not a doctor'}, status=400)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    # Deleting the token evicts it from the token caches (see signals)
+    Token.objects.filter(user=request.user).delete()
+    logout(request)
+    return JsonResponse({'message': 'Logged out successfully'}, status=200)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def rotate_token_view(request):
+    token = rotate_token(request.user)
+    return JsonResponse({'token': token.key}, status=200)
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated, IsPatient])
 def list_appointments(request):
@@ -72,40 +215,23 @@ def list_appointments(request):
         patient = request.user.patient
         appointments = Appointment.objects.filter(patient=patient)
 
-        # Filtering
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        status = request.query_params.get('status')
-        if date_from:
-            appointments = appointments.filter(date__gte=date_from)
-        if date_to:
-            appointments = appointments.filter(date__lte=date_to)
-        if status:
-            appointments = appointments.filter(status=status)
-
-        # Sorting
-        sort_by = request.query_params.get('sort_by', 'date')
-        if sort_by in ['date', 'time']:
-            appointments = appointments.order_by(sort_by)
-
-        serializer = AppointmentSerializer(appointments, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        try:
+            appointments = filter_appointments(appointments, request.query_params)
+        except InvalidSince as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return cached_list_response(request, 'patient', patient.id, request.query_params, appointments, lambda: appointment_list_response(appointments, request.query_params))
 
     elif request.method == 'POST':
         data = request.data
         doctor = Doctor.objects.get(id=data['doctor'])
-        appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-        appointment_time = datetime.strptime(data['time'], '%H:%M').time()
-
-        # Check for conflicts
-        if Appointment.objects.filter(doctor=doctor, date=appointment_date, time=appointment_time).exists():
-            return JsonResponse({'error': 'Doctor already has an appointment at this time.'}, status=400)
-        if Appointment.objects.filter(patient=request.user.patient, date=appointment_date, time=appointment_time).exists():
-            return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
 
         serializer = AppointmentSerializer(data=data)
         if serializer.is_valid():
-            serializer.save(patient=request.user.patient)
+            conflict = book_appointment(serializer, patient=request.user.patient, doctor=doctor)
+            if conflict == 'doctor':
+                return JsonResponse({'error': 'Doctor already has an appointment at this time.'}, status=400)
+            if conflict == 'patient':
+                return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
             return JsonResponse(serializer.data, status=201)
         return JsonResponse(serializer.errors, status=400)
 
@@ -116,64 +242,70 @@ def manage_appointments(request):
         doctor = request.user.doctor
         appointments = Appointment.objects.filter(doctor=doctor)
 
-        # Filtering
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        status = request.query_params.get('status')
-        if date_from:
-            appointments = appointments.filter(date__gte=date_from)
-        if date_to:
-            appointments = appointments.filter(date__lte=date_to)
-        if status:
-            appointments = appointments.filter(status=status)
-
-        # Sorting
-        sort_by = request.query_params.get('sort_by', 'date')
-        if sort_by in ['date', 'time']:
-            appointments = appointments.order_by(sort_by)
-
-        serializer = AppointmentSerializer(appointments, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        try:
+            appointments = filter_appointments(appointments, request.query_params)
+        except InvalidSince as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return cached_list_response(request, 'doctor', doctor.id, request.query_params, appointments, lambda: appointment_list_response(appointments, request.query_params))
 
     elif request.method == 'POST':
         data = request.data
         patient = Patient.objects.get(id=data['patient'])
-        appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-        appointment_time = datetime.strptime(data['time'], '%H:%M').time()
-
-        # Check for conflicts
-        if Appointment.objects.filter(doctor=request.user.doctor, date=appointment_date, time=appointment_time).exists():
-            return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
-        if Appointment.objects.filter(patient=patient, date=appointment_date, time=appointment_time).exists():
-            return JsonResponse({'error': 'Patient already has an appointment at this time.'}, status=400)
 
         serializer = AppointmentSerializer(data=data)
         if serializer.is_valid():
-            serializer.save(doctor=request.user.doctor)
+            conflict = book_appointment(serializer, patient=patient, doctor=request.user.doctor)
+            if conflict == 'doctor':
+                return JsonResponse({'error': 'You already have an appointment at this time.'}, status=400)
+            if conflict == 'patient':
+                return JsonResponse({'error': 'Patient already has an appointment at this time.'}, status=400)
             return JsonResponse(serializer.data, status=201)
         return JsonResponse(serializer.errors, status=400)
 
     elif request.method == 'PATCH':
-        appointment_id = request.data.get('id')
-        status = request.data.get('status')
-        try:
-            appointment = Appointment.objects.get(id=appointment_id, doctor=request.user.doctor)
-            if status:
-                appointment.status = status
-                appointment.save()
-                return JsonResponse({'message': 'Appointment status updated successfully'}, status=200)
-            return JsonResponse({'error': 'Status is required'}, status=400)
-        except Appointment.DoesNotExist:
-            return JsonResponse({'error': 'Appointment not found'}, status=404)
+        return patch_appointments(request.user.doctor, request.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_prescriptions(request):
+    # Patients see their own prescriptions, doctors the ones they wrote
+    if is_patient(request.user):
+        owner, owner_id = 'patient', request.user.patient.id
+        prescriptions = Prescription.objects.filter(patient_id=owner_id)
+    elif is_doctor(request.user):
+        owner, owner_id = 'doctor', request.user.doctor.id
+        prescriptions = Prescription.objects.filter(doctor_id=owner_id)
+    else:
+        return JsonResponse({'error': 'Only patients and doctors have prescriptions.'}, status=403)
+    if request.query_params.get('active'):
+        prescriptions = prescriptions.filter(is_active=True)
+    try:
+        prescriptions = filter_since(prescriptions, request.query_params).order_by('-date_prescribed', '-id')
+    except InvalidSince as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    def build():
+        if request.query_params.get('compact'):
+            rows, included = side_load(list(compact_values(prescriptions, PRESCRIPTION_FIELDS, PRESCRIPTION_RELATED)), PRESCRIPTION_RELATED)
+            return JsonResponse({'results': rows, 'included': included})
+        serializer = PrescriptionSerializer(prescriptions.for_listing(), many=True)
+        return JsonResponse(serializer.data, safe=False)
+
+    # The list version changes with the embedded patient and doctor profiles
+    seed = f'prescriptions:{owner}:{owner_id}:{list_version(owner, owner_id)}:{request.get_full_path()}'
+    return conditional_list_response(request, prescriptions, seed, build)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsDoctor])
 def create_prescription(request):
     data = request.data
     patient = Patient.objects.get(id=data['patient'])
 
-    # Check for allergies
-    if any(allergy in data['medication'].lower() for allergy in patient.allergies.lower().split(',')):
-        return JsonResponse({'error': 'Patient is allergic to the prescribed medication.'}, status=400)
+    # Check for allergies and contraindicated conditions
+    conflicts = screen_medications(patient.id, [data.get('medication', '')])[0]['conflicts']
+    if conflicts:
+        names = ', '.join(f"{conflict['name']} ({conflict['type']})" for conflict in conflicts)
+        return JsonResponse({'error': f'Contraindicated: {names}.', 'conflicts': conflicts}, status=400)
 
     # Further validation logic can be added here
 
@@ -183,3 +315,185 @@ def create_prescription(request):
         return JsonResponse(serializer.data, status=201)
     return JsonResponse(serializer.errors, status=400)
 
+MAX_SCREENED_MEDICATIONS = 100
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def screen_prescriptions(request):
+    # Check many candidate medications for one patient at once
+    medications = request.data.get('medications')
+    if not isinstance(medications, list) or not all(isinstance(medication, str) for medication in medications):
+        return JsonResponse({'error': 'medications must be a list of names.'}, status=400)
+    if len(medications) > MAX_SCREENED_MEDICATIONS:
+        return JsonResponse({'error': f'At most {MAX_SCREENED_MEDICATIONS} medications per request.'}, status=400)
+    try:
+        patient_id = int(request.data.get('patient'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'patient must be an id.'}, status=400)
+    if not Patient.objects.filter(id=patient_id).exists():
+        return JsonResponse({'error': 'Patient not found'}, status=404)
+    return JsonResponse({'results': screen_medications(patient_id, medications)})
+
+
+MAX_AVAILABILITY_DAYS = 31
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def doctor_availability(request):
+    params = request.query_params
+    try:
+        date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else timezone.localdate()
+        date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else date_from + timedelta(days=6)
+        doctor_ids = [int(doctor_id) for doctor_id in params.getlist('doctor')]
+        specialty = int(params['specialty']) if params.get('specialty') else None
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD and ids must be integers.'}, status=400)
+    if date_to < date_from or (date_to - date_from).days >= MAX_AVAILABILITY_DAYS:
+        return JsonResponse({'error': f'Date range must be between 1 and {MAX_AVAILABILITY_DAYS} days.'}, status=400)
+
+    doctors = Doctor.objects.select_related('user')
+    if doctor_ids:
+        doctors = doctors.filter(id__in=doctor_ids)
+    elif specialty:
+        doctors = doctors.filter(specialty_id=specialty)
+    else:
+        return JsonResponse({'error': 'Pass one or more doctor ids or a specialty.'}, status=400)
+    doctors = list(doctors)
+
+    free = find_free_slots(doctors, date_from, date_to)
+    results = [
+        {
+            'doctor': doctor.id,
+            'full_name': doctor.user.full_name,
+            'slots': {day.isoformat(): [slot.strftime('%H:%M') for slot in slots] for day, slots in free[doctor.id].items()},
+        }
+        for doctor in doctors if doctor.id in free
+    ]
+    return JsonResponse({'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(), 'doctors': results})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def doctor_directory(request):
+    try:
+        search = parse_search(request.query_params)
+    except InvalidSearch as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(cached_search_doctors(search))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def appointment_report_view(request):
+    # Served from the daily rollup, never from Appointment itself
+    try:
+        report = parse_report(request.query_params)
+    except InvalidReport as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(appointment_report(report))
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def manage_schedule(request):
+    doctor = request.user.doctor
+    if request.method == 'GET':
+        return JsonResponse({
+            'hours': DoctorScheduleSerializer(doctor.schedules.order_by('weekday', 'start_time'), many=True).data,
+            'exceptions': ScheduleExceptionSerializer(doctor.schedule_exceptions.filter(date__gte=timezone.localdate()).order_by('date'), many=True).data,
+        })
+
+    elif request.method == 'PUT':
+        # Replace the weekly hours and upcoming exceptions wholesale
+        if not isinstance(request.data, dict):
+            return JsonResponse({'error': 'Expected a JSON object.'}, status=400)
+        hours = DoctorScheduleSerializer(data=request.data.get('hours', []), many=True)
+        exceptions = ScheduleExceptionSerializer(data=request.data.get('exceptions', []), many=True)
+        if not (hours.is_valid() & exceptions.is_valid()):
+            return JsonResponse({'hours': hours.errors, 'exceptions': exceptions.errors}, status=400)
+        with transaction.atomic():
+            doctor.schedules.all().delete()
+            doctor.schedule_exceptions.filter(date__gte=timezone.localdate()).delete()
+            DoctorSchedule.objects.bulk_create([DoctorSchedule(doctor=doctor, **item) for item in hours.validated_data])
+            ScheduleException.objects.bulk_create([ScheduleException(doctor=doctor, **item) for item in exceptions.validated_data])
+        return JsonResponse({'message': 'Schedule updated successfully'}, status=200)
+
+
+def message_page_response(request, messages, **extra):
+    params = request.query_params
+    try:
+        messages = filter_since(messages, params)
+    except InvalidSince as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    def build():
+        try:
+            rows, next_cursor = paginate_messages(messages.select_related('sender', 'recipient'), params.get('cursor'), parse_page_size(params.get('page_size')))
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'results': MessageSerializer(rows, many=True).data, 'next_cursor': next_cursor, **extra})
+
+    # The validators cover every matching message, not just this page
+    seed = f'messages:{request.user.pk}:{request.get_full_path()}:{sorted(extra.items())}'
+    return conditional_list_response(request, messages, seed, build)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def inbox(request):
+    if request.method == 'GET':
+        params = request.query_params
+        messages = Message.objects.filter(recipient=request.user, is_archived=bool(params.get('archived')))
+        if params.get('unread'):
+            messages = messages.filter(is_read=False)
+        return message_page_response(request, messages, unread_count=unread_count(request.user.pk))
+
+    elif request.method == 'POST':
+        serializer = MessageSerializer(data=request.data)
+        if serializer.is_valid():
+            thread = serializer.validated_data.get('thread')
+            if thread and not Message.objects.filter(participant_filter(request.user), id=thread.id).exists():
+                return JsonResponse({'thread': ['You are not part of this conversation.']}, status=400)
+            message = send_message(request.user, serializer.validated_data['recipient'], serializer.validated_data['content'], thread)
+            return JsonResponse(MessageSerializer(message).data, status=201)
+        return JsonResponse(serializer.errors, status=400)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def outbox(request):
+    return message_page_response(request, Message.objects.filter(sender=request.user))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def message_thread(request, message_id):
+    try:
+        message = Message.objects.filter(participant_filter(request.user)).get(id=message_id)
+    except Message.DoesNotExist:
+        return JsonResponse({'error': 'Message not found'}, status=404)
+    return JsonResponse({'results': MessageSerializer(thread_messages(message, request.user), many=True).data})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_messages_read(request):
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(message_id, int) for message_id in ids):
+        return JsonResponse({'error': 'ids must be a list of message ids.'}, status=400)
+    updated = mark_read(request.user, ids)
+    return JsonResponse({'updated': updated, 'unread_count': unread_count(request.user.pk)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_messages_count(request):
+    return JsonResponse({'unread_count': unread_count(request.user.pk)})
+
+
+async def events(request):
+    # Server-sent events (new messages, appointment status changes); needs
+    # the ASGI application (config.asgi), which keeps the connection open
+    # without tying up a worker thread.
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    key = request_token_key(request, allow_query=True)
+    try:
+        user, key = await CachedTokenAuthentication().aauthenticate_credentials(key) if key else (None, None)
+    except AuthenticationFailed:
+        user = None
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    return StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
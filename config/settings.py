@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,10 +41,15 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "rest_framework",
+    "rest_framework.authtoken",
     "authentication",
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack; see INSTRUMENTATION.
+    "authentication.instrumentation.InstrumentationMiddleware",
+    "authentication.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -74,13 +83,112 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE selects the backend:
+#   sqlite      single-node deployments; SQLITE_TUNED=1 (the default) enables
+#               WAL, synchronous=NORMAL, a busy timeout, mmap and IMMEDIATE
+#               write transactions.
+#   postgresql  DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT; connections
+#               persist for DB_CONN_MAX_AGE seconds with health checks, or
+#               DB_POOL=1 uses psycopg's connection pool instead
+#               (DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT).
+#               Needs the optional driver: pip install "psycopg[pool]".
+# The tuned SQLite options and the pool need Django 5.1+.
+
+
+def env_flag(name, default=False):
+    return os.environ.get(name, "1" if default else "0").lower() in ("1", "true", "yes")
+
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "health"),
+            "USER": os.environ.get("DB_USER", ""),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", ""),
+            "PORT": os.environ.get("DB_PORT", ""),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+    if env_flag("DB_POOL"):
+        # Pooled connections can't also be persistent.
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+                "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            }
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+elif DB_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+        }
     }
+    if env_flag("SQLITE_TUNED", default=True):
+        DATABASES["default"]["OPTIONS"] = {
+            "timeout": 20,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA busy_timeout=20000;"
+                "PRAGMA mmap_size=134217728;"
+                "PRAGMA cache_size=-20000;"
+            ),
+        }
+else:
+    raise ImproperlyConfigured(f"Unsupported DB_ENGINE: {DB_ENGINE!r}")
+
+
+# Custom user model
+# https://docs.djangoproject.com/en/5.0/topics/auth/customizing/#substituting-a-custom-user-model
+# Switched from auth.User after 0002 had been applied, which Django doesn't
+# support in place: databases created before this change must be reset (see
+# README.md).
+
+AUTH_USER_MODEL = "authentication.CustomUser"
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+# PASSWORD_HASHER_PROFILE picks the hasher used for new passwords; hashes made
+# by the other profiles still verify and are upgraded on the next login.
+# Costs can be tuned per profile in PASSWORD_HASHER_PARAMS (pbkdf2:
+# iterations; argon2: time_cost, memory_cost, parallelism; scrypt:
+# work_factor, block_size, parallelism, maxmem); missing keys use Django's
+# defaults. The argon2 profile needs the argon2-cffi package.
+
+PASSWORD_HASHER_PROFILE = os.environ.get("PASSWORD_HASHER_PROFILE", "pbkdf2")
+
+PASSWORD_HASHER_PROFILES = {
+    "pbkdf2": "authentication.hashers.TunablePBKDF2PasswordHasher",
+    "argon2": "authentication.hashers.TunableArgon2PasswordHasher",
+    "scrypt": "authentication.hashers.TunableScryptPasswordHasher",
 }
 
+PASSWORD_HASHER_PARAMS = {
+    "pbkdf2": {},
+    "argon2": {},
+    "scrypt": {},
+}
+
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE],
+    *(
+        hasher
+        for profile, hasher in PASSWORD_HASHER_PROFILES.items()
+        if profile != PASSWORD_HASHER_PROFILE
+    ),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -101,6 +209,84 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "authentication.authentication.CachedTokenAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+    ],
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Tokens, roles, the doctor directory, unread counts and the appointment
+# list responses are cached here. The default per-process memory cache
+# suits a single worker; with several workers set REDIS_URL so
+# invalidations reach all of them (needs the redis package).
+# Appointment list responses live for APPOINTMENT_LIST_CACHE_TIMEOUT seconds
+# unless a change to the data they show invalidates them first.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+APPOINTMENT_LIST_CACHE_TIMEOUT = 300
+
+# Instrumentation
+# INSTRUMENTATION_ENABLED=1 records, per URL name, a latency histogram
+# (LATENCY_BUCKETS, in seconds), SQL query counts and time, DRF serializer
+# time and response bytes, served in the Prometheus text format at
+# /api/metrics/ to admin users. SERVER_TIMING also reports each request's
+# db/serialize/total time in a Server-Timing header. Disabled, the
+# middleware drops out of the stack at startup.
+
+INSTRUMENTATION = {
+    "ENABLED": env_flag("INSTRUMENTATION_ENABLED"),
+    "SERVER_TIMING": env_flag("INSTRUMENTATION_SERVER_TIMING", DEBUG),
+    "LATENCY_BUCKETS": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+}
+
+# Profiling
+# PROFILING_ENABLED=1 groups each request's SQL by normalized statement and
+# logs (to the authentication.profiling logger) any shape run
+# REPEAT_THRESHOLD times or more, the N+1 signature, with the stack that
+# issued it, and any query slower than SLOW_QUERY_MS. A PROFILE_SAMPLE_RATE
+# fraction of sync requests is also run under cProfile, with the stats
+# written to PROFILE_DIR. Development only: stacks and cProfile are costly.
+
+PROFILING = {
+    "ENABLED": env_flag("PROFILING_ENABLED"),
+    "SLOW_QUERY_MS": float(os.environ.get("PROFILING_SLOW_QUERY_MS", 100)),
+    "REPEAT_THRESHOLD": int(os.environ.get("PROFILING_REPEAT_THRESHOLD", 5)),
+    "PROFILE_SAMPLE_RATE": float(os.environ.get("PROFILING_SAMPLE_RATE", 0)),
+    "PROFILE_DIR": BASE_DIR / "profiles",
+}
+
+# API tokens expire EXPIRY after they are issued. Lookups are cached in a
+# per-process LRU (LOCAL_CACHE_SIZE entries, LOCAL_CACHE_TIMEOUT seconds)
+# backed by the default cache (CACHE_TIMEOUT seconds).
+
+AUTH_TOKEN = {
+    "EXPIRY": timedelta(days=7),
+    "CACHE_TIMEOUT": 300,
+    "LOCAL_CACHE_SIZE": 10000,
+    "LOCAL_CACHE_TIMEOUT": 10,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -118,6 +304,26 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Email
+# https://docs.djangoproject.com/en/5.0/topics/email/
+# Registration emails are queued on commit and delivered by
+# `manage.py send_queued_emails`. Use
+# "authentication.notifications.ImmediateQueue" to send in-process instead,
+# e.g. together with the console or file-based EMAIL_BACKEND locally.
+
+NOTIFICATION_QUEUE = "authentication.notifications.OutboxQueue"
+
+DEFAULT_FROM_EMAIL = "from@example.com"
+
+# Real-time events
+# New messages and appointment status changes are pushed to connected
+# clients over server-sent events at /api/events/ (served by config.asgi).
+# The in-memory broker only reaches clients connected to the same process;
+# run a single ASGI worker with it or plug in a shared broker.
+
+EVENT_BROKER = "authentication.events.InMemoryBroker"
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 